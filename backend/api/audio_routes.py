@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse, Response
+
+from backend.services.artifact_store import get_artifact_store
+from backend.services.delivery_service import cache_control_for, get_etag_index, resolve_audio_path
+from backend.utils.http import etag_matches
+
+router = APIRouter(tags=["audio"])
+
+
+class AudioFileResponse(FileResponse):
+    """
+    FileResponse, which already handles Range and If-Range against our
+    ETag, reading large audio bodies in bigger chunks.
+    """
+
+    chunk_size = 256 * 1024
+
+
+@router.api_route("/audio/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def serve_audio(file_path: str, if_none_match: str | None = Header(None)) -> Response:
+    path = resolve_audio_path(file_path)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Served files count as used, so GC keeps what clients still fetch.
+    get_artifact_store().touch(path)
+    stat_result = path.stat()
+    headers = {
+        "ETag": get_etag_index().etag(path, stat_result),
+        "Cache-Control": cache_control_for(path),
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return AudioFileResponse(path, headers=headers, stat_result=stat_result)
@@ -1,6 +1,29 @@
 from __future__ import annotations
 
-from backend.services.llm_service import generate_ad_lyrics
+import os
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Iterator
+
+from backend.services.artifact_store import ArtifactStore, get_artifact_store
+from backend.services.llm_service import generate_ad_lyrics, stream_ad_lyric_lines
+from backend.services.metrics_service import record_cache
+from backend.utils.singleflight import SingleFlight
+
+# Lyrics are sampled fresh for every Generate press unless this is set;
+# reusing them for the TTL makes repeat presses return the same lyrics.
+LYRICS_CACHE_TTL_SECONDS = float(os.getenv("LYRICS_CACHE_TTL_SECONDS", "0"))
+# Longest a request waits for another worker generating the same lyrics
+# before generating its own.
+LYRICS_LOCK_TIMEOUT_SECONDS = float(os.getenv("LYRICS_LOCK_TIMEOUT_SECONDS", "10"))
+FAILED_LYRICS_PREFIX = "Unable to generate lyrics"
+
+_LYRICS_FLIGHT = SingleFlight()
+
+
+def normalize_prompt(ad_prompt: str) -> str:
+    """Collapses whitespace so trivially different prompts share work and cache entries."""
+    return " ".join(ad_prompt.split())
 
 
 def generate_lyrics_for_song(
@@ -13,7 +36,82 @@ def generate_lyrics_for_song(
     lyrics_before: str,
     lyrics_after: str,
 ) -> str:
-    syllable_limit = max(16, int(max_duration_seconds * 4))
+    ad_prompt = normalize_prompt(ad_prompt)
+    if LYRICS_CACHE_TTL_SECONDS <= 0:
+        return _generate_lyrics(
+            title, artist, mood, bpm, ad_prompt, max_duration_seconds, lyrics_before, lyrics_after
+        )
+    key = ArtifactStore.key(
+        "lyrics", title, artist, mood, bpm, ad_prompt, max_duration_seconds, lyrics_before, lyrics_after
+    )
+    return _LYRICS_FLIGHT.do(
+        key,
+        lambda: _cached_lyrics(
+            key,
+            title=title,
+            artist=artist,
+            mood=mood,
+            bpm=bpm,
+            ad_prompt=ad_prompt,
+            max_duration_seconds=max_duration_seconds,
+            lyrics_before=lyrics_before,
+            lyrics_after=lyrics_after,
+        ),
+    )
+
+
+def _cached_lyrics(
+    key: str,
+    title: str,
+    artist: str | None,
+    mood: str,
+    bpm: int,
+    ad_prompt: str,
+    max_duration_seconds: float,
+    lyrics_before: str,
+    lyrics_after: str,
+) -> str:
+    store = get_artifact_store()
+    cached = store.lookup("lyrics", key, LYRICS_CACHE_TTL_SECONDS)
+    if cached is not None:
+        record_cache("lyrics", True)
+        return cached.path.read_text(encoding="utf-8")
+
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(store.lock("lyrics", key, timeout=LYRICS_LOCK_TIMEOUT_SECONDS))
+        except TimeoutError:
+            record_cache("lyrics", False)
+            return _generate_lyrics(
+                title, artist, mood, bpm, ad_prompt, max_duration_seconds, lyrics_before, lyrics_after
+            )
+        cached = store.lookup("lyrics", key, LYRICS_CACHE_TTL_SECONDS)
+        record_cache("lyrics", cached is not None)
+        if cached is not None:
+            return cached.path.read_text(encoding="utf-8")
+
+        lyrics = _generate_lyrics(
+            title, artist, mood, bpm, ad_prompt, max_duration_seconds, lyrics_before, lyrics_after
+        )
+        if not lyrics.startswith(FAILED_LYRICS_PREFIX):
+
+            def write(tmp: Path) -> None:
+                tmp.write_text(lyrics, encoding="utf-8")
+
+            store.publish("lyrics", key, write, suffix=".txt")
+        return lyrics
+
+
+def _generate_lyrics(
+    title: str,
+    artist: str | None,
+    mood: str,
+    bpm: int,
+    ad_prompt: str,
+    max_duration_seconds: float,
+    lyrics_before: str,
+    lyrics_after: str,
+) -> str:
     return generate_ad_lyrics(
         title=title,
         artist=artist,
@@ -21,7 +119,29 @@ def generate_lyrics_for_song(
         bpm=bpm,
         ad_prompt=ad_prompt,
         max_duration_seconds=max_duration_seconds,
-        syllable_limit=syllable_limit,
+        syllable_limit=max(16, int(max_duration_seconds * 4)),
+        lyrics_before=lyrics_before,
+        lyrics_after=lyrics_after,
+    )
+
+
+def stream_lyric_lines_for_song(
+    title: str,
+    artist: str | None,
+    mood: str,
+    bpm: int,
+    ad_prompt: str,
+    max_duration_seconds: float,
+    lyrics_before: str,
+    lyrics_after: str,
+) -> Iterator[str]:
+    return stream_ad_lyric_lines(
+        title=title,
+        artist=artist,
+        mood=mood,
+        bpm=bpm,
+        ad_prompt=ad_prompt,
+        max_duration_seconds=max_duration_seconds,
         lyrics_before=lyrics_before,
         lyrics_after=lyrics_after,
     )
@@ -1,10 +1,74 @@
 from __future__ import annotations
 
-from pathlib import Path
+import contextvars
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Tuple
 
-from backend.services.gradium_service import generate_voice
+from backend.services.admission_service import StageBusy
+from backend.services.audio_buffer import AudioBuffer, concatenate
+from backend.services.gradium_service import synthesize_voice
 
+logger = logging.getLogger("interlude.voice")
 
-def generate_voice_clip(lyrics: str) -> Path:
-    return Path(generate_voice(text=lyrics, energy="high", pace="medium"))
+_LINE_TTS_POOL = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv("PIPELINED_TTS_WORKERS", "4"))),
+    thread_name_prefix="line-tts",
+)
 
+
+def generate_voice_clip(lyrics: str) -> AudioBuffer:
+    return synthesize_voice(text=lyrics, energy="high", pace="medium")
+
+
+def generate_voice_clip_pipelined(lines: Iterable[str]) -> Tuple[List[str], AudioBuffer | None]:
+    """
+    Submits each lyric line to TTS as soon as the iterable produces it, so
+    synthesis of early lines overlaps generation of later ones. Clips are
+    joined in lyric order once the last line has landed.
+
+    If the stream or a line's TTS fails partway, the lines before the
+    failure come back with their clips rather than being thrown away; the
+    error is raised only when no line was synthesized (or on StageBusy).
+    """
+    received: List[str] = []
+    futures: List[Future] = []
+    error: Exception | None = None
+    try:
+        for line in lines:
+            received.append(line)
+            futures.append(
+                # copy_context keeps each line's TTS span inside the request trace.
+                _LINE_TTS_POOL.submit(
+                    contextvars.copy_context().run,
+                    synthesize_voice,
+                    text=line,
+                    energy="high",
+                    pace="medium",
+                )
+            )
+    except Exception as exc:
+        error = exc
+
+    clips: List[AudioBuffer] = []
+    for future in futures:
+        try:
+            clips.append(future.result())
+        except Exception as exc:
+            error = exc
+            for pending in futures[len(clips) + 1 :]:
+                pending.cancel()
+            break
+    if isinstance(error, StageBusy) or (error is not None and not clips):
+        raise error
+    if error is not None:
+        logger.warning(
+            "Pipelined generation failed after %s of %s lines; keeping those: %r",
+            len(clips),
+            len(received),
+            error,
+        )
+    if not clips:
+        return received, None
+    return received[: len(clips)], concatenate(clips, gap_ms=120)
@@ -1,23 +1,180 @@
 from __future__ import annotations
 
+import hashlib
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Sequence, Tuple
 
-from backend.services.audio_service import GENERATED_DIR, mix_audio
+from backend.services.admission_service import background, is_patient
+from backend.services.artifact_store import ArtifactStore, get_artifact_store
+from backend.services.audio_buffer import AudioBuffer, read_audio
+from backend.services.audio_service import GENERATED_DIR, MIX_VERSION, mix_audio
+from backend.services.delivery_service import AUDIO_FORMATS, negotiate_formats
+from backend.services.hls_service import ad_playlist_path, render_segmented_mix
+from backend.services.mp3_service import Splice, base_encode, prepare_base, splice_span
+from backend.utils.singleflight import SingleFlight
+
+logger = logging.getLogger("interlude.mix")
+
+# Renditions that would need a full-song encode on the request path are
+# finished by this many background threads instead, outside the stage limits.
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", "1"))
+# Streamed straight to disk fast enough to produce inline.
+_INLINE_FORMATS = ("wav",)
+# Inline once the original's MP3 base encode exists (see splice_span).
+_SPLICED_FORMATS = ("mp3", "hls")
+
+_MIX_FLIGHT = SingleFlight()
+_RENDITION_FLIGHT = SingleFlight()
+_RENDITION_POOL = ThreadPoolExecutor(max_workers=max(1, RENDITION_WORKERS), thread_name_prefix="rendition")
+
+
+class MixedRenditions(NamedTuple):
+    ready: Dict[str, Path]
+    # Being encoded in the background; each path exists once it is published.
+    pending: Dict[str, Path]
+
+
+class _Deferred(Exception):
+    """A rendition cannot be produced without a full-song encode."""
 
 
 def mix_song_with_insert(
     song_id: str,
     song_path: Path,
-    insert_path: Path,
+    insert: Path | AudioBuffer,
     start_ms: int,
     end_ms: int,
-) -> Path:
-    suffix = song_path.suffix if song_path.suffix else ".wav"
-    output_path = Path(GENERATED_DIR) / f"{song_id}_with_ad{suffix}"
-    return mix_audio(
-        song_path=song_path,
-        insert_path=insert_path,
-        start_ms=start_ms,
-        end_ms=end_ms,
-        output_path=output_path,
+    formats: Sequence[str] | None = None,
+) -> MixedRenditions:
+    """
+    Mixes the insert into the song and publishes one rendition per format
+    (see negotiate_formats) under a content-addressed name, so equal inputs
+    from any worker resolve to the same files and concurrent requests never
+    overwrite each other's output. The insert is decoded at most once.
+
+    Requests never wait on a full-song compressed encode: MP3 and HLS are
+    spliced into the original's base encode (see splice_span), WAV is
+    streamed, and anything else is queued in the background and returned
+    as pending, with WAV added as the ready fallback when nothing requested
+    is ready. Jobs and other patient() callers get every format inline.
+    "hls" publishes the ad's playlist, with its own segments only where
+    the splice changed the stream.
+    """
+    formats = list(formats or negotiate_formats(None))
+    song_stat = song_path.stat()
+    if isinstance(insert, AudioBuffer):
+        insert_hash = insert.content_hash()
+    else:
+        insert_hash = hashlib.sha256(insert.read_bytes()).hexdigest()
+    key = ArtifactStore.key(
+        "mix",
+        MIX_VERSION,
+        str(song_path.resolve()),
+        song_stat.st_mtime_ns,
+        song_stat.st_size,
+        insert_hash,
+        start_ms,
+        end_ms,
     )
+    inline = is_patient()
+    voice: List[AudioBuffer] = []
+    spliced: List[Splice] = []
+
+    def insert_buffer() -> AudioBuffer:
+        if not voice:
+            voice.append(insert if isinstance(insert, AudioBuffer) else read_audio(insert))
+        return voice[0]
+
+    def splice(scratch: Path) -> Splice | None:
+        """One splice serves both MP3 and HLS; misses are retried."""
+        if not spliced:
+            result = splice_span(song_path, insert_buffer(), start_ms, end_ms, scratch)
+            if result is None:
+                return None
+            spliced.append(result)
+        return spliced[0]
+
+    def encode(tmp: Path, fmt: str, full: bool) -> None:
+        if fmt == "mp3":
+            if full and base_encode(song_path) is None:
+                try:
+                    prepare_base(song_path).result()
+                except Exception:
+                    logger.warning("No MP3 base encode for %s; encoding the mix in full", song_path.name)
+            result = splice(tmp)
+            if result is not None:
+                tmp.write_bytes(result.stream.data)
+                return
+        if not full and fmt not in _INLINE_FORMATS:
+            raise _Deferred(fmt)
+        mix_audio(song_path, insert_buffer(), start_ms, end_ms, tmp)
+
+    def render(fmt: str, rendition_key: str, dest: Path, full: bool) -> Path:
+        if fmt == "hls":
+            playlist = render_segmented_mix(
+                song_id,
+                song_path,
+                insert_buffer(),
+                start_ms,
+                end_ms,
+                rendition_key,
+                full_encode=full,
+                splicer=splice,
+            )
+            if playlist is None:
+                raise _Deferred(fmt)
+            return playlist
+        artifact = get_artifact_store().get_or_create(
+            "mix", rendition_key, lambda tmp: encode(tmp, fmt, full), suffix=dest.suffix, dest=dest
+        )
+        return artifact.path
+
+    def render_later(fmt: str, rendition_key: str, dest: Path) -> None:
+        insert_buffer()
+
+        def run() -> Path:
+            with background():
+                return render(fmt, rendition_key, dest, full=True)
+
+        def report(future: Future) -> None:
+            if future.exception() is not None:
+                logger.error("Background %s rendition of %s failed: %r", fmt, song_id, future.exception())
+
+        _RENDITION_FLIGHT.spawn(rendition_key, run, _RENDITION_POOL).add_done_callback(report)
+
+    def destination(fmt: str) -> Tuple[str, Path]:
+        rendition_key = ArtifactStore.key(key, fmt)
+        if fmt == "hls":
+            return rendition_key, ad_playlist_path(song_id, song_path, rendition_key)
+        return rendition_key, Path(GENERATED_DIR) / f"{rendition_key[:32]}_{song_id}{AUDIO_FORMATS[fmt]}"
+
+    def publish() -> MixedRenditions:
+        ready: Dict[str, Path] = {}
+        pending: Dict[str, Path] = {}
+        store = get_artifact_store()
+        for fmt in formats:
+            rendition_key, dest = destination(fmt)
+            artifact = store.lookup("mix", rendition_key)
+            if artifact is not None:
+                ready[fmt] = artifact.path
+                continue
+            spliceable = fmt in _SPLICED_FORMATS and base_encode(song_path) is not None
+            if inline or fmt in _INLINE_FORMATS or spliceable:
+                try:
+                    ready[fmt] = render(fmt, rendition_key, dest, full=inline)
+                    continue
+                except _Deferred:
+                    pass
+            elif fmt in _SPLICED_FORMATS:
+                prepare_base(song_path)
+            render_later(fmt, rendition_key, dest)
+            pending[fmt] = dest
+        if not ready:
+            fallback = _INLINE_FORMATS[0]
+            ready[fallback] = render(fallback, *destination(fallback), full=True)
+        return MixedRenditions(ready, pending)
+
+    return _MIX_FLIGHT.do((key, tuple(formats), inline), publish)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import json
+import functools
 import logging
 import traceback
 import uuid
@@ -8,27 +8,55 @@ import os
 from pathlib import Path
 from typing import Any, Dict, List
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
 
-from backend.api.generate_ad import generate_lyrics_for_song
-from backend.api.generate_voice import generate_voice_clip
+from backend.api.generate_ad import (
+    generate_lyrics_for_song,
+    normalize_prompt,
+    stream_lyric_lines_for_song,
+)
+from backend.api.generate_voice import generate_voice_clip, generate_voice_clip_pipelined
 from backend.api.mix_audio import mix_song_with_insert
+from backend.services.admission_service import StageBusy, admission_report, patient
+from backend.services.audio_buffer import AudioBuffer, concatenate, write_audio
 from backend.services.audio_service import GENERATED_DIR, ORIGINALS_DIR
-from backend.services.gradium_service import generate_voice
-from backend.services.songify_service import songify_tts_to_singing
-from backend.utils.doctor import run_doctor
+from backend.services.catalog_service import (
+    Song,
+    SongSummary,
+    get_catalog,
+)
+from backend.services.delivery_service import AUDIO_FORMATS, negotiate_formats
+from backend.services.doctor_service import get_doctor
+from backend.services.gradium_service import synthesize_voice
+from backend.services.job_service import (
+    JobQueueFull,
+    ProgressFn,
+    get_job_queue,
+    register_job_handler,
+)
+from backend.services.prerender_service import find_prerender
+from backend.services.trace_service import get_trace, traced
 from backend.utils.env import get_env, load_env
-from backend.utils.ffmpeg import assert_ffmpeg_available
+from backend.utils.http import etag_matches
 from backend.utils.paths import env_path
+from backend.utils.singleflight import SingleFlight
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
-SONGS_CONFIG_PATH = ROOT_DIR / "backend" / "config" / "songs.json"
 PUBLIC_DIR = ROOT_DIR / "public"
+JOB_RETRY_AFTER_SECONDS = "5"
+ACCEPT_AUDIO_DESCRIPTION = (
+    "Accept-style audio format preference, e.g. 'opus, mp3;q=0.5'. The first "
+    "ready format is the primary URL; WAV is only produced when listed, or by "
+    "/api/generate as the fallback while the requested formats encode in the "
+    "background (see pending_renditions). /api/generate also accepts 'hls' for "
+    "a segmented playlist."
+)
 
 router = APIRouter(prefix="/api", tags=["interlude"])
 logger = logging.getLogger("interlude.api")
+_GENERATE_FLIGHT = SingleFlight()
 
 
 class DoctorError(RuntimeError):
@@ -37,37 +65,23 @@ class DoctorError(RuntimeError):
         self.report = report
 
 
-class InsertWindow(BaseModel):
-    start_ms: int
-    end_ms: int
-
-
-class AdContext(BaseModel):
-    before_lyrics: str
-    after_lyrics: str
-
-
-class Song(BaseModel):
-    song_id: str
-    title: str
-    artist: str | None = None
-    cover_image: str | None = None
-    file: str
-    bpm: int
-    mood: str
-    insert_window: InsertWindow
-    ad_context: AdContext
-
-
 class GenerateRequest(BaseModel):
     song_id: str = Field(..., description="Song identifier")
     ad_prompt: str = Field(..., min_length=3, description="What ad to generate")
+    pipelined: bool = Field(
+        False,
+        description="Stream lyrics from the LLM and synthesize each line as it arrives",
+    )
+    accept_audio: str | None = Field(None, description=ACCEPT_AUDIO_DESCRIPTION)
 
 
 class GenerateResponse(BaseModel):
     lyrics: str
     audio_url: str | None = None
     audio_error: str | None = None
+    renditions: Dict[str, str] = Field(default_factory=dict)
+    # Formats still encoding in the background; each URL serves once ready.
+    pending_renditions: Dict[str, str] = Field(default_factory=dict)
 
 
 class SongifyRequest(BaseModel):
@@ -75,12 +89,32 @@ class SongifyRequest(BaseModel):
     bpm: int = Field(120, ge=40, le=240)
     key: str = Field("C_minor")
     style: str = Field("talk_sing")
+    accept_audio: str | None = Field(None, description=ACCEPT_AUDIO_DESCRIPTION)
 
 
 class SongifyResponse(BaseModel):
     raw_tts_url: str
     songified_url: str
     meta: Dict[str, Any]
+    renditions: Dict[str, Dict[str, str]] = Field(default_factory=dict)
+
+
+class JobAccepted(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    stage: str | None = None
+    progress: float = 0.0
+    result: Dict[str, Any] | None = None
+    error: Dict[str, Any] | None = None
+    created_at: float
+    updated_at: float
 
 
 def _next_steps_from_report(report: dict) -> List[str]:
@@ -89,7 +123,8 @@ def _next_steps_from_report(report: dict) -> List[str]:
     python_deps = report.get("python_deps", {})
     if isinstance(python_deps, dict) and not all(python_deps.values()):
         steps.append("Install Python deps: python -m pip install -r backend/requirements.txt")
-    if report.get("ffmpeg") is False:
+    native_codecs = report.get("native_codecs") or {}
+    if report.get("ffmpeg") is False and not native_codecs.get("mp3"):
         steps.append("Install ffmpeg: brew install ffmpeg (macOS)")
         steps.append("Install ffmpeg: sudo apt-get update && sudo apt-get install -y ffmpeg (Ubuntu/Debian)")
     try:
@@ -102,11 +137,15 @@ def _next_steps_from_report(report: dict) -> List[str]:
 
 
 def _panic_safe(handler):
+    @functools.wraps(handler)
     def wrapper(*args, **kwargs):
         try:
             return handler(*args, **kwargs)
         except HTTPException as exc:
             return JSONResponse(status_code=exc.status_code, content=exc.detail)
+        except StageBusy:
+            # Rendered as 429 with Retry-After by the app's exception handler.
+            raise
         except DoctorError as exc:
             logger.exception("DoctorError during request")
             report = exc.report
@@ -122,7 +161,7 @@ def _panic_safe(handler):
             )
         except Exception as exc:
             logger.exception("Unhandled error during request")
-            report = run_doctor(auto_fix=False)
+            report = get_doctor().report()
             return JSONResponse(
                 status_code=500,
                 content={
@@ -138,42 +177,104 @@ def _panic_safe(handler):
 
 
 def load_songs() -> List[Dict[str, Any]]:
-    with SONGS_CONFIG_PATH.open("r", encoding="utf-8") as file:
-        return json.load(file)
+    return [song.model_dump() for song in get_catalog().songs()]
 
 
-def _song_index() -> Dict[str, Dict[str, Any]]:
-    return {song["song_id"]: song for song in load_songs()}
+@router.get("/songs", response_model=List[SongSummary])
+def get_songs(if_none_match: str | None = Header(None)) -> Response:
+    body, etag = get_catalog().list_view()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
-@router.get("/songs", response_model=List[Song])
-def get_songs() -> List[Dict[str, Any]]:
-    return load_songs()
+def _no_progress(stage: str) -> None:
+    return None
 
 
 @router.post("/generate", response_model=GenerateResponse)
 def generate_in_song_ad(payload: GenerateRequest) -> GenerateResponse:
-    songs = _song_index()
-    song = songs.get(payload.song_id)
+    return run_generate(payload)
+
+
+@traced("generate")
+def run_generate(payload: GenerateRequest, progress: ProgressFn = _no_progress) -> GenerateResponse:
+    song = get_catalog().get(payload.song_id)
     if not song:
         raise HTTPException(status_code=404, detail=f"Unknown song_id: {payload.song_id}")
 
-    start_ms = song["insert_window"]["start_ms"]
-    end_ms = song["insert_window"]["end_ms"]
+    formats = negotiate_formats(payload.accept_audio, streams=True)
+    prerendered = find_prerender(song, payload.ad_prompt, formats)
+    if prerendered is not None:
+        renditions = {fmt: prerendered.renditions[fmt] for fmt in formats}
+        return GenerateResponse(
+            lyrics=prerendered.lyrics,
+            audio_url=renditions[formats[0]],
+            renditions=renditions,
+        )
+
+    # Identical requests arriving while one is running share its result;
+    # only the leader reports progress.
+    key = (
+        payload.song_id,
+        normalize_prompt(payload.ad_prompt),
+        payload.pipelined,
+        tuple(formats),
+    )
+    return _GENERATE_FLIGHT.do(key, lambda: _generate(song, payload, progress))
+
+
+def _generate(song: Song, payload: GenerateRequest, progress: ProgressFn) -> GenerateResponse:
+    start_ms = song.insert_window.start_ms
+    end_ms = song.insert_window.end_ms
     max_duration_seconds = (end_ms - start_ms) / 1000.0
 
+    audio_enabled = os.getenv("ENABLE_AUDIO_GENERATION", "true").strip().lower() == "true"
+    if audio_enabled and payload.pipelined:
+        progress("lyrics")
+        try:
+            lines, voice = generate_voice_clip_pipelined(
+                stream_lyric_lines_for_song(
+                    title=song.title,
+                    artist=song.artist,
+                    mood=song.mood,
+                    bpm=song.bpm,
+                    ad_prompt=payload.ad_prompt,
+                    max_duration_seconds=max_duration_seconds,
+                    lyrics_before=song.ad_context.before_lyrics,
+                    lyrics_after=song.ad_context.after_lyrics,
+                )
+            )
+        except StageBusy:
+            raise
+        except Exception:
+            # Raised only when no line was synthesized, so the sequential
+            # path below repeats no TTS.
+            logger.exception(
+                "Pipelined generation failed for song_id=%s; using sequential path",
+                song.song_id,
+            )
+            lines, voice = [], None
+        # Lines received before a late stream or TTS error are kept with
+        # their clips; fewer than two is too short to use.
+        if len(lines) >= 2 and voice is not None:
+            progress("mix")
+            return _mix_into_song(song, "\n".join(lines), voice, payload.accept_audio)
+        logger.info("Pipelined stream produced %s usable lines; using sequential path", len(lines))
+
+    progress("lyrics")
     lyrics = generate_lyrics_for_song(
-        title=song["title"],
-        artist=song.get("artist"),
-        mood=song["mood"],
-        bpm=song["bpm"],
+        title=song.title,
+        artist=song.artist,
+        mood=song.mood,
+        bpm=song.bpm,
         ad_prompt=payload.ad_prompt,
         max_duration_seconds=max_duration_seconds,
-        lyrics_before=song["ad_context"]["before_lyrics"],
-        lyrics_after=song["ad_context"]["after_lyrics"],
+        lyrics_before=song.ad_context.before_lyrics,
+        lyrics_after=song.ad_context.after_lyrics,
     )
 
-    audio_enabled = os.getenv("ENABLE_AUDIO_GENERATION", "true").strip().lower() == "true"
     if not audio_enabled:
         return GenerateResponse(
             lyrics=lyrics,
@@ -181,20 +282,53 @@ def generate_in_song_ad(payload: GenerateRequest) -> GenerateResponse:
             audio_error="Audio generation is disabled. Set ENABLE_AUDIO_GENERATION=true.",
         )
 
+    progress("tts")
     try:
-        voice_path = generate_voice_clip(lyrics)
-        song_path = ORIGINALS_DIR / song["file"]
-        mixed_path = mix_song_with_insert(
-            song_id=song["song_id"],
+        voice = generate_voice_clip(lyrics)
+    except StageBusy:
+        raise
+    except Exception as exc:
+        logger.exception("Audio generation failed for song_id=%s", song.song_id)
+        return GenerateResponse(
+            lyrics=lyrics,
+            audio_url=None,
+            audio_error=f"Unable to generate audio. {exc}",
+        )
+    progress("mix")
+    return _mix_into_song(song, lyrics, voice, payload.accept_audio)
+
+
+def _public_url(path: Path) -> str:
+    return "/" + path.relative_to(PUBLIC_DIR).as_posix()
+
+
+def _mix_into_song(
+    song: Song, lyrics: str, voice: AudioBuffer, accept_audio: str | None
+) -> GenerateResponse:
+    formats = negotiate_formats(accept_audio, streams=True)
+    try:
+        song_path = ORIGINALS_DIR / song.file
+        mixed = mix_song_with_insert(
+            song_id=song.song_id,
             song_path=song_path,
-            insert_path=voice_path,
-            start_ms=start_ms,
-            end_ms=end_ms,
+            insert=voice,
+            start_ms=song.insert_window.start_ms,
+            end_ms=song.insert_window.end_ms,
+            formats=formats,
         )
-        audio_relative = mixed_path.relative_to(PUBLIC_DIR).as_posix()
-        return GenerateResponse(lyrics=lyrics, audio_url=f"/{audio_relative}", audio_error=None)
+        renditions = {fmt: _public_url(path) for fmt, path in mixed.ready.items()}
+        primary = next((fmt for fmt in formats if fmt in renditions), next(iter(renditions)))
+        return GenerateResponse(
+            lyrics=lyrics,
+            audio_url=renditions[primary],
+            audio_error=None,
+            renditions=renditions,
+            pending_renditions={fmt: _public_url(path) for fmt, path in mixed.pending.items()},
+        )
+    except StageBusy:
+        raise
     except Exception as exc:
-        logger.exception("Audio generation failed for song_id=%s", song["song_id"])
+        logger.exception("Audio generation failed for song_id=%s", song.song_id)
         return GenerateResponse(
             lyrics=lyrics,
             audio_url=None,
@@ -205,73 +339,149 @@ def generate_in_song_ad(payload: GenerateRequest) -> GenerateResponse:
 @router.post("/songify", response_model=SongifyResponse)
 @_panic_safe
 def songify(payload: SongifyRequest) -> SongifyResponse:
-    load_env()
+    return run_songify(payload)
+
+
+def _validate_songify(payload: SongifyRequest) -> List[str]:
     if payload.style not in {"talk_sing", "chant", "rap"}:
         raise HTTPException(status_code=400, detail="style must be talk_sing, chant, or rap")
+    lines = [line.strip() for line in payload.lyrics.splitlines() if line.strip()]
+    if not lines:
+        raise HTTPException(status_code=400, detail="lyrics must contain at least one line")
+    return lines
 
+
+@traced("songify")
+def run_songify(payload: SongifyRequest, progress: ProgressFn = _no_progress) -> SongifyResponse:
+    load_env()
+    lines = _validate_songify(payload)
+
+    progress("doctor")
     logger.info("songify: doctor start")
-    doctor_report = run_doctor(auto_fix=True)
+    doctor_report = get_doctor().report()
     if not doctor_report.get("ok"):
+        get_doctor().refresh_in_background(auto_fix=True)
         raise DoctorError("Dependency check failed. See doctor report.", doctor_report)
     logger.info("songify: doctor ok")
 
-    assert_ffmpeg_available()
     GENERATED_DIR.mkdir(parents=True, exist_ok=True)
 
-    lines = [line.strip() for line in payload.lyrics.splitlines() if line.strip()]
-    if not lines:
-        raise HTTPException(status_code=400, detail="lyrics must contain at least one line")
-
-    try:
-        from pydub import AudioSegment
-    except Exception as exc:
-        raise RuntimeError(f"pydub import failed: {exc}") from exc
-
-    silence_gap = AudioSegment.silent(duration=120)
-    combined = AudioSegment.silent(duration=0)
-
+    progress("tts")
+    clips: List[AudioBuffer] = []
     for line in lines:
         logger.info("songify: TTS line length=%s", len(line))
-        wav_path = Path(generate_voice(text=line))
-        clip = AudioSegment.from_wav(wav_path)
-        combined = combined + clip + silence_gap
+        clips.append(synthesize_voice(text=line))
+    raw_tts = concatenate(clips, gap_ms=120)
 
     job_id = uuid.uuid4().hex
-    raw_wav_path = GENERATED_DIR / f"{job_id}_raw.wav"
-    logger.info("songify: export raw wav=%s", raw_wav_path)
-    combined.export(raw_wav_path, format="wav")
-
-    songified_path = GENERATED_DIR / f"{job_id}_songified.wav"
+    formats = negotiate_formats(payload.accept_audio)
+    raw_urls: Dict[str, str] = {}
+    for fmt in formats:
+        raw_path = GENERATED_DIR / f"{job_id}_raw{AUDIO_FORMATS[fmt]}"
+        logger.info("songify: export raw %s=%s", fmt, raw_path)
+        raw_urls[fmt] = _public_url(write_audio(raw_tts, raw_path))
+
+    progress("songify")
     logger.info("songify: songify start")
+    # Imported here so workers that never songify skip loading librosa/scipy.
+    from backend.services.songify_service import songify_tts_to_singing
+
+    # One render, encoded to every format (streamed to all encoders at once
+    # for inputs over SONGIFY_STREAM_THRESHOLD_SECONDS).
+    songified_paths = [GENERATED_DIR / f"{job_id}_songified{AUDIO_FORMATS[fmt]}" for fmt in formats]
     songify_tts_to_singing(
-        input_wav=raw_wav_path,
+        input_wav=raw_tts,
         lyrics=payload.lyrics,
         bpm=payload.bpm,
         key=payload.key,
         style=payload.style,
-        output_wav=songified_path,
+        output_wav=songified_paths[0],
+        extra_outputs=songified_paths[1:],
     )
-    logger.info("songify: songify done -> %s", songified_path)
+    logger.info("songify: songify done -> %s", ", ".join(path.name for path in songified_paths))
+    songified_urls = {fmt: _public_url(path) for fmt, path in zip(formats, songified_paths)}
 
-    raw_relative = raw_wav_path.relative_to(PUBLIC_DIR).as_posix()
-    songified_relative = songified_path.relative_to(PUBLIC_DIR).as_posix()
     return SongifyResponse(
-        raw_tts_url=f"/{raw_relative}",
-        songified_url=f"/{songified_relative}",
+        raw_tts_url=raw_urls[formats[0]],
+        songified_url=songified_urls[formats[0]],
         meta={"bpm": payload.bpm, "key": payload.key, "style": payload.style},
+        renditions={"raw_tts": raw_urls, "songified": songified_urls},
     )
 
 
+# Jobs are already bounded by the job queue, so they wait for stage slots
+# instead of failing with StageBusy.
+def _generate_job(payload: Dict[str, Any], progress: ProgressFn) -> Dict[str, Any]:
+    with patient():
+        return run_generate(GenerateRequest(**payload), progress).model_dump()
+
+
+def _songify_job(payload: Dict[str, Any], progress: ProgressFn) -> Dict[str, Any]:
+    with patient():
+        return run_songify(SongifyRequest(**payload), progress).model_dump()
+
+
+register_job_handler("generate", _generate_job, stages=("lyrics", "tts", "mix"))
+register_job_handler("songify", _songify_job, stages=("doctor", "tts", "songify"))
+
+
+def _submit_job(kind: str, payload: BaseModel) -> JobAccepted:
+    try:
+        job_id = get_job_queue().submit(kind, payload.model_dump())
+    except JobQueueFull as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": JOB_RETRY_AFTER_SECONDS}
+        ) from exc
+    return JobAccepted(job_id=job_id, status="queued", status_url=f"/api/jobs/{job_id}")
+
+
+@router.post("/jobs/generate", response_model=JobAccepted, status_code=202)
+def submit_generate_job(payload: GenerateRequest) -> JobAccepted:
+    if get_catalog().get(payload.song_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown song_id: {payload.song_id}")
+    return _submit_job("generate", payload)
+
+
+@router.post("/jobs/songify", response_model=JobAccepted, status_code=202)
+def submit_songify_job(payload: SongifyRequest) -> JobAccepted:
+    _validate_songify(payload)
+    return _submit_job("songify", payload)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str) -> Dict[str, Any]:
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    return job
+
+
+@router.get("/traces/{trace_id}")
+def get_request_trace(trace_id: str) -> Dict[str, Any]:
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Unknown trace_id: {trace_id}")
+    return trace.to_dict()
+
+
 @router.get("/health/doctor")
 def health_doctor() -> Dict[str, Any]:
     load_env()
-    report = run_doctor(auto_fix=False)
+    report = get_doctor().report()
     env_report = {
         "GRADIUM_API_KEY": bool(get_env("GRADIUM_API_KEY")),
         "GRADIUM_VOICE_ID": bool(get_env("GRADIUM_VOICE_ID") or get_env("VOICE_ID")),
         "GRADIUM_REGION": bool(get_env("GRADIUM_REGION")),
     }
-    return {"python_deps": report.get("python_deps"), "ffmpeg": report.get("ffmpeg"), "env": env_report}
+    return {
+        "python_deps": report.get("python_deps"),
+        "ffmpeg": report.get("ffmpeg"),
+        "native_codecs": report.get("native_codecs"),
+        "checked_at": report.get("checked_at"),
+        "imports": report.get("imports"),
+        "admission": admission_report(),
+        "env": env_report,
+    }
     audio_enabled = os.getenv("ENABLE_AUDIO_GENERATION", "false").lower() == "true"
     if not audio_enabled:
         return GenerateResponse(
@@ -282,11 +492,11 @@ def health_doctor() -> Dict[str, Any]:
 
     try:
         voice_path = generate_voice_clip(lyrics)
-        song_path = ORIGINALS_DIR / song["file"]
+        song_path = ORIGINALS_DIR / song.file
         mixed_path = mix_song_with_insert(
-            song_id=song["song_id"],
+            song_id=song.song_id,
             song_path=song_path,
-            insert_path=voice_path,
+            insert=voice_path,
             start_ms=start_ms,
             end_ms=end_ms,
         )
@@ -1,19 +1,24 @@
 from __future__ import annotations
 
-from pathlib import Path
-
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
+from backend.api.audio_routes import router as audio_router
 from backend.api.routes import load_songs, router
-from backend.services.audio_service import ensure_song_assets
+from backend.services.admission_service import StageBusy, admission_report
+from backend.services.artifact_store import get_artifact_store
+from backend.services.audio_service import ORIGINALS_DIR, ensure_song_assets
+from backend.services.delivery_service import get_etag_index
+from backend.services.doctor_service import get_doctor
+from backend.services.job_service import get_job_queue
+from backend.services.metrics_service import CONTENT_TYPE, render_metrics
+from backend.services.mp3_service import start_base_encodes
+from backend.services.prewarm_service import start_prewarm
+from backend.services.trace_service import TraceMiddleware
 from backend.utils.env import load_env
 
 load_env()
 
-ROOT_DIR = Path(__file__).resolve().parents[1]
-AUDIO_DIR = ROOT_DIR / "public" / "audio"
-
 app = FastAPI(
     title="Interlude API",
     description="API for generating and inserting in-song ads (MVP stub)",
@@ -26,17 +31,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Interlude-Trace-Id", "Server-Timing"],
 )
+app.add_middleware(TraceMiddleware)
 
 app.include_router(router)
-app.mount("/audio", StaticFiles(directory=AUDIO_DIR), name="audio")
+app.include_router(audio_router)
 
 
 @app.on_event("startup")
 def on_startup() -> None:
-    ensure_song_assets(load_songs())
+    songs = load_songs()
+    ensure_song_assets(songs)
+    get_etag_index().prime(ORIGINALS_DIR)
+    get_job_queue().resume_pending()
+    get_artifact_store().maybe_collect()
+    get_doctor().refresh_in_background(auto_fix=True)
+    start_prewarm()
+    start_base_encodes(ORIGINALS_DIR / song["file"] for song in songs)
+
+
+@app.exception_handler(StageBusy)
+def stage_busy(request: Request, exc: StageBusy) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "stage": exc.stage},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok", "project": "Interlude"}
+    return {"status": "ok", "project": "Interlude", "admission": admission_report()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from backend.utils.paths import repo_root
+
+SAMPLE_RATE = 44100
+DEFAULT_LENGTHS = (5.0, 30.0, 120.0)
+STYLES = ("talk_sing", "chant", "rap")
+BENCH_DIR = repo_root() / ".interlude" / "bench"
+MIN_ROUND_SECONDS = 0.2
+# Matches the default SONGIFY_STREAM_THRESHOLD_SECONDS.
+STREAMING_SECONDS = 60.0
+LYRICS = (
+    "we ride the wave tonight\n"
+    "sip the cola feel the light\n"
+    "every bubble every beat\n"
+    "never stop the show"
+)
+
+
+def speech_like(seconds: float, seed: int, sr: int = SAMPLE_RATE):
+    """Glottal-pulse harmonics with vibrato, syllable gating and breath noise."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    f0 = 130.0 + 25.0 * np.sin(2 * np.pi * 0.6 * t) + rng.uniform(-5, 5)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voice = sum(np.sin(k * phase) / k for k in range(1, 10))
+    syllables = (np.sin(2 * np.pi * 3.1 * t + rng.uniform(0, np.pi)) > -0.2).astype(np.float64)
+    pauses = (np.sin(2 * np.pi * 0.25 * t) > -0.8).astype(np.float64)
+    audio = 0.25 * voice * syllables * pauses + 0.01 * rng.standard_normal(n)
+    return audio.astype(np.float32)
+
+
+def music_like(seconds: float, seed: int, sr: int = SAMPLE_RATE):
+    """Stereo chord pad plus kick and hat hits on a 120 bpm grid."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    pad = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6)) * 0.08
+    kick = np.zeros(n)
+    hat = np.zeros(n)
+    beat = int(0.5 * sr)
+    kick_env = np.exp(-np.arange(int(0.15 * sr)) / (0.03 * sr))
+    kick_tone = np.sin(2 * np.pi * 60.0 * np.arange(kick_env.size) / sr) * kick_env
+    hat_tone = rng.standard_normal(int(0.03 * sr)) * np.exp(-np.arange(int(0.03 * sr)) / (0.005 * sr))
+    for start in range(0, n, beat):
+        kick[start : start + kick_tone.size] += kick_tone[: n - start] * 0.5
+        off = start + beat // 2
+        if off < n:
+            hat[off : off + hat_tone.size] += hat_tone[: n - off] * 0.1
+    left = pad + kick + hat
+    right = pad * 0.9 + kick + np.roll(hat, 64)
+    return np.stack([left, right], axis=1).astype(np.float32)
+
+
+def _measure(fn: Callable[[int], None], repeat: int) -> Dict[str, float]:
+    """
+    Median wall/CPU time per call over repeat rounds, then one traced call
+    for peak memory. Like timeit's autorange, fast cases loop until a round
+    takes MIN_ROUND_SECONDS so sub-millisecond timings stay meaningful.
+    """
+    calls = 0
+
+    def timed_round(number: int) -> Tuple[float, float]:
+        nonlocal calls
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        for _ in range(number):
+            fn(calls)
+            calls += 1
+        return (time.perf_counter() - wall_start) / number, (time.process_time() - cpu_start) / number
+
+    number = 1
+    wall, cpu = timed_round(number)
+    while wall * number < MIN_ROUND_SECONDS and number < 1 << 16:
+        number *= 2 if wall * number * 10 > MIN_ROUND_SECONDS else 10
+        wall, cpu = timed_round(number)
+
+    walls, cpus = [wall], [cpu]
+    for _ in range(repeat - 1):
+        wall, cpu = timed_round(number)
+        walls.append(wall)
+        cpus.append(cpu)
+
+    tracemalloc.start()
+    fn(calls)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_seconds": statistics.median(walls),
+        "cpu_seconds": statistics.median(cpus),
+        "peak_mem_mb": peak / (1024 * 1024),
+    }
+
+
+def _cases(lengths: Tuple[float, ...], workdir: Path) -> List[Tuple[str, str, float, Callable[[int], None]]]:
+    from backend.services.audio_buffer import AudioBuffer, concatenate, from_mono, write_audio
+    from backend.services.audio_service import generate_silence_wav, mix_audio
+    from backend.services.songify_service import songify_tts_to_singing
+
+    cases: List[Tuple[str, str, float, Callable[[int], None]]] = []
+    insert = from_mono(speech_like(8.0, seed=1), SAMPLE_RATE)
+    for seconds in lengths:
+        song_path = workdir / f"song_{int(seconds)}.wav"
+        write_audio(AudioBuffer(music_like(seconds, seed=2), SAMPLE_RATE), song_path)
+        start_ms = int(seconds * 1000 * 0.4)
+        end_ms = start_ms + int(min(8.0, seconds * 0.3) * 1000)
+
+        def run_mix(run: int, song_path=song_path, start_ms=start_ms, end_ms=end_ms) -> None:
+            mix_audio(song_path, insert, start_ms, end_ms, workdir / "mix_out.wav")
+
+        cases.append(("mix_audio", "wav", seconds, run_mix))
+
+        # A per-run gain tweak changes the audio hash, so songify's in-memory
+        # and on-disk caches never short-circuit the measurement. Long inputs
+        # go through a file so songify takes its streaming path, as in
+        # production.
+        speech = speech_like(seconds, seed=3)
+        for style in STYLES:
+
+            def run_songify(run: int, seconds=seconds, style=style, speech=speech) -> None:
+                voice = from_mono(speech * (1.0 - run * 1e-6), SAMPLE_RATE)
+                source = voice
+                if seconds > STREAMING_SECONDS:
+                    source = write_audio(voice, workdir / "songify_in.wav")
+                songify_tts_to_singing(source, LYRICS, 120, "C_minor", style, workdir / "songify_out.wav")
+
+            cases.append(("songify_tts_to_singing", style, seconds, run_songify))
+
+        clip_count = max(1, int(seconds // 2))
+        clips = [from_mono(speech_like(2.0, seed=200 + idx), SAMPLE_RATE) for idx in range(clip_count)]
+
+        def run_concatenate(run: int, clips=clips) -> None:
+            concatenate(clips, gap_ms=120)
+
+        cases.append(("overlap_add_assembly", f"{clip_count}_clips", seconds, run_concatenate))
+
+        def run_silence(run: int, seconds=seconds) -> None:
+            generate_silence_wav(workdir / "silence.wav", int(seconds))
+
+        cases.append(("generate_silence_wav", "16k", seconds, run_silence))
+    return cases
+
+
+def run_benchmarks(lengths: Tuple[float, ...], repeat: int) -> Dict[str, Any]:
+    import librosa
+    import numpy as np
+
+    from backend.services.songify_service import warm_up
+
+    warm_up()
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="interlude-bench-") as tmp:
+        workdir = Path(tmp)
+        for name, variant, seconds, fn in _cases(lengths, workdir):
+            stats = _measure(fn, repeat)
+            throughput = seconds / stats["cpu_seconds"] if stats["cpu_seconds"] > 0 else float("inf")
+            results.append(
+                {
+                    "name": name,
+                    "variant": variant,
+                    "audio_seconds": seconds,
+                    **{key: round(value, 6) for key, value in stats.items()},
+                    "throughput": round(throughput, 3),
+                }
+            )
+            print(
+                f"{name:<24} {variant:<12} {seconds:>6.0f}s  "
+                f"wall={stats['wall_seconds'] * 1000:.2f}ms cpu={stats['cpu_seconds'] * 1000:.2f}ms  "
+                f"x{throughput:,.1f} realtime/cpu  peak={stats['peak_mem_mb']:.1f} MB",
+                flush=True,
+            )
+    return {
+        "meta": {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "librosa": librosa.__version__,
+            "lengths": list(lengths),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    throughput_drop: float,
+    memory_growth: float,
+) -> List[str]:
+    """Regressions where throughput fell or peak memory grew past the thresholds."""
+    def key(entry: Dict[str, Any]) -> Tuple[str, str, float]:
+        return entry["name"], entry["variant"], float(entry["audio_seconds"])
+
+    previous = {key(entry): entry for entry in baseline.get("results", [])}
+    regressions: List[str] = []
+    for entry in report["results"]:
+        base = previous.get(key(entry))
+        if base is None:
+            continue
+        label = f"{entry['name']}[{entry['variant']}, {entry['audio_seconds']:.0f}s]"
+        if entry["throughput"] < base["throughput"] * (1.0 - throughput_drop):
+            regressions.append(
+                f"{label}: throughput {entry['throughput']:.2f} < baseline {base['throughput']:.2f}"
+            )
+        if entry["peak_mem_mb"] > base["peak_mem_mb"] * (1.0 + memory_growth) + 1.0:
+            regressions.append(
+                f"{label}: peak memory {entry['peak_mem_mb']:.1f} MB > baseline {base['peak_mem_mb']:.1f} MB"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the audio hot paths.")
+    parser.add_argument(
+        "--lengths",
+        type=lambda value: tuple(float(part) for part in value.split(",")),
+        default=DEFAULT_LENGTHS,
+        help="Comma-separated signal lengths in seconds (default: 5,30,120)",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=BENCH_DIR / "audio_latest.json")
+    parser.add_argument("--baseline", type=Path, default=BENCH_DIR / "audio_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--max-throughput-drop", type=float, default=0.2)
+    parser.add_argument("--max-memory-growth", type=float, default=0.25)
+    args = parser.parse_args()
+
+    # Keep benchmark renders out of the shared artifact store.
+    scratch = tempfile.mkdtemp(prefix="interlude-bench-artifacts-")
+    os.environ["INTERLUDE_ARTIFACT_DIR"] = scratch
+    try:
+        report = run_benchmarks(args.lengths, max(1, args.repeat))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results: {args.output.resolve()}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved baseline: {args.baseline.resolve()}")
+        return 0
+    if not args.baseline.exists():
+        print("No baseline to compare against; rerun with --save-baseline to create one.")
+        return 0
+
+    regressions = compare(
+        report,
+        json.loads(args.baseline.read_text(encoding="utf-8")),
+        args.max_throughput_drop,
+        args.max_memory_growth,
+    )
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regressions against {args.baseline.resolve()}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+AGE_SECONDS = 3600.0
+
+
+def _age_all(db_path, seconds: float, namespace: str | None = None) -> None:
+    """Backdates last use, as if nothing (in namespace) had been read for seconds."""
+    with sqlite3.connect(str(db_path)) as conn:
+        conn.execute(
+            "UPDATE artifacts SET accessed_at = ? WHERE ? IS NULL OR namespace = ?",
+            (time.time() - seconds, namespace, namespace),
+        )
+
+
+def main() -> int:
+    """
+    Checks that artifact GC keeps a pre-rendered ad's mix for as long as the
+    prerender record is in use, and still removes mixes nothing refers to.
+    Runs against a scratch artifact store.
+    """
+    scratch = tempfile.mkdtemp(prefix="interlude-gc-check-")
+    os.environ["INTERLUDE_ARTIFACT_DIR"] = scratch
+
+    from backend.services.artifact_store import ArtifactStore, get_artifact_store
+    from backend.services.audio_service import GENERATED_DIR
+    from backend.services.catalog_service import get_catalog
+    from backend.services.prerender_service import find_prerender, save_prerender
+
+    store = get_artifact_store()
+    song = get_catalog().songs()[0]
+    prompt = f"gc check {uuid.uuid4().hex}"
+    keys = [ArtifactStore.key("gc-check", prompt, name) for name in ("mix", "stray")]
+    mix, stray = (GENERATED_DIR / f"{key[:32]}_gc_check.wav" for key in keys)
+    failures = []
+
+    def write(tmp) -> None:
+        tmp.write_bytes(b"\0" * 1024)
+
+    try:
+        for key, dest in zip(keys, (mix, stray)):
+            store.publish("mix", key, write, suffix=".wav", dest=dest)
+        save_prerender(song, prompt, "la la la", {"wav": f"/audio/generated/{mix.name}"})
+
+        # Nothing read for an hour, then one prerender hit; only the record's
+        # reference to the mix keeps it, since the mix itself looks stale.
+        _age_all(store.db_path, AGE_SECONDS)
+        if find_prerender(song, prompt, ["wav"]) is None:
+            failures.append("prerender missing before GC")
+        _age_all(store.db_path, AGE_SECONDS, namespace="mix")
+        report = store.collect(max_age_seconds=AGE_SECONDS / 2)
+        print(f"GC: {report}")
+
+        if find_prerender(song, prompt, ["wav"]) is None:
+            failures.append("prerender lost its mix to GC")
+        if stray.exists():
+            failures.append("unreferenced stale mix survived GC")
+    finally:
+        mix.unlink(missing_ok=True)
+        stray.unlink(missing_ok=True)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: pre-rendered mixes survive GC while their record is used")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,663 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from backend.utils.paths import repo_root
+
+BENCH_DIR = repo_root() / ".interlude" / "bench"
+DEFAULT_CONCURRENCY = (1, 2, 4, 8, 16)
+REQUEST_TIMEOUT_SECONDS = 300
+SAMPLE_INTERVAL_SECONDS = 0.5
+QUANTILES = (0.5, 0.95, 0.99)
+PROMPTS = (
+    "a neighbourhood bakery that opens at dawn",
+    "a running shoe built for rainy cities",
+    "a sparkling lemon soda",
+    "a public library's late-night study hall",
+    "a bike repair shop run by two sisters",
+    "a meditation app for night-shift nurses",
+    "a farmers market every Saturday morning",
+    "a local radio station's charity drive",
+)
+SONGIFY_LYRICS = (
+    "we ride the wave tonight\nsip the cola feel the light\nevery bubble every beat",
+    "lace them up and hit the rain\nevery puddle every lane\nnever slowing down again",
+    "open late for every dream\nquiet pages soft and clean\nfind the words in between",
+)
+SONGIFY_STYLES = ("talk_sing", "chant", "rap")
+LYRIC_WORDS = (
+    "city", "morning", "rhythm", "golden", "river", "window", "dancing", "echo",
+    "summer", "highway", "neon", "heartbeat", "shadow", "silver", "thunder", "bloom",
+)
+_AD_IDEA = re.compile(r'Ad idea that must be included clearly: "(.*)"')
+_METRIC_LINE = re.compile(r"^(?P<name>[a-z_]+)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class StandIns:
+    """
+    Local Groq and Gradium stand-ins with configurable latency, so a load
+    test exercises the real pipeline without touching either API.
+    """
+
+    def __init__(
+        self,
+        llm_latency: float,
+        tts_latency: float,
+        error_rate: float = 0.0,
+        sample_rate: int = 44100,
+        port: int = 0,
+    ) -> None:
+        self.llm_latency = llm_latency
+        self.tts_latency = tts_latency
+        self.error_rate = error_rate
+        self.sample_rate = sample_rate
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(7)
+        self._speech = None
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand-ins", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def env(self) -> Dict[str, str]:
+        return {
+            "GROQ_API_URL": f"{self.base_url}/openai/v1/chat/completions",
+            "GRADIUM_TTS_URL": f"{self.base_url}/api/post/speech/tts",
+            "GROQ_API_KEY": "load-test",
+            "GRADIUM_API_KEY": "load-test",
+        }
+
+    def start(self) -> "StandIns":
+        from backend.scripts.benchmark_audio import speech_like
+
+        # One long take, sliced per request, keeps the stand-in's own CPU
+        # cost out of the numbers.
+        self._speech = speech_like(15.0, seed=11, sr=self.sample_rate)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _fail(self, kind: str) -> bool:
+        with self._lock:
+            self.calls[kind] += 1
+            return self._random.random() < self.error_rate
+
+    def _jitter(self, seconds: float) -> float:
+        with self._lock:
+            return seconds * self._random.uniform(0.8, 1.2)
+
+    def lyrics_for(self, prompt: str, temperature: float) -> List[str]:
+        match = _AD_IDEA.search(prompt)
+        idea = match.group(1) if match else "the show"
+        digest = hashlib.sha256(f"{prompt}|{temperature}".encode("utf-8")).digest()
+        words = [LYRIC_WORDS[byte % len(LYRIC_WORDS)] for byte in digest[:12]]
+        return [
+            f"{words[0]} {words[1]} in the {words[2]} light",
+            f"singing about {idea}",
+            f"{words[3]} {words[4]} all through the night",
+            f"{words[5]} hearts and {words[6]} {words[7]} sound",
+        ]
+
+    def wav_for(self, text: str) -> bytes:
+        import soundfile as sf
+
+        # Offset by a hash of the text so different lyrics never produce
+        # identical audio and share a mix downstream.
+        length = int(min(12.0, max(1.0, 0.3 * len(text.split()))) * self.sample_rate)
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        offset = int.from_bytes(digest[:4], "big") % (len(self._speech) - length)
+        buffer = io.BytesIO()
+        sf.write(buffer, self._speech[offset : offset + length], self.sample_rate, format="WAV")
+        return buffer.getvalue()
+
+    def _handler(self):
+        stand_ins = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                return
+
+            def _reply(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/chat/completions"):
+                    self._chat(payload)
+                elif self.path.endswith("/speech/tts"):
+                    self._tts(payload)
+                else:
+                    self._reply(404, b"not found", "text/plain")
+
+            def _chat(self, payload: Dict[str, Any]) -> None:
+                latency = stand_ins._jitter(stand_ins.llm_latency)
+                if stand_ins._fail("llm"):
+                    time.sleep(latency / 4)
+                    self._reply(503, b'{"error": "stand-in overloaded"}', "application/json")
+                    return
+                prompt = payload["messages"][-1]["content"]
+                lines = stand_ins.lyrics_for(prompt, payload.get("temperature", 1.0))
+                if not payload.get("stream"):
+                    time.sleep(latency)
+                    body = {"choices": [{"message": {"role": "assistant", "content": "\n".join(lines)}}]}
+                    self._reply(200, json.dumps(body).encode("utf-8"), "application/json")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for line in lines:
+                    time.sleep(latency / len(lines))
+                    chunk = {"choices": [{"delta": {"content": line + "\n"}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def _tts(self, payload: Dict[str, Any]) -> None:
+                latency = stand_ins._jitter(stand_ins.tts_latency)
+                time.sleep(latency)
+                if stand_ins._fail("tts"):
+                    self._reply(503, b"stand-in overloaded", "text/plain")
+                    return
+                self._reply(200, stand_ins.wav_for(str(payload.get("text", ""))), "audio/wav")
+
+        return Handler
+
+
+class Workload:
+    """
+    Thread-safe request mix across catalog songs and prompts. Cold runs tag
+    every prompt so no cache or coalescing can answer it; warm runs reuse a
+    small pool the way repeat traffic would.
+    """
+
+    def __init__(
+        self,
+        song_ids: List[str],
+        songify_ratio: float,
+        pipelined_ratio: float,
+        cold: bool,
+        seed: int,
+    ) -> None:
+        self.song_ids = song_ids
+        self.songify_ratio = songify_ratio
+        self.pipelined_ratio = pipelined_ratio
+        self.cold = cold
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _tag(self) -> str:
+        return f" (run {uuid.uuid4().hex[:8]})" if self.cold else ""
+
+    def next(self) -> Tuple[str, str, Dict[str, Any]]:
+        with self._lock:
+            if self.song_ids and self._random.random() >= self.songify_ratio:
+                song_id = self._random.choice(self.song_ids)
+                return "generate", song_id, {
+                    "song_id": song_id,
+                    "ad_prompt": self._random.choice(PROMPTS) + self._tag(),
+                    "pipelined": self._random.random() < self.pipelined_ratio,
+                }
+            return "songify", "-", {
+                "lyrics": self._random.choice(SONGIFY_LYRICS) + self._tag(),
+                "bpm": self._random.choice((96, 110, 120, 128)),
+                "key": "C_minor",
+                "style": self._random.choice(SONGIFY_STYLES),
+            }
+
+
+class ProcessSampler:
+    """
+    Samples a process's CPU time and thread count. Reads /proc when it is
+    available; otherwise it can only watch the current process.
+    """
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.threads_peak = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _read(self) -> Tuple[float, int]:
+        proc = Path(f"/proc/{self.pid}")
+        if proc.exists():
+            fields = (proc / "stat").read_text().rsplit(")", 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / self._ticks
+            status = (proc / "status").read_text()
+            threads = int(re.search(r"^Threads:\s+(\d+)", status, re.M).group(1))
+            return cpu, threads
+        times = os.times()
+        return times.user + times.system, threading.active_count()
+
+    def _run(self) -> None:
+        while not self._stop.wait(SAMPLE_INTERVAL_SECONDS):
+            try:
+                _, threads = self._read()
+            except (OSError, AttributeError, ValueError):
+                return
+            self.threads_peak = max(self.threads_peak, threads)
+
+    def __enter__(self) -> "ProcessSampler":
+        self._cpu_start, self.threads_peak = self._read()
+        self._wall_start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        cpu_end, threads = self._read()
+        self.threads_peak = max(self.threads_peak, threads)
+        self.cpu_seconds = cpu_end - self._cpu_start
+        self.wall_seconds = time.perf_counter() - self._wall_start
+
+    def report(self) -> Dict[str, Any]:
+        cores = os.cpu_count() or 1
+        busy = self.cpu_seconds / self.wall_seconds if self.wall_seconds > 0 else 0.0
+        report: Dict[str, Any] = {
+            "pid": self.pid,
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "cpu_cores_busy": round(busy, 3),
+            "cpu_utilization": round(busy / cores, 4),
+            "threads_peak": self.threads_peak,
+        }
+        if hasattr(os, "getloadavg"):
+            report["loadavg_1m"] = round(os.getloadavg()[0], 2)
+        return report
+
+
+def parse_stage_histograms(text: str) -> Dict[str, Dict[str, Any]]:
+    """Per-stage buckets and error counts from the /metrics exposition."""
+    stages: Dict[str, Dict[str, Any]] = {}
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match:
+            continue
+        name = match.group("name")
+        labels = dict(_LABEL.findall(match.group("labels") or ""))
+        stage = labels.get("stage")
+        if stage is None:
+            continue
+        entry = stages.setdefault(stage, {"buckets": {}, "count": 0.0, "sum": 0.0, "errors": 0.0})
+        value = float(match.group("value"))
+        if name == "interlude_stage_seconds_bucket":
+            entry["buckets"][float(labels["le"])] = value
+        elif name == "interlude_stage_seconds_count":
+            entry["count"] = value
+        elif name == "interlude_stage_seconds_sum":
+            entry["sum"] = value
+        elif name == "interlude_stage_errors_total":
+            entry["errors"] = value
+    return stages
+
+
+def histogram_quantile(q: float, buckets: Dict[float, float]) -> float | None:
+    """Linear interpolation inside cumulative buckets, as Prometheus does."""
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] <= 0:
+        return None
+    rank = q * buckets[bounds[-1]]
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if math.isinf(bound):
+                return lower
+            if count == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (count - below)
+        lower, below = bound, count
+    return lower
+
+
+def stage_report(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    for stage, entry in sorted(after.items()):
+        prior = before.get(stage, {"buckets": {}, "count": 0.0, "sum": 0.0, "errors": 0.0})
+        count = entry["count"] - prior["count"]
+        errors = entry["errors"] - prior["errors"]
+        if count <= 0 and errors <= 0:
+            continue
+        buckets = {bound: value - prior["buckets"].get(bound, 0.0) for bound, value in entry["buckets"].items()}
+        stats: Dict[str, Any] = {"count": int(count), "errors": int(errors)}
+        if count > 0:
+            stats["mean_ms"] = round((entry["sum"] - prior["sum"]) / count * 1000, 1)
+            for q in QUANTILES:
+                value = histogram_quantile(q, buckets)
+                stats[f"p{int(q * 100)}_ms"] = None if value is None else round(value * 1000, 1)
+        report[stage] = stats
+    return report
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    summary: Dict[str, Any] = {"count": len(ordered), "mean_ms": round(statistics.fmean(ordered) * 1000, 1)}
+    for q in QUANTILES:
+        summary[f"p{int(q * 100)}_ms"] = round(pick(q) * 1000, 1)
+    summary["max_ms"] = round(ordered[-1] * 1000, 1)
+    return summary
+
+
+def _send(session, base_url: str, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"kind": kind, "ok": False, "error": None, "urls": []}
+    try:
+        response = session.post(f"{base_url}/api/{kind}", json=payload, timeout=REQUEST_TIMEOUT_SECONDS)
+        result["status"] = response.status_code
+        if response.status_code == 200:
+            body = response.json()
+            result["urls"] = [body.get(name) for name in ("audio_url", "raw_tts_url", "songified_url") if body.get(name)]
+            for rendition in (body.get("renditions") or {}).values():
+                result["urls"].extend(rendition.values() if isinstance(rendition, dict) else [rendition])
+            # /api/generate answers 200 with audio_error when TTS or the mix
+            # failed; that is not a usable ad.
+            result["error"] = body.get("audio_error")
+            result["ok"] = result["error"] is None
+        else:
+            result["error"] = f"HTTP {response.status_code}: {response.text[:120]}"
+    except Exception as exc:
+        result["status"] = None
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["latency"] = time.perf_counter() - started
+    return result
+
+
+def run_step(
+    base_url: str,
+    workload: Workload,
+    concurrency: int,
+    seconds: float,
+    server_pid: int | None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Closed loop: concurrency clients each send their next request as soon as
+    the previous one returns, until the step's time is up. CPU and threads
+    are only sampled when the server's pid is known.
+    """
+    import requests
+
+    results: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client() -> None:
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                kind, song_id, payload = workload.next()
+                result = _send(session, base_url, kind, payload)
+                result["song_id"] = song_id
+                with lock:
+                    results.append(result)
+
+    before = parse_stage_histograms(requests.get(f"{base_url}/metrics", timeout=30).text)
+    sampler = ProcessSampler(server_pid) if server_pid is not None else None
+    started = time.perf_counter()
+    with sampler or nullcontext():
+        clients = [threading.Thread(target=client, name=f"client-{idx}") for idx in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+    wall_seconds = sampler.wall_seconds if sampler is not None else time.perf_counter() - started
+    after = parse_stage_histograms(requests.get(f"{base_url}/metrics", timeout=30).text)
+
+    ok = [result for result in results if result["ok"]]
+    errors = Counter(str(result["error"])[:160] for result in results if not result["ok"])
+    latency = {"all": latency_summary([result["latency"] for result in results])}
+    for kind in sorted({result["kind"] for result in results}):
+        latency[kind] = latency_summary([result["latency"] for result in results if result["kind"] == kind])
+    step = {
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(ok) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "latency": latency,
+        "stages": stage_report(before, after),
+        "top_errors": [{"error": error, "count": count} for error, count in errors.most_common(5)],
+        "saturation": sampler.report() if sampler is not None else None,
+    }
+    return step, [url for result in results for url in result["urls"]]
+
+
+def summarize(steps: List[Dict[str, Any]], max_error_rate: float, knee_factor: float) -> Dict[str, Any]:
+    """Best sustained concurrency and the first step where latency or errors collapse."""
+    if not steps:
+        return {}
+    best = max(steps, key=lambda step: step["throughput_rps"])
+    baseline_p95 = steps[0]["latency"]["all"].get("p95_ms")
+    knee = None
+    for step in steps:
+        p95 = step["latency"]["all"].get("p95_ms")
+        if step["error_rate"] > max_error_rate or (
+            baseline_p95 and p95 and p95 > baseline_p95 * knee_factor
+        ):
+            knee = step["concurrency"]
+            break
+    return {
+        "peak_throughput_rps": best["throughput_rps"],
+        "peak_throughput_concurrency": best["concurrency"],
+        "knee_concurrency": knee,
+        "knee_rule": f"error_rate > {max_error_rate} or p95 > {knee_factor}x the first step",
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_in_process():
+    """Runs the app under uvicorn on a spare localhost port in this process."""
+    import uvicorn
+
+    from backend.main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=_free_port(), log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 60
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("In-process server failed to start.")
+        time.sleep(0.05)
+    return f"http://{config.host}:{config.port}", server, thread
+
+
+def _song_ids(base_url: str, wanted: List[str] | None) -> List[str]:
+    import requests
+
+    songs = [song["song_id"] for song in requests.get(f"{base_url}/api/songs", timeout=30).json()]
+    if wanted:
+        missing = sorted(set(wanted) - set(songs))
+        if missing:
+            raise SystemExit(f"Unknown song ids: {', '.join(missing)}")
+        return wanted
+    return songs
+
+
+def _remove_outputs(urls: List[str]) -> int:
+    from backend.api.routes import PUBLIC_DIR
+    from backend.services.audio_service import GENERATED_DIR
+
+    removed = 0
+    generated = GENERATED_DIR.resolve()
+    for url in set(urls):
+        path = (PUBLIC_DIR / url.lstrip("/")).resolve()
+        if path.parent == generated and path.is_file():
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test /api/generate and /api/songify.")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: tuple(int(part) for part in value.split(",")),
+        default=DEFAULT_CONCURRENCY,
+        help="Comma-separated concurrency ramp (default: 1,2,4,8,16)",
+    )
+    parser.add_argument("--step-seconds", type=float, default=20.0)
+    parser.add_argument("--target", help="Base URL of a running server; default runs the app in-process")
+    parser.add_argument("--server-pid", type=int, help="PID of the --target server, for CPU and thread sampling")
+    parser.add_argument("--songs", type=lambda value: value.split(","), help="Comma-separated song ids")
+    parser.add_argument("--songify-ratio", type=float, default=0.2)
+    parser.add_argument("--pipelined-ratio", type=float, default=0.0)
+    parser.add_argument("--warm", action="store_true", help="Reuse prompts so caches and coalescing apply")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Stand-in Groq latency in seconds")
+    parser.add_argument("--tts-latency", type=float, default=1.5, help="Stand-in Gradium latency in seconds")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-port", type=int, default=0, help="Fixed stand-in port, for use with --target")
+    parser.add_argument("--max-error-rate", type=float, default=0.05)
+    parser.add_argument("--knee-factor", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep-output", action="store_true", help="Keep mixed files in public/audio/generated")
+    parser.add_argument("--output", type=Path, default=BENCH_DIR / "load_latest.json")
+    args = parser.parse_args()
+
+    stand_ins = StandIns(args.llm_latency, args.tts_latency, args.stub_error_rate, port=args.stub_port).start()
+    server = None
+    server_thread = None
+    scratch = None
+    if args.target:
+        base_url = args.target.rstrip("/")
+        # Without the server's pid there is nothing meaningful to sample;
+        # this process's own CPU would only measure the harness.
+        server_pid = args.server_pid
+        if server_pid is None:
+            print("No --server-pid given; CPU and thread saturation will not be reported.")
+        print("Point the server at the stand-ins with:")
+        for name, value in stand_ins.env.items():
+            print(f"  export {name}={value}")
+    else:
+        # Set before the app is imported so every service sees the stand-ins
+        # and nothing lands in the shared caches or job database.
+        scratch = Path(tempfile.mkdtemp(prefix="interlude-load-"))
+        os.environ.update(stand_ins.env)
+        os.environ["INTERLUDE_ARTIFACT_DIR"] = str(scratch / "artifacts")
+        os.environ["INTERLUDE_JOBS_DB"] = str(scratch / "jobs.sqlite3")
+        base_url, server, server_thread = _serve_in_process()
+        server_pid = os.getpid()
+
+    workload = Workload(
+        _song_ids(base_url, args.songs),
+        args.songify_ratio,
+        args.pipelined_ratio,
+        cold=not args.warm,
+        seed=args.seed,
+    )
+    steps: List[Dict[str, Any]] = []
+    outputs: List[str] = []
+    try:
+        for concurrency in args.concurrency:
+            step, urls = run_step(base_url, workload, concurrency, args.step_seconds, server_pid)
+            steps.append(step)
+            outputs.extend(urls)
+            latency = step["latency"]["all"]
+            saturation = step["saturation"]
+            usage = (
+                f"  cpu={saturation['cpu_cores_busy']:.2f} cores  threads={saturation['threads_peak']}"
+                if saturation is not None
+                else ""
+            )
+            print(
+                f"c={concurrency:<3} {step['requests']:>4} req  {step['throughput_rps']:.2f} ok/s  "
+                f"p50={latency.get('p50_ms')}ms p95={latency.get('p95_ms')}ms p99={latency.get('p99_ms')}ms  "
+                f"errors={step['error_rate']:.1%}{usage}",
+                flush=True,
+            )
+    finally:
+        if server is not None:
+            server.should_exit = True
+            server_thread.join(timeout=30)
+            if not args.keep_output:
+                _remove_outputs(outputs)
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+        stand_ins.stop()
+
+    report = {
+        "meta": {
+            "created_at": time.time(),
+            "target": args.target or "in-process",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "step_seconds": args.step_seconds,
+            "songs": workload.song_ids,
+            "songify_ratio": args.songify_ratio,
+            "pipelined_ratio": args.pipelined_ratio,
+            "cache": "warm" if args.warm else "cold",
+            "stand_ins": {
+                "llm_latency": args.llm_latency,
+                "tts_latency": args.tts_latency,
+                "error_rate": args.stub_error_rate,
+                "calls": dict(stand_ins.calls),
+            },
+            # In-process runs share one process between server, clients and
+            # stand-ins, so CPU figures include the harness itself.
+            "saturation_scope": (
+                "whole process" if not args.target else "server" if args.server_pid else None
+            ),
+        },
+        "summary": summarize(steps, args.max_error_rate, args.knee_factor),
+        "steps": steps,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report["summary"], indent=2))
+    print(f"Report: {args.output.resolve()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
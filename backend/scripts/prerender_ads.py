@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from backend.utils.paths import repo_root
+
+DEFAULT_MANIFEST = repo_root() / ".interlude" / "prerender" / "manifest.json"
+DEFAULT_FORMATS = "mp3, opus"
+
+
+def _entry_id(song_id: str, ad_prompt: str) -> str:
+    return f"{song_id}|{' '.join(ad_prompt.split()).casefold()}"
+
+
+def read_prompts(path: Path | None, inline: List[str]) -> List[str]:
+    """Prompts from --prompt flags plus a file with one prompt per line (# comments)."""
+    prompts = [prompt.strip() for prompt in inline if prompt.strip()]
+    if path is not None:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                prompts.append(line)
+    unique: Dict[str, str] = {}
+    for prompt in prompts:
+        unique.setdefault(" ".join(prompt.split()).casefold(), prompt)
+    return list(unique.values())
+
+
+class Manifest:
+    """
+    Campaign manifest: one entry per song and prompt with its status, lyrics
+    and rendition URLs. Rewritten atomically after every item, so an
+    interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path: Path, formats: List[str]) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            self.entries = {_entry_id(e["song_id"], e["ad_prompt"]): e for e in data.get("entries", [])}
+        self.formats = formats
+
+    def get(self, song_id: str, ad_prompt: str) -> Dict[str, Any] | None:
+        with self._lock:
+            return self.entries.get(_entry_id(song_id, ad_prompt))
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.entries[_entry_id(entry["song_id"], entry["ad_prompt"])] = entry
+            payload = {
+                "formats": self.formats,
+                "updated_at": time.time(),
+                "entries": sorted(self.entries.values(), key=lambda e: (e["song_id"], e["ad_prompt"])),
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".{self.path.name}.tmp")
+            tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+def prerender_one(song_id: str, ad_prompt: str, accept_audio: str) -> Dict[str, Any]:
+    """Runs the /api/generate pipeline for one item and indexes the result."""
+    from backend.api.generate_ad import FAILED_LYRICS_PREFIX
+    from backend.api.routes import GenerateRequest, run_generate
+    from backend.services.admission_service import patient
+    from backend.services.catalog_service import get_catalog
+    from backend.services.prerender_service import save_prerender
+
+    started = time.perf_counter()
+    entry: Dict[str, Any] = {"song_id": song_id, "ad_prompt": ad_prompt, "status": "failed"}
+    try:
+        # Batch work queues for stage slots rather than taking 429s.
+        with patient():
+            response = run_generate(
+                GenerateRequest(song_id=song_id, ad_prompt=ad_prompt, accept_audio=accept_audio)
+            )
+        if response.lyrics.startswith(FAILED_LYRICS_PREFIX):
+            entry["error"] = response.lyrics
+        elif response.audio_error or not response.renditions:
+            entry["error"] = response.audio_error or "No audio rendered."
+        else:
+            save_prerender(get_catalog().get(song_id), ad_prompt, response.lyrics, response.renditions)
+            entry.update(status="done", lyrics=response.lyrics, renditions=response.renditions)
+    except Exception as exc:
+        entry["error"] = f"{type(exc).__name__}: {exc}"
+    entry["duration_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+    entry["updated_at"] = time.time()
+    return entry
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Pre-render ads for every song and prompt so /api/generate serves them from disk."
+    )
+    parser.add_argument("--prompts", type=Path, help="File with one ad prompt per line")
+    parser.add_argument("--prompt", action="append", default=[], help="Ad prompt (repeatable)")
+    parser.add_argument("--songs", type=lambda value: value.split(","), help="Comma-separated song ids (default: all)")
+    parser.add_argument("--formats", default=DEFAULT_FORMATS, help=f"Accept-style formats (default: {DEFAULT_FORMATS!r})")
+    parser.add_argument("--workers", type=int, default=2, help="Items rendered in parallel")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    from backend.services.catalog_service import get_catalog
+    from backend.services.delivery_service import negotiate_formats
+    from backend.services.prerender_service import find_prerender
+    from backend.utils.env import load_env
+
+    load_env()
+    prompts = read_prompts(args.prompts, args.prompt)
+    if not prompts:
+        parser.error("no prompts given; use --prompt or --prompts")
+    catalog = get_catalog()
+    song_ids = args.songs or [song.song_id for song in catalog.songs()]
+    unknown = [song_id for song_id in song_ids if catalog.get(song_id) is None]
+    if unknown:
+        parser.error(f"unknown song ids: {', '.join(unknown)}")
+
+    formats = negotiate_formats(args.formats, streams=True)
+    manifest = Manifest(args.manifest, formats)
+    todo: List[Tuple[str, str]] = []
+    skipped = 0
+    for song_id in song_ids:
+        for prompt in prompts:
+            entry = manifest.get(song_id, prompt)
+            if entry and entry.get("status") == "done" and find_prerender(catalog.get(song_id), prompt, formats):
+                skipped += 1
+                continue
+            todo.append((song_id, prompt))
+    print(
+        f"{len(song_ids) * len(prompts)} items ({len(song_ids)} songs x {len(prompts)} prompts), "
+        f"{skipped} already pre-rendered, {len(todo)} to render as {', '.join(formats)}",
+        flush=True,
+    )
+
+    failed = 0
+    accept_audio = ", ".join(formats)
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="prerender") as pool:
+        futures = [pool.submit(prerender_one, song_id, prompt, accept_audio) for song_id, prompt in todo]
+        for done, future in enumerate(as_completed(futures), start=1):
+            entry = future.result()
+            manifest.record(entry)
+            failed += entry["status"] != "done"
+            detail = entry.get("error") or ", ".join(entry["renditions"].values())
+            print(
+                f"[{done}/{len(todo)}] {entry['status']:<6} {entry['song_id']} "
+                f"{entry['ad_prompt']!r} ({entry['duration_ms'] / 1000:.1f}s) {detail}",
+                flush=True,
+            )
+
+    print(f"Manifest: {args.manifest.resolve()} ({len(todo) - failed} rendered, {failed} failed, {skipped} skipped)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
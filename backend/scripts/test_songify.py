@@ -25,7 +25,7 @@ def main() -> None:
     GENERATED_DIR.mkdir(parents=True, exist_ok=True)
 
     raw_path = Path(generate_voice(text=lyrics))
-    songified_path = GENERATED_DIR / "test_songified.wav"
+    songified_path = GENERATED_DIR / f"{raw_path.stem}_songified.wav"
     songify_tts_to_singing(
         input_wav=raw_path,
         lyrics=lyrics,
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, TypeVar
+
+from backend.services.metrics_service import STAGE_REJECTIONS, STAGE_WAIT_SECONDS
+
+T = TypeVar("T")
+
+logger = logging.getLogger("interlude.admission")
+
+STAGES = ("llm", "tts", "dsp", "encode")
+_CPU_COUNT = os.cpu_count() or 1
+_DEFAULT_LIMITS = {"llm": 8, "tts": 8, "dsp": _CPU_COUNT, "encode": _CPU_COUNT}
+_QUEUE_TIMEOUT_SECONDS = float(os.getenv("STAGE_QUEUE_TIMEOUT_SECONDS", "30"))
+
+# Background job workers are already bounded by the job queue; they wait
+# for a slot instead of being turned away.
+_PATIENT: ContextVar[bool] = ContextVar("interlude_admission_patient", default=False)
+# Encodes on the small background rendition pools skip the limits entirely:
+# the pools bound them already, and a request should never queue for a slot
+# held by work nobody is waiting on.
+_BACKGROUND: ContextVar[bool] = ContextVar("interlude_admission_background", default=False)
+
+
+class StageBusy(RuntimeError):
+    """A stage's slots and wait queue are full; the caller should retry later."""
+
+    def __init__(self, stage: str, retry_after: int, reason: str) -> None:
+        super().__init__(f"The {stage} stage is at capacity ({reason}). Retry in {retry_after}s.")
+        self.stage = stage
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class StageLimiter:
+    """
+    Semaphore with a bounded wait queue. Up to limit callers run at once, up
+    to queue_limit more wait (each for at most timeout seconds), and anyone
+    beyond that is rejected immediately with StageBusy so overload turns
+    into fast 429s instead of every request slowing down together.
+    """
+
+    def __init__(self, stage: str, limit: int, queue_limit: int, timeout: float) -> None:
+        self.stage = stage
+        self.limit = max(1, limit)
+        self.queue_limit = max(0, queue_limit)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        # Smoothed slot hold time, used to estimate Retry-After.
+        self._hold_seconds = 1.0
+
+    def retry_after(self) -> int:
+        backlog = (self._waiting + 1) / self.limit
+        return max(1, math.ceil(self._hold_seconds * backlog))
+
+    def acquire(self, patient: bool = False) -> None:
+        started = time.perf_counter()
+        with self._cond:
+            if self._active >= self.limit:
+                if self._waiting >= self.queue_limit and not patient:
+                    self._rejected += 1
+                    STAGE_REJECTIONS.inc(stage=self.stage, reason="queue_full")
+                    raise StageBusy(self.stage, self.retry_after(), "queue full")
+                self._waiting += 1
+                deadline = None if patient else started + self.timeout
+                try:
+                    while self._active >= self.limit:
+                        remaining = None if deadline is None else deadline - time.perf_counter()
+                        if remaining is not None and remaining <= 0:
+                            self._timed_out += 1
+                            STAGE_REJECTIONS.inc(stage=self.stage, reason="timeout")
+                            raise StageBusy(self.stage, self.retry_after(), "queue timeout")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            self._admitted += 1
+        STAGE_WAIT_SECONDS.observe(time.perf_counter() - started, stage=self.stage)
+
+    def release(self, held_seconds: float) -> None:
+        with self._cond:
+            self._active -= 1
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held_seconds
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "queued": self._waiting,
+                "queue_limit": self.queue_limit,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "avg_hold_ms": round(self._hold_seconds * 1000, 1),
+            }
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logger.warning("Ignoring invalid %s=%r", name, os.getenv(name))
+        return default
+
+
+_LIMITERS: Dict[str, StageLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+_HELD = threading.local()
+
+
+def get_limiter(stage: str) -> StageLimiter:
+    """
+    Per-stage limiter configured from STAGE_LIMIT_<STAGE> and
+    STAGE_QUEUE_<STAGE> (default: four waiters per slot).
+    """
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(stage)
+        if limiter is None:
+            limit = _env_int(f"STAGE_LIMIT_{stage.upper()}", _DEFAULT_LIMITS.get(stage, _CPU_COUNT))
+            queue_limit = _env_int(f"STAGE_QUEUE_{stage.upper()}", 4 * max(1, limit))
+            limiter = StageLimiter(stage, limit, queue_limit, _QUEUE_TIMEOUT_SECONDS)
+            _LIMITERS[stage] = limiter
+        return limiter
+
+
+@contextmanager
+def admit(stage: str) -> Iterator[None]:
+    """
+    Holds a slot of stage for the block. Re-entrant per thread, so a DSP
+    function calling another DSP function does not wait on itself.
+    """
+    if _BACKGROUND.get():
+        yield
+        return
+    held = getattr(_HELD, "stages", None)
+    if held is None:
+        held = _HELD.stages = set()
+    if stage in held:
+        yield
+        return
+    limiter = get_limiter(stage)
+    limiter.acquire(patient=_PATIENT.get())
+    held.add(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        held.discard(stage)
+        limiter.release(time.perf_counter() - started)
+
+
+def admitted(stage: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> T:
+            with admit(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def patient() -> Iterator[None]:
+    """Callers in this block queue for slots without a bound or timeout."""
+    token = _PATIENT.set(True)
+    try:
+        yield
+    finally:
+        _PATIENT.reset(token)
+
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Work in this block runs outside the stage limits; see _BACKGROUND."""
+    token = _BACKGROUND.set(True)
+    try:
+        yield
+    finally:
+        _BACKGROUND.reset(token)
+
+
+def is_patient() -> bool:
+    """Whether the caller is inside patient(), i.e. a job rather than a request."""
+    return _PATIENT.get()
+
+
+def admission_report() -> Dict[str, Dict[str, Any]]:
+    return {stage: get_limiter(stage).stats() for stage in STAGES}
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional
+
+from backend.services.metrics_service import record_cache
+from backend.utils.paths import repo_root
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of this process.
+    fcntl = None
+
+logger = logging.getLogger("interlude.artifacts")
+
+Producer = Callable[[Path], Optional[Dict[str, Any]]]
+
+# Meta key listing extra files (relative to the artifact's directory) that a
+# producer wrote next to it; they count toward its size and go with it on GC.
+FILES_META = "files"
+# Meta key listing the paths of other artifacts this one points to (a
+# playlist's segments, a prerender's mixes). An artifact counts as used
+# whenever one that references it is, and GC never deletes it while such
+# an artifact survives.
+REFS_META = "refs"
+# Garbage collection: least recently used artifacts are deleted once the
+# store exceeds ARTIFACT_MAX_MB, and any not read for ARTIFACT_MAX_AGE_HOURS
+# are deleted regardless (0 disables either limit). A sweep runs at most
+# every ARTIFACT_GC_INTERVAL_SECONDS per process, in the background.
+MAX_BYTES = int(float(os.getenv("ARTIFACT_MAX_MB", "2048")) * 1024 * 1024)
+MAX_AGE_SECONDS = float(os.getenv("ARTIFACT_MAX_AGE_HOURS", "168")) * 3600
+GC_INTERVAL_SECONDS = float(os.getenv("ARTIFACT_GC_INTERVAL_SECONDS", "600"))
+# Reads refresh accessed_at at most this often, to keep hits read-only.
+_TOUCH_INTERVAL_SECONDS = 60.0
+# How often a lock() with a timeout retries a held lock.
+_LOCK_POLL_SECONDS = 0.05
+
+
+def _flock(handle: Any, deadline: float | None) -> None:
+    """Exclusive flock, polling until deadline (time.monotonic()) when one is given."""
+    if deadline is None:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError from None
+            time.sleep(_LOCK_POLL_SECONDS)
+
+
+class Artifact(NamedTuple):
+    path: Path
+    meta: Dict[str, Any]
+
+
+def _default_root() -> Path:
+    return Path(os.getenv("INTERLUDE_ARTIFACT_DIR", str(repo_root() / ".interlude" / "artifacts")))
+
+
+class ArtifactStore:
+    """
+    Host-wide cache shared by every worker process: a SQLite index plus a
+    blob directory. Producers run under a per-key file lock so only one
+    process computes a given artifact, and results are written to a temp
+    file and published with os.replace so readers never see torn files.
+    The index tracks size and last access, and collect() keeps the store
+    within its byte and age budget.
+    """
+
+    def __init__(self, root: Path | None = None) -> None:
+        self.root = root or _default_root()
+        self.db_path = self.root / "index.sqlite3"
+        self._thread_locks: Dict[str, threading.Lock] = {}
+        self._thread_locks_guard = threading.Lock()
+        self._gc_guard = threading.Lock()
+        self._last_gc = 0.0
+        self._init_db()
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """Stable hex key for any JSON-serializable combination of inputs."""
+        encoded = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self) -> None:
+        (self.root / "locks").mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    meta TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(artifacts)")}
+            if "accessed_at" not in columns:
+                conn.execute("ALTER TABLE artifacts ADD COLUMN accessed_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_lru ON artifacts (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_path ON artifacts (path)")
+
+    def blob_path(self, namespace: str, key: str, suffix: str = "") -> Path:
+        return self.root / "blobs" / namespace / key[:2] / f"{key}{suffix}"
+
+    def lookup(
+        self, namespace: str, key: str, max_age_seconds: float | None = None
+    ) -> Artifact | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT path, meta, created_at, accessed_at FROM artifacts "
+                "WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if max_age_seconds is not None and now - row["created_at"] > max_age_seconds:
+                return None
+            path = Path(row["path"])
+            if not path.is_file():
+                return None
+            if (row["accessed_at"] or 0.0) < now - _TOUCH_INTERVAL_SECONDS:
+                conn.execute(
+                    "UPDATE artifacts SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+        return Artifact(path, json.loads(row["meta"]))
+
+    def touch(self, *paths: Path) -> None:
+        """
+        Marks the artifacts published at these paths as used, for reads that
+        bypass lookup() such as serving the file. Paths that are not
+        artifacts are ignored.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            for path in paths:
+                row = conn.execute(
+                    "SELECT accessed_at FROM artifacts WHERE path = ?", (str(path),)
+                ).fetchone()
+                if row is not None and (row["accessed_at"] or 0.0) < now - _TOUCH_INTERVAL_SECONDS:
+                    conn.execute("UPDATE artifacts SET accessed_at = ? WHERE path = ?", (now, str(path)))
+
+    @contextmanager
+    def lock(self, namespace: str, key: str, timeout: float | None = None) -> Iterator[None]:
+        """
+        Exclusive lock on one artifact across threads and processes. The lock
+        file is removed on release; a waiter that wakes up holding a lock on
+        a removed file retries on the current one. With a timeout, raises
+        TimeoutError once it has waited that many seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if fcntl is None:
+            with self._thread_locks_guard:
+                thread_lock = self._thread_locks.setdefault(f"{namespace}:{key}", threading.Lock())
+            if not thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+                raise TimeoutError(f"Timed out waiting for artifact lock {namespace}/{key[:12]}")
+            try:
+                yield
+            finally:
+                thread_lock.release()
+            return
+        lock_path = self.root / "locks" / f"{namespace}-{key}.lock"
+        while True:
+            handle = lock_path.open("a")
+            try:
+                _flock(handle, deadline)
+            except TimeoutError:
+                handle.close()
+                raise TimeoutError(f"Timed out waiting for artifact lock {namespace}/{key[:12]}") from None
+            try:
+                current = os.stat(lock_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current == os.fstat(handle.fileno()).st_ino:
+                break
+            handle.close()
+        try:
+            yield
+        finally:
+            lock_path.unlink(missing_ok=True)
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+    def publish(
+        self,
+        namespace: str,
+        key: str,
+        produce: Producer,
+        suffix: str = "",
+        dest: Path | None = None,
+    ) -> Artifact:
+        """
+        Runs produce(tmp_path) and atomically moves the result into place.
+        produce may return a metadata dict stored alongside the index entry;
+        its FILES_META list names extra files that belong to the artifact.
+        """
+        final = dest or self.blob_path(namespace, key, suffix)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        tmp = final.with_name(f".{final.stem}.{uuid.uuid4().hex[:8]}.tmp{suffix}")
+        try:
+            meta = produce(tmp) or {}
+            os.replace(tmp, final)
+        finally:
+            tmp.unlink(missing_ok=True)
+        size = final.stat().st_size + sum(
+            (final.parent / name).stat().st_size for name in meta.get(FILES_META, ())
+        )
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO artifacts
+                    (namespace, key, path, size, meta, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (namespace, key, str(final), size, json.dumps(meta), now, now),
+            )
+        self.maybe_collect()
+        return Artifact(final, meta)
+
+    def get_or_create(
+        self,
+        namespace: str,
+        key: str,
+        produce: Producer,
+        suffix: str = "",
+        dest: Path | None = None,
+        max_age_seconds: float | None = None,
+    ) -> Artifact:
+        """Returns the cached artifact, producing it exactly once per host on a miss."""
+        artifact = self.lookup(namespace, key, max_age_seconds)
+        if artifact is not None:
+            logger.info("Artifact hit: %s/%s", namespace, key[:12])
+            record_cache(namespace, True)
+            return artifact
+        with self.lock(namespace, key):
+            artifact = self.lookup(namespace, key, max_age_seconds)
+            record_cache(namespace, artifact is not None)
+            if artifact is not None:
+                logger.info("Artifact hit after wait: %s/%s", namespace, key[:12])
+                return artifact
+            return self.publish(namespace, key, produce, suffix=suffix, dest=dest)
+
+    def collect(
+        self,
+        max_bytes: int = MAX_BYTES,
+        max_age_seconds: float = MAX_AGE_SECONDS,
+    ) -> Dict[str, int]:
+        """
+        Deletes artifacts not used within max_age_seconds, then least
+        recently used ones until the store fits in max_bytes. An artifact's
+        last use includes that of every artifact referencing it (REFS_META),
+        and nothing still referenced by a surviving artifact is deleted.
+        Each row is deleted only if unchanged since it was selected, so a
+        concurrent republish at worst costs one recompute.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT namespace, key, path, size, meta, created_at, "
+                "COALESCE(accessed_at, created_at) AS last_used FROM artifacts"
+            ).fetchall()
+        refs = {row["path"]: json.loads(row["meta"]).get(REFS_META, ()) for row in rows}
+        last_used = {row["path"]: row["last_used"] for row in rows}
+        changed = True
+        while changed:
+            changed = False
+            for path, targets in refs.items():
+                for target in targets:
+                    if last_used.get(target, last_used[path]) < last_used[path]:
+                        last_used[target] = last_used[path]
+                        changed = True
+        # On a tie, referencing artifacts go before what they reference.
+        referenced = {target for targets in refs.values() for target in targets}
+        rows.sort(key=lambda row: (last_used[row["path"]], row["path"] in referenced))
+
+        total = sum(row["size"] for row in rows)
+        victims: Dict[str, sqlite3.Row] = {}
+        for row in rows:
+            expired = max_age_seconds > 0 and now - last_used[row["path"]] > max_age_seconds
+            over_budget = max_bytes > 0 and total > max_bytes
+            if not (expired or over_budget):
+                break
+            victims[row["path"]] = row
+            total -= row["size"]
+        # Spare whatever a survivor still references, transitively.
+        survivors = [row["path"] for row in rows if row["path"] not in victims]
+        while survivors:
+            for target in refs[survivors.pop()]:
+                spared = victims.pop(target, None)
+                if spared is not None:
+                    total += spared["size"]
+                    survivors.append(target)
+
+        freed = 0
+        for row in victims.values():
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "DELETE FROM artifacts WHERE namespace = ? AND key = ? AND created_at = ?",
+                    (row["namespace"], row["key"], row["created_at"]),
+                )
+            if cursor.rowcount != 1:
+                continue
+            path = Path(row["path"])
+            extra = json.loads(row["meta"]).get(FILES_META, ())
+            for file_path in [path, *(path.parent / name for name in extra)]:
+                file_path.unlink(missing_ok=True)
+            freed += row["size"]
+        if victims:
+            logger.info("Artifact GC: removed %s artifacts, %s bytes", len(victims), freed)
+        return {"removed": len(victims), "freed_bytes": freed, "size_bytes": total}
+
+    def maybe_collect(self) -> None:
+        """Starts a background collect() if this process has not run one recently."""
+        with self._gc_guard:
+            if time.time() - self._last_gc < GC_INTERVAL_SECONDS:
+                return
+            self._last_gc = time.time()
+
+        def run() -> None:
+            try:
+                self.collect()
+            except Exception:
+                logger.exception("Artifact GC failed")
+
+        threading.Thread(target=run, name="artifact-gc", daemon=True).start()
+
+
+_STORE: ArtifactStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ArtifactStore()
+        return _STORE
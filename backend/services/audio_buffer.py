@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import subprocess
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence, Tuple
+
+from backend.services.admission_service import admitted
+from backend.services.metrics_service import timed_stage
+from backend.utils.ffmpeg import assert_ffmpeg_available, ffmpeg_path
+
+if TYPE_CHECKING:
+    import numpy as np
+
+INTERNAL_SAMPLE_RATE = 44100
+
+# Suffixes libsndfile encodes in-process: (format, subtype, compression level).
+# MP3 at 0.2 is VBR around lame's V2; Opus keeps libopus's default bitrate.
+NATIVE_ENCODINGS: Dict[str, Tuple[str, str, float | None]] = {
+    ".wav": ("WAV", "PCM_16", None),
+    ".flac": ("FLAC", "PCM_16", None),
+    ".mp3": ("MP3", "MPEG_LAYER_III", 0.2),
+    ".opus": ("OGG", "OPUS", None),
+}
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+@dataclass(frozen=True)
+class AudioBuffer:
+    """
+    In-process audio passed between services: float32 samples shaped
+    (frames, channels) plus the sample rate. Conversions happen on entry
+    (read/decode) and exit (write) only.
+    """
+
+    samples: np.ndarray
+    sample_rate: int
+
+    @property
+    def frames(self) -> int:
+        return int(self.samples.shape[0])
+
+    @property
+    def channels(self) -> int:
+        return int(self.samples.shape[1])
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.frames / float(self.sample_rate) if self.sample_rate else 0.0
+
+    def mono(self) -> np.ndarray:
+        """1-D float32 view (or mixdown) of the samples."""
+        import numpy as np
+
+        if self.channels == 1:
+            return self.samples[:, 0]
+        return self.samples.mean(axis=1, dtype=np.float32)
+
+    def with_layout(self, sample_rate: int, channels: int) -> "AudioBuffer":
+        """Resamples and up/down-mixes only when the layout actually differs."""
+        import numpy as np
+
+        samples = self.samples
+        if self.channels != channels:
+            mono = self.mono()[:, None]
+            samples = mono if channels == 1 else np.repeat(mono, channels, axis=1)
+        if self.sample_rate != sample_rate and samples.shape[0]:
+            import librosa
+
+            samples = librosa.resample(
+                samples.T, orig_sr=self.sample_rate, target_sr=sample_rate, axis=-1
+            ).T
+        if samples is self.samples:
+            return self
+        return AudioBuffer(np.ascontiguousarray(samples, dtype=np.float32), sample_rate)
+
+    def content_hash(self) -> str:
+        import numpy as np
+
+        digest = hashlib.sha256(str(self.sample_rate).encode("ascii"))
+        digest.update(np.ascontiguousarray(self.samples).tobytes())
+        return digest.hexdigest()
+
+
+def from_mono(samples: np.ndarray, sample_rate: int) -> AudioBuffer:
+    import numpy as np
+
+    return AudioBuffer(np.asarray(samples, dtype=np.float32).reshape(-1, 1), sample_rate)
+
+
+@lru_cache(maxsize=8)
+def fade_window(fade_samples: int) -> np.ndarray:
+    """Cached read-only linear 0..1 ramp."""
+    import numpy as np
+
+    fade = np.linspace(0.0, 1.0, fade_samples, dtype=np.float32)
+    fade.setflags(write=False)
+    return fade
+
+
+def overlap_add(
+    segments: Sequence[np.ndarray],
+    fade_samples: int,
+    gap_samples: int = 0,
+) -> np.ndarray:
+    """
+    Assembles 1-D segments into one preallocated buffer in a single pass.
+    Neighbours crossfade over fade_samples when gap_samples is 0; with a gap
+    each segment fades in/out against silence instead.
+    """
+    import numpy as np
+
+    segments = [seg for seg in segments if seg.size]
+    if not segments:
+        return np.zeros(0, dtype=np.float32)
+
+    offsets: List[int] = []
+    fades: List[int] = []
+    cursor = 0
+    for idx, seg in enumerate(segments):
+        offsets.append(cursor)
+        nxt = segments[idx + 1] if idx + 1 < len(segments) else None
+        fade = 0 if nxt is None else min(fade_samples, seg.shape[0], nxt.shape[0])
+        fades.append(fade)
+        cursor += seg.shape[0] + gap_samples - (fade if gap_samples == 0 else 0)
+    total = offsets[-1] + segments[-1].shape[0]
+
+    out = np.zeros(total, dtype=np.float32)
+    fade_in = 0
+    prev_tail: np.ndarray | None = None
+    for seg, offset, fade_out in zip(segments, offsets, fades):
+        end = offset + seg.shape[0]
+        out[offset:end] += seg
+        if fade_in:
+            out[offset : offset + fade_in] *= fade_window(fade_in)
+            if prev_tail is not None:
+                # Put back the previous segment's fading tail under this head.
+                out[offset : offset + fade_in] += prev_tail
+        if fade_out:
+            tail = out[end - fade_out : end]
+            if gap_samples == 0:
+                prev_tail = tail * fade_window(fade_out)[::-1]
+                tail[:] = 0.0
+            else:
+                tail *= fade_window(fade_out)[::-1]
+        fade_in = fade_out
+    return out
+
+
+def concatenate(
+    clips: Sequence[AudioBuffer],
+    gap_ms: int = 120,
+    fade_ms: int = 10,
+) -> AudioBuffer:
+    """
+    Joins mono clips in order with a short silence after each one and
+    click-free edges. Clips are brought to the first clip's sample rate.
+    """
+    import numpy as np
+
+    if not clips:
+        return from_mono(np.zeros(0, dtype=np.float32), INTERNAL_SAMPLE_RATE)
+    sample_rate = clips[0].sample_rate
+    gap_samples = int(gap_ms / 1000 * sample_rate)
+    joined = overlap_add(
+        [clip.with_layout(sample_rate, 1).mono() for clip in clips],
+        fade_samples=int(fade_ms / 1000 * sample_rate),
+        gap_samples=gap_samples,
+    )
+    out = np.zeros(joined.shape[0] + gap_samples, dtype=np.float32)
+    out[: joined.shape[0]] = joined
+    return from_mono(out, sample_rate)
+
+
+def save_buffer(buffer: AudioBuffer, path: Path) -> Dict[str, Any]:
+    """Writes raw float32 samples as .npy; returns the metadata load_buffer needs."""
+    import numpy as np
+
+    with path.open("wb") as file:
+        np.save(file, np.ascontiguousarray(buffer.samples, dtype=np.float32))
+    return {"sample_rate": buffer.sample_rate}
+
+
+def load_buffer(path: Path, meta: Dict[str, Any]) -> AudioBuffer:
+    import numpy as np
+
+    return AudioBuffer(np.load(path), int(meta["sample_rate"]))
+
+
+def _run_ffmpeg(args: List[str], stdin: bytes | None = None) -> bytes:
+    assert_ffmpeg_available()
+    proc = subprocess.run(
+        [ffmpeg_path(), "-nostdin", "-hide_banner", "-loglevel", "error", *args],
+        input=stdin,
+        capture_output=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        detail = proc.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise RuntimeError(f"ffmpeg failed: {detail[-1] if detail else proc.returncode}")
+    return proc.stdout
+
+
+def _ffmpeg_decode(source: Path | bytes) -> AudioBuffer:
+    """
+    Fallback for containers libsndfile cannot read. ffmpeg writes float Sun
+    AU to stdout, which carries the rate and layout and allows an unknown
+    length, so soundfile can parse it straight from memory.
+    """
+    import soundfile as sf
+
+    data = source if isinstance(source, bytes) else None
+    input_arg = "pipe:0" if data is not None else str(source)
+    out = _run_ffmpeg(["-i", input_arg, "-f", "au", "-c:a", "pcm_f32be", "pipe:1"], stdin=data)
+    samples, sample_rate = sf.read(io.BytesIO(out), dtype="float32", always_2d=True)
+    return AudioBuffer(samples, int(sample_rate))
+
+
+@timed_stage("decode")
+def read_audio(path: Path) -> AudioBuffer:
+    """Decodes a file with soundfile, falling back to the ffmpeg CLI."""
+    import soundfile as sf
+
+    try:
+        samples, sample_rate = sf.read(str(path), dtype="float32", always_2d=True)
+        return AudioBuffer(samples, int(sample_rate))
+    except (RuntimeError, sf.LibsndfileError):
+        pass
+    return _ffmpeg_decode(path)
+
+
+@timed_stage("decode")
+def decode_audio(data: bytes) -> AudioBuffer:
+    """Decodes an in-memory payload with soundfile, falling back to the ffmpeg CLI."""
+    import soundfile as sf
+
+    try:
+        samples, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+        return AudioBuffer(samples, int(sample_rate))
+    except (RuntimeError, sf.LibsndfileError):
+        pass
+    return _ffmpeg_decode(data)
+
+
+def native_encoding(path: Path) -> Tuple[str, str, float | None] | None:
+    """libsndfile's (format, subtype, compression level) for path's suffix, if this build writes it."""
+    import soundfile as sf
+
+    encoding = NATIVE_ENCODINGS.get(path.suffix.lower() or ".wav")
+    if encoding is None or encoding[0] not in sf.available_formats():
+        return None
+    return encoding
+
+
+class AudioWriter:
+    """
+    Incremental libsndfile encoder for block-at-a-time output; only for
+    suffixes native_encoding accepts. Opus input at a rate libopus does not
+    take is resampled to 48 kHz on the way through.
+    """
+
+    def __init__(self, path: Path, sample_rate: int, channels: int) -> None:
+        import soundfile as sf
+
+        encoding = native_encoding(path)
+        if encoding is None:
+            raise ValueError(f"No in-process encoder for {path.suffix or 'wav'}")
+        container, subtype, compression_level = encoding
+        self._resampler = None
+        if subtype == "OPUS" and sample_rate not in OPUS_SAMPLE_RATES:
+            import soxr
+
+            self._resampler = soxr.ResampleStream(
+                sample_rate, OPUS_SAMPLE_RATES[-1], channels, dtype="float32"
+            )
+            sample_rate = OPUS_SAMPLE_RATES[-1]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = sf.SoundFile(
+            str(path),
+            "w",
+            samplerate=sample_rate,
+            channels=channels,
+            format=container,
+            subtype=subtype,
+            compression_level=compression_level,
+        )
+
+    def write(self, samples: np.ndarray) -> None:
+        import numpy as np
+
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+        if samples.shape[0]:
+            self._file.write(np.clip(samples, -1.0, 1.0))
+
+    def close(self) -> None:
+        import numpy as np
+
+        if self._resampler is not None:
+            tail = self._resampler.resample_chunk(
+                np.zeros((0, self._file.channels), dtype=np.float32), last=True
+            )
+            self._resampler = None
+            if tail.shape[0]:
+                self._file.write(np.clip(tail, -1.0, 1.0))
+        self._file.close()
+
+    def __enter__(self) -> "AudioWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+@admitted("encode")
+@timed_stage("encode")
+def write_audio(buffer: AudioBuffer, path: Path) -> Path:
+    """
+    Encodes by file suffix. WAV, FLAC, MP3 and Opus are encoded in-process
+    by libsndfile; anything else (or a libsndfile built without the codec)
+    is piped through the ffmpeg CLI.
+    """
+    import numpy as np
+    import soundfile as sf
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ext = path.suffix.lower() or ".wav"
+    encoding = native_encoding(path)
+    if encoding is not None:
+        container, subtype, compression_level = encoding
+        if subtype == "OPUS" and buffer.sample_rate not in OPUS_SAMPLE_RATES:
+            buffer = buffer.with_layout(OPUS_SAMPLE_RATES[-1], buffer.channels)
+        sf.write(
+            str(path),
+            np.clip(buffer.samples, -1.0, 1.0),
+            buffer.sample_rate,
+            format=container,
+            subtype=subtype,
+            compression_level=compression_level,
+        )
+        return path
+
+    # Raw float32 on stdin; ffmpeg picks the codec from the suffix.
+    codec_args = ["-b:a", "192k"] if ext == ".mp3" else []
+    samples = np.clip(buffer.samples, -1.0, 1.0).astype("<f4")
+    _run_ffmpeg(
+        [
+            "-y",
+            "-f", "f32le",
+            "-ar", str(buffer.sample_rate),
+            "-ac", str(buffer.channels),
+            "-i", "pipe:0",
+            *codec_args,
+            str(path),
+        ],
+        stdin=samples.tobytes(),
+    )
+    return path
@@ -1,16 +1,28 @@
 from __future__ import annotations
 
+import os
 import wave
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable, Tuple
 
-from backend.utils.ffmpeg import assert_ffmpeg_available
+from backend.services.admission_service import admit, admitted
+from backend.services.audio_buffer import AudioBuffer, AudioWriter, native_encoding, read_audio, write_audio
+from backend.services.metrics_service import stage_timer, timed_stage
+from backend.services.trace_service import traced
+
+if TYPE_CHECKING:
+    import numpy as np
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
 PUBLIC_AUDIO_DIR = ROOT_DIR / "public" / "audio"
 ORIGINALS_DIR = PUBLIC_AUDIO_DIR / "originals"
 GENERATED_DIR = PUBLIC_AUDIO_DIR / "generated"
 
+# Bump when the mix output changes, so cached and pre-rendered mixes are redone.
+MIX_VERSION = 1
+# Frames per read/write when stream_mix copies audio around the insert window.
+STREAM_BLOCK_FRAMES = int(os.getenv("MIX_STREAM_BLOCK_FRAMES", "65536"))
+
 
 def generate_silence_wav(path: Path, duration_seconds: int, sample_rate: int = 16000) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -49,63 +61,208 @@ def ensure_song_assets(songs: Iterable[dict]) -> None:
         generate_silence_wav(original_path, duration_seconds=max(20, insert_end_seconds + 5))
 
 
-def mix_audio(
+def _ms_to_frames(ms: float, sample_rate: int) -> int:
+    return int(round(ms * sample_rate / 1000.0))
+
+
+def _db_to_gain(db: float) -> float:
+    return float(10 ** (db / 20.0))
+
+
+def _clamp_window(song_frames: int, sample_rate: int, start_ms: int, end_ms: int) -> Tuple[int, int]:
+    song_ms = song_frames * 1000 // sample_rate
+    safe_start = max(0, min(start_ms, song_ms))
+    safe_end = max(safe_start + 1, min(end_ms, song_ms))
+    return safe_start, safe_end
+
+
+def _shape_insert(insert: AudioBuffer, window_ms: int) -> np.ndarray:
+    """Clips the insert to the window and applies the soft fades and room tail."""
+    import numpy as np
+
+    sr = insert.sample_rate
+    window_frames = _ms_to_frames(window_ms, sr)
+    clipped = insert.samples[:window_frames].copy()
+    clipped_ms = clipped.shape[0] * 1000 // sr
+    fade_ms = max(120, min(400, window_ms // 5, clipped_ms // 4))
+    if clipped_ms > fade_ms * 2:
+        fade = _ms_to_frames(fade_ms, sr)
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)[:, None]
+        clipped[:fade] *= ramp
+        clipped[-fade:] *= ramp[::-1]
+
+    # Simple faux reverb tail: two low-level delayed overlays.
+    length = clipped.shape[0]
+    processed = np.zeros((length + _ms_to_frames(180, sr), insert.channels), dtype=np.float32)
+    processed[:length] += clipped
+    for delay_ms, gain_db in ((70, -11), (140, -15)):
+        offset = _ms_to_frames(delay_ms, sr)
+        processed[offset : offset + length] += clipped * _db_to_gain(gain_db)
+    return processed[:window_frames]
+
+
+def _duck_and_overlay(samples: np.ndarray, processed: np.ndarray, start: int, end: int) -> None:
+    samples[start:end] *= _db_to_gain(-8)
+    overlay_end = min(samples.shape[0], start + processed.shape[0])
+    samples[start:overlay_end] += processed[: overlay_end - start]
+
+
+@admitted("dsp")
+@timed_stage("dsp")
+def mix_buffers(song: AudioBuffer, insert: AudioBuffer, start_ms: int, end_ms: int) -> AudioBuffer:
+    """Numpy port of the ducking/fade/faux-reverb mix; insert must match the song layout."""
+    sr = song.sample_rate
+    safe_start, safe_end = _clamp_window(song.frames, sr, start_ms, end_ms)
+    processed = _shape_insert(insert, safe_end - safe_start)
+    mixed = song.samples.copy()
+    _duck_and_overlay(mixed, processed, _ms_to_frames(safe_start, sr), _ms_to_frames(safe_end, sr))
+    return AudioBuffer(mixed, sr)
+
+
+def mixed_frames(song_frames: int, sample_rate: int, start_ms: int, end_ms: int) -> Tuple[int, int]:
+    """The [start, end) song frames a mix of this window can change."""
+    safe_start, safe_end = _clamp_window(song_frames, sample_rate, start_ms, end_ms)
+    start = _ms_to_frames(safe_start, sample_rate)
+    end = max(_ms_to_frames(safe_end, sample_rate), start + _ms_to_frames(safe_end - safe_start, sample_rate))
+    return start, min(song_frames, end)
+
+
+@admitted("dsp")
+@timed_stage("dsp")
+def render_span(
     song_path: Path,
-    insert_path: Path,
+    insert: AudioBuffer,
     start_ms: int,
     end_ms: int,
-    output_path: Path,
-) -> Path:
+    span_start: int,
+    span_end: int,
+) -> AudioBuffer:
     """
-    Mixes ad audio into a song:
-    - duck original song in insert window
-    - apply soft fades + simple room tail on insert
-    - overlay insert at fixed start
+    Song frames [span_start, span_end) with the insert mixed in exactly as
+    stream_mix mixes them; the span must contain mixed_frames(). Lets
+    callers re-render part of a song without decoding the rest.
     """
+    import soundfile as sf
+
+    with sf.SoundFile(str(song_path)) as source:
+        sr = source.samplerate
+        safe_start, safe_end = _clamp_window(source.frames, sr, start_ms, end_ms)
+        processed = _shape_insert(insert.with_layout(sr, source.channels), safe_end - safe_start)
+        source.seek(span_start)
+        span = source.read(span_end - span_start, dtype="float32", always_2d=True)
+    _duck_and_overlay(
+        span,
+        processed,
+        _ms_to_frames(safe_start, sr) - span_start,
+        _ms_to_frames(safe_end, sr) - span_start,
+    )
+    return AudioBuffer(span, sr)
+
+
+def _prepare_inputs(song_path: Path, insert: Path | AudioBuffer, start_ms: int, end_ms: int) -> AudioBuffer:
+    """Fills in placeholder silence for missing WAVs and decodes the insert."""
     if not song_path.exists():
         if song_path.suffix.lower() != ".wav":
             raise FileNotFoundError(f"Missing source audio file: {song_path}")
         duration_seconds = max(20, int(end_ms / 1000) + 5)
         generate_silence_wav(song_path, duration_seconds)
 
-    if not insert_path.exists():
-        generate_silence_wav(insert_path, duration_seconds=max(6, int((end_ms - start_ms) / 1000)))
+    if isinstance(insert, Path):
+        if not insert.exists():
+            generate_silence_wav(insert, duration_seconds=max(6, int((end_ms - start_ms) / 1000)))
+        insert = read_audio(insert)
+    return insert
+
 
+def _streamable(song_path: Path, output_path: Path) -> bool:
+    import soundfile as sf
+
+    if native_encoding(output_path) is None:
+        return False
     try:
-        from pydub import AudioSegment
-    except Exception as exc:
-        raise RuntimeError(
-            "pydub is required for audio mixing. Install backend dependencies first."
-        ) from exc
+        sf.info(str(song_path))
+    except (RuntimeError, sf.LibsndfileError):
+        return False
+    return True
 
-    assert_ffmpeg_available()
 
-    song = AudioSegment.from_file(song_path)
-    insert = AudioSegment.from_file(insert_path)
+def mix_audio(
+    song_path: Path,
+    insert: Path | AudioBuffer,
+    start_ms: int,
+    end_ms: int,
+    output_path: Path,
+) -> Path:
+    """
+    Mixes and encodes by output_path's suffix. Streams the song through
+    stream_mix when libsndfile can decode it and encode the output;
+    otherwise decodes it whole via render_mix.
+    """
+    insert = _prepare_inputs(song_path, insert, start_ms, end_ms)
+    if _streamable(song_path, output_path):
+        return stream_mix(song_path, insert, start_ms, end_ms, output_path)
+    return write_audio(render_mix(song_path, insert, start_ms, end_ms), output_path)
 
-    safe_start = max(0, min(start_ms, len(song)))
-    safe_end = max(safe_start + 1, min(end_ms, len(song)))
-    window_ms = max(1, safe_end - safe_start)
 
-    clipped_insert = insert[:window_ms]
-    fade_ms = max(120, min(400, window_ms // 5, len(clipped_insert) // 4))
-    if len(clipped_insert) > fade_ms * 2:
-        clipped_insert = clipped_insert.fade_in(fade_ms).fade_out(fade_ms)
+@traced("mix_audio")
+def stream_mix(
+    song_path: Path,
+    insert: AudioBuffer,
+    start_ms: int,
+    end_ms: int,
+    output_path: Path,
+) -> Path:
+    """
+    Same mix as render_mix in one pass over the song: audio before the
+    insert window is copied straight to the encoder block by block, the
+    window span is mixed in memory, then the tail is copied. Peak memory
+    is a block plus the window rather than the whole song.
+    """
+    import numpy as np
+    import soundfile as sf
 
-    # Simple faux reverb tail: two low-level delayed overlays.
-    reverb_layer = AudioSegment.silent(duration=len(clipped_insert) + 180)
-    reverb_layer = reverb_layer.overlay(clipped_insert - 11, position=70)
-    reverb_layer = reverb_layer.overlay(clipped_insert - 15, position=140)
-    processed_insert = reverb_layer.overlay(clipped_insert, position=0)[:window_ms]
-
-    ducked_window = song[safe_start:safe_end].apply_gain(-8)
-    ducked_song = song[:safe_start] + ducked_window + song[safe_end:]
-    mixed = ducked_song.overlay(processed_insert, position=safe_start)
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    ext = output_path.suffix.lower().lstrip(".") or "wav"
-    export_args = {"format": ext}
-    if ext == "mp3":
-        export_args["bitrate"] = "192k"
-    mixed.export(output_path, **export_args)
+    with sf.SoundFile(str(song_path)) as source:
+        sr = source.samplerate
+        channels = source.channels
+        safe_start, safe_end = _clamp_window(source.frames, sr, start_ms, end_ms)
+        with admit("dsp"), stage_timer("dsp"):
+            processed = _shape_insert(insert.with_layout(sr, channels), safe_end - safe_start)
+        span_start = _ms_to_frames(safe_start, sr)
+        duck_end = _ms_to_frames(safe_end, sr)
+        span_frames = max(duck_end, span_start + processed.shape[0]) - span_start
+
+        block = np.empty((STREAM_BLOCK_FRAMES, channels), dtype=np.float32)
+        with admit("encode"), stage_timer("encode"), AudioWriter(output_path, sr, channels) as writer:
+            for chunk in source.blocks(frames=span_start, always_2d=True, out=block):
+                writer.write(chunk)
+            span = source.read(span_frames, dtype="float32", always_2d=True)
+            # Timed but not admitted: songify holds dsp while waiting for
+            # encode, so taking dsp under encode here could deadlock.
+            with stage_timer("dsp"):
+                _duck_and_overlay(span, processed, 0, duck_end - span_start)
+            writer.write(span)
+            del span
+            for chunk in source.blocks(always_2d=True, out=block):
+                writer.write(chunk)
     return output_path
+
+
+@traced("mix_audio")
+def render_mix(
+    song_path: Path,
+    insert: Path | AudioBuffer,
+    start_ms: int,
+    end_ms: int,
+) -> AudioBuffer:
+    """
+    Mixes ad audio into a song:
+    - duck original song in insert window
+    - apply soft fades + simple room tail on insert
+    - overlay insert at fixed start
+    The song is decoded once and the insert is converted to the song's
+    sample rate/channel layout once; everything in between stays float32.
+    """
+    insert = _prepare_inputs(song_path, insert, start_ms, end_ms)
+    song = read_audio(song_path)
+    insert = insert.with_layout(song.sample_rate, song.channels)
+    return mix_buffers(song, insert, start_ms, end_ms)
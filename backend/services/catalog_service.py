@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter
+
+from backend.utils.paths import repo_root
+
+SONGS_CONFIG_PATH = repo_root() / "backend" / "config" / "songs.json"
+logger = logging.getLogger("interlude.catalog")
+
+
+class InsertWindow(BaseModel):
+    start_ms: int
+    end_ms: int
+
+
+class AdContext(BaseModel):
+    before_lyrics: str
+    after_lyrics: str
+
+
+class SongSummary(BaseModel):
+    song_id: str
+    title: str
+    artist: str | None = None
+    cover_image: str | None = None
+    file: str
+    bpm: int
+    mood: str
+    insert_window: InsertWindow
+
+
+class Song(SongSummary):
+    ad_context: AdContext
+
+
+_SONG_LIST = TypeAdapter(List[Song])
+_SUMMARY_LIST = TypeAdapter(List[SongSummary])
+
+
+class SongCatalog:
+    """
+    songs.json parsed and validated once into Song models, indexed by
+    song_id, and reloaded only when the file's mtime or size changes. The
+    list view (without the lyrics-heavy ad_context) is pre-serialized with
+    a strong ETag.
+    """
+
+    def __init__(self, path: Path = SONGS_CONFIG_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._songs: List[Song] = []
+        self._index: Dict[str, Song] = {}
+        self._list_body = b"[]"
+        self._etag = '"empty"'
+
+    def _refresh(self) -> None:
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            try:
+                songs = _SONG_LIST.validate_json(self.path.read_bytes())
+            except Exception:
+                if self._signature is None:
+                    raise
+                logger.exception("Invalid %s; keeping previously loaded catalog", self.path)
+                self._signature = signature
+                return
+            body = _SUMMARY_LIST.dump_json(songs)
+            self._songs = songs
+            self._index = {song.song_id: song for song in songs}
+            self._list_body = body
+            self._etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            self._signature = signature
+            logger.info("Loaded %s songs from %s", len(songs), self.path)
+
+    def songs(self) -> List[Song]:
+        self._refresh()
+        return list(self._songs)
+
+    def get(self, song_id: str) -> Optional[Song]:
+        self._refresh()
+        return self._index.get(song_id)
+
+    def list_view(self) -> Tuple[bytes, str]:
+        """Serialized song summaries and their ETag."""
+        self._refresh()
+        return self._list_body, self._etag
+
+
+_CATALOG = SongCatalog()
+
+
+def get_catalog() -> SongCatalog:
+    return _CATALOG
+
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from backend.services.audio_service import GENERATED_DIR, ORIGINALS_DIR, PUBLIC_AUDIO_DIR
+from backend.services.hls_service import SEGMENTS_DIR
+from backend.utils.http import parse_accept
+
+logger = logging.getLogger("interlude.delivery")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+ORIGINALS_MAX_AGE = int(os.getenv("AUDIO_ORIGINALS_MAX_AGE", "3600"))
+
+# Generated files whose name starts with a hex token (uuid or content hash)
+# are never rewritten in place, so clients may cache them forever.
+_TOKEN_NAME = re.compile(r"^[0-9a-f]{16,}(?:_[a-z0-9]+)*$")
+_HASH_CHUNK = 1 << 20
+
+# Rendition formats clients can ask for and the suffix each is written with.
+AUDIO_FORMATS = {"opus": ".opus", "mp3": ".mp3", "wav": ".wav"}
+# Segmented formats, only offered where a song is being delivered.
+STREAM_FORMATS = {"hls": ".m3u8"}
+DEFAULT_AUDIO_ACCEPT = os.getenv("AUDIO_DEFAULT_ACCEPT", "mp3")
+_FORMAT_ALIASES = {
+    "audio/opus": "opus",
+    "audio/ogg": "opus",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "application/vnd.apple.mpegurl": "hls",
+    "application/x-mpegurl": "hls",
+}
+
+
+class ETagIndex:
+    """
+    Strong content ETags (sha256 of the bytes) keyed by path and invalidated
+    by mtime/size, so each file is hashed once per change rather than per
+    request.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[Path, Tuple[int, int, str]] = {}
+
+    def etag(self, path: Path, stat_result: os.stat_result) -> str:
+        signature = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry[:2] == signature:
+            return entry[2]
+        digest = hashlib.sha256()
+        with path.open("rb") as file:
+            for chunk in iter(lambda: file.read(_HASH_CHUNK), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        with self._lock:
+            self._entries[path] = (*signature, etag)
+        return etag
+
+    def prime(self, directory: Path) -> int:
+        """Hashes every file under directory ahead of the first request."""
+        count = 0
+        for path in sorted(directory.rglob("*")):
+            if path.is_file():
+                self.etag(path.resolve(), path.stat())
+                count += 1
+        logger.info("Precomputed ETags for %s files in %s", count, directory)
+        return count
+
+
+_ETAGS = ETagIndex()
+
+
+def get_etag_index() -> ETagIndex:
+    return _ETAGS
+
+
+def resolve_audio_path(relative: str) -> Path | None:
+    """Maps a /audio/<relative> URL path to a file inside PUBLIC_AUDIO_DIR."""
+    root = PUBLIC_AUDIO_DIR.resolve()
+    path = (root / relative).resolve()
+    if root not in path.parents or not path.is_file():
+        return None
+    return path
+
+
+def cache_control_for(path: Path) -> str:
+    # Segment directories are named by content fingerprint and never rewritten.
+    if SEGMENTS_DIR.resolve() in path.parents:
+        return IMMUTABLE_CACHE_CONTROL
+    if GENERATED_DIR.resolve() in path.parents:
+        if _TOKEN_NAME.match(path.stem):
+            return IMMUTABLE_CACHE_CONTROL
+        return REVALIDATE_CACHE_CONTROL
+    if ORIGINALS_DIR.resolve() in path.parents:
+        return f"public, max-age={ORIGINALS_MAX_AGE}"
+    return REVALIDATE_CACHE_CONTROL
+
+
+def negotiate_formats(accept: str | None, streams: bool = False) -> List[str]:
+    """
+    Rendition formats for an Accept-style hint such as "opus, mp3;q=0.5",
+    most preferred first. Takes short names or audio MIME types; wildcards
+    and hints naming nothing we encode fall back to AUDIO_DEFAULT_ACCEPT,
+    so lossless WAV is only produced when asked for. streams=True also
+    allows segmented delivery ("hls").
+    """
+    allowed = {**AUDIO_FORMATS, **STREAM_FORMATS} if streams else AUDIO_FORMATS
+    formats: List[str] = []
+    for value in parse_accept(accept):
+        if value in ("*", "*/*", "audio/*"):
+            candidates = negotiate_formats(DEFAULT_AUDIO_ACCEPT) if accept != DEFAULT_AUDIO_ACCEPT else []
+        else:
+            candidates = [_FORMAT_ALIASES.get(value, value)]
+        formats.extend(name for name in candidates if name in allowed and name not in formats)
+    if not formats and accept != DEFAULT_AUDIO_ACCEPT:
+        return negotiate_formats(DEFAULT_AUDIO_ACCEPT, streams)
+    return formats or ["mp3"]
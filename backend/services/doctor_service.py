@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import copy
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from backend.services.prewarm_service import prewarm_report
+from backend.utils.doctor import run_doctor
+from backend.utils.ffmpeg import reset_ffmpeg_cache
+
+logger = logging.getLogger("interlude.doctor")
+
+
+class DoctorService:
+    """
+    Runs the dependency doctor off the request path and caches its report.
+    Readers always get the cached report; once it is older than the TTL (or
+    after invalidate()), a single background refresh is started and the
+    stale report keeps being served until it completes.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None) -> None:
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else max(1.0, float(os.getenv("DOCTOR_TTL_SECONDS", "300")))
+        )
+        self._lock = threading.Lock()
+        self._report: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._refreshing = False
+
+    def refresh(self, auto_fix: bool = False) -> Dict[str, Any]:
+        """Runs the doctor synchronously and stores the result."""
+        reset_ffmpeg_cache()
+        started = time.perf_counter()
+        report = run_doctor(auto_fix=auto_fix)
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+        with self._lock:
+            self._report = report
+            self._checked_at = time.time()
+            self._refreshing = False
+        if not report.get("ok"):
+            logger.warning("Doctor report not ok: %s", report)
+        return copy.deepcopy(report)
+
+    def refresh_in_background(self, auto_fix: bool = False) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run() -> None:
+            try:
+                self.refresh(auto_fix=auto_fix)
+            except Exception:
+                logger.exception("Background doctor refresh failed")
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="doctor-refresh", daemon=True).start()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked_at = 0.0
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Cached report. Only the very first call in a process (before the
+        startup refresh has finished) runs the doctor inline.
+        """
+        with self._lock:
+            report = self._report
+            stale = time.time() - self._checked_at > self.ttl_seconds
+        if report is None:
+            return self.refresh(auto_fix=False)
+        if stale:
+            self.refresh_in_background()
+        result = copy.deepcopy(report)
+        result["checked_at"] = self._checked_at
+        result["imports"] = prewarm_report()
+        return result
+
+
+_DOCTOR: DoctorService | None = None
+_DOCTOR_LOCK = threading.Lock()
+
+
+def get_doctor() -> DoctorService:
+    global _DOCTOR
+    with _DOCTOR_LOCK:
+        if _DOCTOR is None:
+            _DOCTOR = DoctorService()
+        return _DOCTOR
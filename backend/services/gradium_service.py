@@ -1,26 +1,39 @@
 from __future__ import annotations
 
 import uuid
-from pathlib import Path
 from typing import Tuple
 
 import logging
 
 import requests
-import soundfile as sf
-import librosa
 
+from backend.services.admission_service import admit
+from backend.services.artifact_store import ArtifactStore, get_artifact_store
+from backend.services.audio_buffer import (
+    INTERNAL_SAMPLE_RATE,
+    AudioBuffer,
+    decode_audio,
+    load_buffer,
+    save_buffer,
+    write_audio,
+)
 from backend.services.audio_service import GENERATED_DIR
-from backend.utils.ffmpeg import assert_ffmpeg_available
+from backend.services.metrics_service import TTS_PAYLOADS, stage_timer
+from backend.services.trace_service import traced
 from backend.utils.env import get_env, load_env
+from backend.utils.singleflight import SingleFlight
 
 
 DEFAULT_VOICE_ID = "zVI-68f2GRJbOGTT"
+_TTS_FLIGHT = SingleFlight()
 DEFAULT_REGION = "us"
 logger = logging.getLogger("interlude.gradium")
 
 
 def _gradium_endpoint(region: str) -> str:
+    override = get_env("GRADIUM_TTS_URL")
+    if override:
+        return override
     region = (region or DEFAULT_REGION).lower()
     if region == "eu":
         return "https://eu.api.gradium.ai/api/post/speech/tts"
@@ -43,20 +56,28 @@ def _is_wav_bytes(data: bytes) -> bool:
     return len(data) > 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
 
 
-def _ensure_wav_mono_44k(input_path: Path, output_path: Path) -> Path:
-    audio, sr = librosa.load(str(input_path), sr=44100, mono=True)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    sf.write(str(output_path), audio, 44100)
-    return output_path
-
-
-def generate_voice(text: str, energy: str = "high", pace: str = "medium") -> str:
+@traced("synthesize_voice")
+def synthesize_voice(text: str, energy: str = "high", pace: str = "medium") -> AudioBuffer:
     """
-    Calls Gradium TTS API with custom voice_id and returns a WAV file path.
+    Calls Gradium TTS API with custom voice_id and returns mono 44.1 kHz
+    audio, decoded in memory. Results are shared by every worker on the host
+    through the artifact store, keyed by voice, region and text.
     """
-    _ = (energy, pace)
     api_key, voice_id, region = _get_env()
+    key = ArtifactStore.key("tts", voice_id, region, text, energy, pace)
+    artifact = _TTS_FLIGHT.do(
+        key,
+        lambda: get_artifact_store().get_or_create(
+            "tts",
+            key,
+            lambda tmp: save_buffer(_request_voice(text, api_key, voice_id, region), tmp),
+            suffix=".npy",
+        ),
+    )
+    return load_buffer(artifact.path, artifact.meta)
 
+
+def _request_voice(text: str, api_key: str, voice_id: str, region: str) -> AudioBuffer:
     endpoint = _gradium_endpoint(region)
     logger.info(
         "Gradium TTS request: endpoint=%s voice_id=%s text_len=%s",
@@ -64,52 +85,47 @@ def generate_voice(text: str, energy: str = "high", pace: str = "medium") -> str
         voice_id,
         len(text),
     )
-    response = requests.post(
-        endpoint,
-        headers={"x-api-key": api_key},
-        json={"text": text, "voice_id": voice_id},
-        timeout=60,
-    )
-    logger.info("Gradium TTS response: status=%s", response.status_code)
-    if response.status_code >= 400:
-        preview = ""
-        try:
-            preview = response.text[:300]
-        except Exception:
-            preview = ""
-        logger.error("Gradium TTS error body (preview): %s", preview)
-        raise RuntimeError(
-            f"Gradium TTS failed: {response.status_code} {response.reason}. "
-            "Check region, key, voice_id."
+    with admit("tts"), stage_timer("tts"):
+        response = requests.post(
+            endpoint,
+            headers={"x-api-key": api_key},
+            json={"text": text, "voice_id": voice_id},
+            timeout=60,
         )
-
-    GENERATED_DIR.mkdir(parents=True, exist_ok=True)
-    job_id = uuid.uuid4().hex
-    raw_path = GENERATED_DIR / f"{job_id}_raw"
-    wav_path = GENERATED_DIR / f"{job_id}.wav"
+        logger.info("Gradium TTS response: status=%s", response.status_code)
+        if response.status_code >= 400:
+            preview = ""
+            try:
+                preview = response.text[:300]
+            except Exception:
+                preview = ""
+            logger.error("Gradium TTS error body (preview): %s", preview)
+            raise RuntimeError(
+                f"Gradium TTS failed: {response.status_code} {response.reason}. "
+                "Check region, key, voice_id."
+            )
 
     data = response.content
     if _is_wav_bytes(data):
-        raw_path = raw_path.with_suffix(".wav")
-        raw_path.write_bytes(data)
-        _ensure_wav_mono_44k(raw_path, wav_path)
-        return str(wav_path)
-
-    assert_ffmpeg_available()
-    raw_path = raw_path.with_suffix(".bin")
-    raw_path.write_bytes(data)
+        logger.info("Gradium TTS payload: wav bytes=%s", len(data))
+        TTS_PAYLOADS.inc(type="wav")
+    else:
+        logger.info("Gradium TTS payload: non-wav bytes=%s, decoding", len(data))
+        TTS_PAYLOADS.inc(type="converted")
     try:
-        from pydub import AudioSegment
-
-        audio = AudioSegment.from_file(raw_path)
-        audio = audio.set_channels(1).set_frame_rate(44100)
-        audio.export(wav_path, format="wav")
+        audio = decode_audio(data)
     except Exception as exc:
-        raise RuntimeError(f"Failed to convert Gradium audio to WAV: {exc}") from exc
-    finally:
-        try:
-            raw_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+        raise RuntimeError(f"Failed to decode Gradium audio: {exc}") from exc
+    return audio.with_layout(INTERNAL_SAMPLE_RATE, 1)
 
+
+@traced("generate_voice")
+def generate_voice(text: str, energy: str = "high", pace: str = "medium") -> str:
+    """
+    Calls Gradium TTS API with custom voice_id and returns a WAV file path.
+    """
+    audio = synthesize_voice(text=text, energy=energy, pace=pace)
+    GENERATED_DIR.mkdir(parents=True, exist_ok=True)
+    wav_path = GENERATED_DIR / f"{uuid.uuid4().hex}.wav"
+    write_audio(audio, wav_path)
     return str(wav_path)
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+from backend.services.artifact_store import FILES_META, REFS_META, ArtifactStore, get_artifact_store
+from backend.services.audio_buffer import AudioBuffer
+from backend.services.audio_service import PUBLIC_AUDIO_DIR, mix_audio
+from backend.services.mp3_service import BASE_VERSION, Mp3Stream, Splice, encode_base, parse_mp3, splice_span
+from backend.services.trace_service import traced
+
+logger = logging.getLogger("interlude.hls")
+
+SEGMENTS_DIR = PUBLIC_AUDIO_DIR / "segments"
+SEGMENT_SECONDS = float(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+SEGMENT_SUFFIX = ".mp3"
+SEGMENT_VERSION = 2
+PLAYLIST_NAME = "index.m3u8"
+
+_TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+
+
+class SegmentLayout(NamedTuple):
+    """Where an original's shared segments live and how its MP3 frames are cut."""
+
+    directory: Path
+    sample_rate: int
+    samples_per_frame: int
+    frame_count: int
+    segment_frames: int
+
+    @property
+    def count(self) -> int:
+        return max(1, math.ceil(self.frame_count / self.segment_frames))
+
+    def bounds(self, index: int) -> Tuple[int, int]:
+        start = index * self.segment_frames
+        return start, min(self.frame_count, start + self.segment_frames)
+
+    def covering(self, start: int, stop: int | None) -> range:
+        """Indices of the segments holding MP3 frames [start, stop); None runs to the end."""
+        last = self.count if stop is None else math.ceil(stop / self.segment_frames)
+        return range(start // self.segment_frames, min(self.count, last))
+
+
+class _NoSplice(Exception):
+    """The ad could not be spliced and a full encode was not allowed."""
+
+
+def _syncsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def _timestamp_tag(start_sample: int, sample_rate: int) -> bytes:
+    """
+    ID3v2.4 PRIV frame carrying the segment's 90 kHz start time, which HLS
+    requires at the head of every packed-audio segment.
+    """
+    pts = (start_sample * 90000 // sample_rate) & ((1 << 33) - 1)
+    body = _TIMESTAMP_OWNER + pts.to_bytes(8, "big")
+    frame = b"PRIV" + _syncsafe(len(body)) + b"\x00\x00" + body
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frame)) + frame
+
+
+def _write_segment(stream: Mp3Stream, start: int, stop: int, path: Path) -> None:
+    """
+    Frames [start, stop) of one continuous encode, without its Xing frame.
+    Consecutive segments decode gaplessly because no segment has encoder
+    delay or padding of its own, and the bit reservoir carries over.
+    """
+    frames = stream.data[stream.frames[start].offset : stream.frames[stop - 1].end]
+    path.write_bytes(_timestamp_tag(start * stream.samples_per_frame, stream.sample_rate) + frames)
+
+
+def _playlist(durations: List[float], uris: List[str]) -> str:
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{math.ceil(max(durations))}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for duration, uri in zip(durations, uris):
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(uri)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def _segment_name(index: int) -> str:
+    return f"seg_{index:05d}{SEGMENT_SUFFIX}"
+
+
+def _segments_key(song_path: Path) -> str:
+    stat_result = song_path.stat()
+    return ArtifactStore.key(
+        "segments",
+        SEGMENT_VERSION,
+        BASE_VERSION,
+        str(song_path.resolve()),
+        stat_result.st_mtime_ns,
+        stat_result.st_size,
+        SEGMENT_SECONDS,
+    )
+
+
+def segment_directory(song_id: str, song_path: Path) -> Path:
+    """Where the segments for this version of the original are published."""
+    return SEGMENTS_DIR / song_id / _segments_key(song_path)[:16]
+
+
+def ad_playlist_path(song_id: str, song_path: Path, key: str) -> Path:
+    return segment_directory(song_id, song_path) / "ads" / f"{key[:32]}.m3u8"
+
+
+@traced("hls.segment_original")
+def segment_original(song_id: str, song_path: Path) -> SegmentLayout:
+    """
+    Cuts the original's base MP3 encode (see encode_base, which this waits
+    for) into SEGMENT_SECONDS segments at frame boundaries plus a VOD
+    playlist, once per file version; every worker on the host shares the
+    result.
+    """
+    directory = segment_directory(song_id, song_path)
+
+    def produce(tmp: Path) -> Dict[str, Any]:
+        base_path = encode_base(song_path)
+        base = parse_mp3(base_path.read_bytes())
+        layout = SegmentLayout(
+            directory,
+            base.sample_rate,
+            base.samples_per_frame,
+            len(base.frames),
+            max(1, round(SEGMENT_SECONDS * base.sample_rate / base.samples_per_frame)),
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        for index in range(layout.count):
+            _write_segment(base, *layout.bounds(index), directory / _segment_name(index))
+        # The playlist is published last, so its presence marks a complete cut.
+        durations = [
+            (stop - start) * layout.samples_per_frame / layout.sample_rate
+            for start, stop in map(layout.bounds, range(layout.count))
+        ]
+        tmp.write_text(
+            _playlist(durations, [_segment_name(i) for i in range(layout.count)]), encoding="utf-8"
+        )
+        logger.info("Segmented %s into %s x %.1fs segments", song_id, layout.count, SEGMENT_SECONDS)
+        return {
+            FILES_META: [_segment_name(i) for i in range(layout.count)],
+            "layout": layout._asdict() | {"directory": None},
+            # Ads are spliced into this encode, so it must outlive the cut.
+            REFS_META: [str(base_path)],
+        }
+
+    artifact = get_artifact_store().get_or_create(
+        "segments", _segments_key(song_path), produce, suffix=".m3u8", dest=directory / PLAYLIST_NAME
+    )
+    return SegmentLayout(**{**artifact.meta["layout"], "directory": directory})
+
+
+@traced("hls.render_ad")
+def render_segmented_mix(
+    song_id: str,
+    song_path: Path,
+    insert: AudioBuffer,
+    start_ms: int,
+    end_ms: int,
+    key: str,
+    full_encode: bool = True,
+    splicer: Callable[[Path], Splice | None] | None = None,
+) -> Path | None:
+    """
+    Publishes a per-ad playlist that points at the shared original segments
+    except where the ad changes the stream. The ad's MP3 is spliced into
+    the same base encode the originals were cut from (see splice_span), so
+    its segments are cut at the same frames and join the shared ones
+    without a gap. If no splice is possible the whole mix is encoded and
+    cut instead, or, with full_encode=False, None is returned. splicer
+    may supply a splice already made for another rendition.
+    """
+    layout = segment_original(song_id, song_path)
+    playlist = ad_playlist_path(song_id, song_path, key)
+    token = playlist.stem
+
+    def produce(tmp: Path) -> Dict[str, Any]:
+        scratch = tmp.with_name(f"{tmp.name}{SEGMENT_SUFFIX}")
+        try:
+            if splicer is not None:
+                spliced = splicer(scratch)
+            else:
+                spliced = splice_span(song_path, insert, start_ms, end_ms, scratch)
+            if spliced is not None:
+                stream, covered = spliced.stream, layout.covering(spliced.start, spliced.stop)
+            elif full_encode:
+                stream = parse_mp3(mix_audio(song_path, insert, start_ms, end_ms, scratch).read_bytes())
+                covered = range(layout.count)
+            else:
+                raise _NoSplice(song_id)
+        finally:
+            scratch.unlink(missing_ok=True)
+        # Frame counts match the original's except at the very end, where a
+        # splice that runs to the end of the song may differ by a frame.
+        bounds = {
+            index: (start, len(stream.frames) if index == layout.count - 1 else stop)
+            for index, (start, stop) in ((index, layout.bounds(index)) for index in covered)
+        }
+        playlist.parent.mkdir(parents=True, exist_ok=True)
+        for index, (start, stop) in bounds.items():
+            _write_segment(stream, start, stop, playlist.parent / f"{token}_{index:05d}{SEGMENT_SUFFIX}")
+        durations = [
+            (stop - start) * layout.samples_per_frame / layout.sample_rate
+            for start, stop in (bounds.get(index) or layout.bounds(index) for index in range(layout.count))
+        ]
+        uris = [
+            f"{token}_{index:05d}{SEGMENT_SUFFIX}" if index in covered else f"../{_segment_name(index)}"
+            for index in range(layout.count)
+        ]
+        tmp.write_text(_playlist(durations, uris), encoding="utf-8")
+        return {
+            FILES_META: [f"{token}_{index:05d}{SEGMENT_SUFFIX}" for index in covered],
+            REFS_META: [str(layout.directory / PLAYLIST_NAME)],
+        }
+
+    try:
+        artifact = get_artifact_store().get_or_create("mix", key, produce, suffix=".m3u8", dest=playlist)
+    except _NoSplice:
+        return None
+    return artifact.path
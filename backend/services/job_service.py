@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from backend.utils.paths import repo_root
+
+logger = logging.getLogger("interlude.jobs")
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+ProgressFn = Callable[[str], None]
+JobHandler = Callable[[Dict[str, Any], ProgressFn], Dict[str, Any]]
+
+# Finished and failed jobs (with their payloads and results) are deleted
+# this long after they finish; 0 keeps them forever. Pruning runs at
+# startup and at most every _PRUNE_INTERVAL_SECONDS on submit.
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600
+_PRUNE_INTERVAL_SECONDS = 600.0
+_PENDING_SQL = "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+_HANDLERS: Dict[str, JobHandler] = {}
+_STAGES: Dict[str, Sequence[str]] = {}
+
+
+def register_job_handler(kind: str, handler: JobHandler, stages: Sequence[str]) -> None:
+    """Registers how to run a job kind and the ordered stages it reports."""
+    _HANDLERS[kind] = handler
+    _STAGES[kind] = tuple(stages)
+
+
+def _default_db_path() -> Path:
+    return Path(os.getenv("INTERLUDE_JOBS_DB", str(repo_root() / ".interlude" / "jobs.sqlite3")))
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _boot_id() -> str:
+    try:
+        return Path("/proc/sys/kernel/random/boot_id").read_text().strip()
+    except OSError:
+        return ""
+
+
+def _process_start(pid: int) -> str:
+    """Start time of pid in clock ticks since boot (Linux), else ""."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return ""
+    # Field 22; the command name in field 2 may itself contain spaces.
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+def _owner_token(pid: int) -> str:
+    """
+    Identifies one process for its whole life: a restarted container often
+    reuses the same pid, but not the same boot id plus start time.
+    """
+    return f"{_boot_id()}:{pid}:{_process_start(pid)}"
+
+
+def _owner_alive(pid: int, token: str | None) -> bool:
+    if token is None:
+        # Rows claimed before owner tokens existed: our own pid at this
+        # point is a previous incarnation of this process slot.
+        return pid != os.getpid() and _pid_alive(pid)
+    if token == _owner_token(os.getpid()):
+        return True
+    boot_id, _, start = token.split(":", 2)
+    if boot_id != _boot_id():
+        return False
+    if start:
+        return _process_start(pid) == start
+    return pid != os.getpid() and _pid_alive(pid)
+
+
+class JobQueue:
+    """
+    Persistent job queue: jobs live in a local SQLite file so they survive a
+    worker restart, and a bounded thread pool runs them with the handlers
+    registered through register_job_handler.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | None = None,
+        max_workers: int | None = None,
+        max_pending: int | None = None,
+    ) -> None:
+        self.db_path = db_path or _default_db_path()
+        self.max_workers = max_workers or max(1, int(os.getenv("JOB_WORKERS", "2")))
+        self.max_pending = max_pending or max(1, int(os.getenv("JOB_QUEUE_LIMIT", "100")))
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    owner_pid INTEGER,
+                    owner_token TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated_at)")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner_token" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner_token TEXT")
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="job"
+                )
+            return self._executor
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute(_PENDING_SQL).fetchone()
+        return int(row[0])
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        if kind not in _HANDLERS:
+            raise KeyError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            # Count and insert under one write lock, so concurrent submits
+            # from other workers cannot overshoot the limit.
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute(_PENDING_SQL).fetchone()[0] >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} pending).")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now),
+            )
+        self._pool().submit(self._run, job_id)
+        self._maybe_prune()
+        return job_id
+
+    def prune(self, max_age_seconds: float = JOB_RETENTION_SECONDS) -> int:
+        """Deletes jobs that finished or failed more than max_age_seconds ago."""
+        if max_age_seconds <= 0:
+            return 0
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+                (time.time() - max_age_seconds,),
+            )
+        if cursor.rowcount:
+            logger.info("Pruned %s finished jobs", cursor.rowcount)
+        return cursor.rowcount
+
+    def _maybe_prune(self) -> None:
+        with self._lock:
+            if time.time() - self._last_prune < _PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = time.time()
+        try:
+            self.prune()
+        except sqlite3.Error:
+            logger.exception("Pruning finished jobs failed")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": row["progress"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": json.loads(row["error"]) if row["error"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def resume_pending(self) -> List[str]:
+        """
+        Re-enqueues queued jobs and running jobs whose owning process is
+        gone, e.g. after a worker or container restart. Owners are matched
+        by process token rather than pid, since pids are reused. Also prunes
+        jobs past JOB_RETENTION_HOURS.
+        """
+        self._maybe_prune()
+        resumed: List[str] = []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, status, owner_pid, owner_token FROM jobs "
+                "WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            for row in rows:
+                if row["status"] == "running" and _owner_alive(
+                    row["owner_pid"] or 0, row["owner_token"]
+                ):
+                    continue
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'queued', owner_pid = NULL, owner_token = NULL, "
+                    "updated_at = ? WHERE id = ? AND status = ? AND owner_token IS ?",
+                    (time.time(), row["id"], row["status"], row["owner_token"]),
+                )
+                if cursor.rowcount == 1:
+                    resumed.append(row["id"])
+        for job_id in resumed:
+            self._pool().submit(self._run, job_id)
+        if resumed:
+            logger.info("Resumed %s pending jobs", len(resumed))
+        return resumed
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _claim(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', owner_pid = ?, owner_token = ?, "
+                "updated_at = ? WHERE id = ? AND status = 'queued'",
+                (os.getpid(), _owner_token(os.getpid()), time.time(), job_id),
+            )
+            if cursor.rowcount != 1:
+                return None
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def _run(self, job_id: str) -> None:
+        row = self._claim(job_id)
+        if row is None:
+            return
+        kind = row["kind"]
+        handler = _HANDLERS.get(kind)
+        stages = _STAGES.get(kind, ())
+
+        def progress(stage: str) -> None:
+            done = stages.index(stage) / len(stages) if stage in stages else 0.0
+            self._update(job_id, stage=stage, progress=round(done, 3))
+
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job kind {kind}")
+            result = handler(json.loads(row["payload"]), progress)
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job_id, kind)
+            error: Dict[str, Any] = {"error": str(exc), "detail": repr(exc)}
+            report = getattr(exc, "report", None)
+            if report is not None:
+                error["doctor"] = report
+            self._update(job_id, status="failed", error=json.dumps(error, default=str))
+            return
+        self._update(
+            job_id,
+            status="succeeded",
+            stage="done",
+            progress=1.0,
+            result=json.dumps(result, default=str),
+        )
+
+
+_QUEUE: JobQueue | None = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = JobQueue()
+        return _QUEUE
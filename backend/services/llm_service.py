@@ -4,11 +4,21 @@ import json
 import logging
 import os
 import re
+import time
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 from urllib.error import HTTPError, URLError
 from urllib.request import Request, urlopen
 
+from backend.services.admission_service import admit, admitted
+from backend.services.metrics_service import (
+    LLM_FALLBACKS,
+    STAGE_ERRORS,
+    STAGE_SECONDS,
+    timed_stage,
+)
+from backend.services.trace_service import span, traced
+
 ROOT_DIR = Path(__file__).resolve().parents[2]
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 # Primary default is intentionally non-Gemini/Gemma now.
@@ -186,6 +196,8 @@ def _extract_lines(raw_text: str, target_lines: int) -> List[str]:
     return cleaned[: max(target_lines, len(cleaned))]
 
 
+@admitted("llm")
+@timed_stage("llm")
 def _call_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> str | None:
     global LAST_GROQ_ERROR
     api_key = _load_env_value("GROQ_API_KEY") or _load_env_value("API_KEY")
@@ -194,16 +206,8 @@ def _call_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> str
         LOGGER.warning("Groq call skipped: %s", LAST_GROQ_ERROR)
         return None
 
-    preferred = _load_env_value("GROQ_LLM_MODEL")
-    candidates = [preferred] if preferred else []
-    for model in MODEL_FALLBACKS:
-        if model and model not in candidates:
-            candidates.append(model)
-    if DEFAULT_GROQ_MODEL not in candidates:
-        candidates.insert(0, DEFAULT_GROQ_MODEL)
-
     last_error = "No model candidates available."
-    for model in candidates:
+    for model in _groq_candidates():
         payload = {
             "model": model,
             "temperature": temperature,
@@ -222,7 +226,7 @@ def _call_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> str
         }
 
         request = Request(
-            GROQ_API_URL,
+            _load_env_value("GROQ_API_URL") or GROQ_API_URL,
             data=json.dumps(payload).encode("utf-8"),
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -234,8 +238,9 @@ def _call_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> str
         )
 
         try:
-            with urlopen(request, timeout=30) as response:
-                body = json.loads(response.read().decode("utf-8"))
+            with span("groq", model=model, temperature=temperature):
+                with urlopen(request, timeout=30) as response:
+                    body = json.loads(response.read().decode("utf-8"))
         except HTTPError as exc:
             detail = ""
             try:
@@ -244,6 +249,7 @@ def _call_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> str
                 detail = str(exc)
             last_error = f"HTTP {exc.code}: {detail}"
             LOGGER.warning("Groq model %s failed: %s", model, last_error)
+            LLM_FALLBACKS.inc(model=model, reason=f"http_{exc.code}")
             # Continue to next model for model-related failures.
             continue
         except URLError as exc:
@@ -254,22 +260,26 @@ def _call_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> str
         except TimeoutError:
             last_error = "Request timed out."
             LOGGER.warning("Groq request timed out on model %s.", model)
+            LLM_FALLBACKS.inc(model=model, reason="timeout")
             continue
         except json.JSONDecodeError:
             last_error = "Could not decode JSON response."
             LOGGER.warning("Groq JSON decode failed on model %s.", model)
+            LLM_FALLBACKS.inc(model=model, reason="bad_json")
             continue
 
         choices = body.get("choices", [])
         if not choices:
             last_error = "No choices returned by Groq."
             LOGGER.warning("Groq response had no choices on model %s.", model)
+            LLM_FALLBACKS.inc(model=model, reason="empty")
             continue
 
         content = choices[0].get("message", {}).get("content")
         if not isinstance(content, str):
             last_error = "No message content returned by Groq."
             LOGGER.warning("Groq response missing content on model %s.", model)
+            LLM_FALLBACKS.inc(model=model, reason="empty")
             continue
 
         LAST_GROQ_ERROR = None
@@ -277,9 +287,138 @@ def _call_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> str
         return content.strip()
 
     LAST_GROQ_ERROR = last_error
+    STAGE_ERRORS.inc(stage="llm")
     return None
 
 
+def _groq_candidates() -> List[str]:
+    preferred = _load_env_value("GROQ_LLM_MODEL")
+    candidates = [preferred] if preferred else []
+    for model in MODEL_FALLBACKS:
+        if model and model not in candidates:
+            candidates.append(model)
+    if DEFAULT_GROQ_MODEL not in candidates:
+        candidates.insert(0, DEFAULT_GROQ_MODEL)
+    return candidates
+
+
+def _stream_groq(prompt: str, *, temperature: float, max_tokens: int = 320) -> Iterator[str]:
+    """
+    Streams content deltas from Groq. Model fallback only applies until a
+    model starts streaming; after the first delta the stream is committed.
+    The LLM slot is held until the stream is exhausted or closed.
+    """
+    with admit("llm"):
+        yield from _stream_groq_models(prompt, temperature=temperature, max_tokens=max_tokens)
+
+
+def _stream_groq_models(prompt: str, *, temperature: float, max_tokens: int) -> Iterator[str]:
+    global LAST_GROQ_ERROR
+    api_key = _load_env_value("GROQ_API_KEY") or _load_env_value("API_KEY")
+    if not api_key:
+        LAST_GROQ_ERROR = "Missing GROQ_API_KEY/API_KEY."
+        LOGGER.warning("Groq stream skipped: %s", LAST_GROQ_ERROR)
+        return
+
+    last_error = "No model candidates available."
+    started = time.perf_counter()
+    for model in _groq_candidates():
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "top_p": 0.95,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a songwriter. Return only lyrics lines. "
+                        "No commentary."
+                    ),
+                },
+                {"role": "user", "content": prompt},
+            ],
+        }
+        request = Request(
+            _load_env_value("GROQ_API_URL") or GROQ_API_URL,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream",
+                "User-Agent": "Interlude/0.1",
+            },
+            method="POST",
+        )
+
+        try:
+            response = urlopen(request, timeout=30)
+        except HTTPError as exc:
+            detail = ""
+            try:
+                detail = exc.read().decode("utf-8")
+            except Exception:
+                detail = str(exc)
+            last_error = f"HTTP {exc.code}: {detail}"
+            LOGGER.warning("Groq stream model %s failed: %s", model, last_error)
+            LLM_FALLBACKS.inc(model=model, reason=f"http_{exc.code}")
+            continue
+        except URLError as exc:
+            last_error = f"Network error: {exc}"
+            LOGGER.warning("Groq stream network error on model %s: %s", model, exc)
+            break
+        except TimeoutError:
+            last_error = "Request timed out."
+            LOGGER.warning("Groq stream timed out on model %s.", model)
+            LLM_FALLBACKS.inc(model=model, reason="timeout")
+            continue
+
+        with response:
+            for raw_event in response:
+                event = raw_event.decode("utf-8").strip()
+                if not event.startswith("data:"):
+                    continue
+                data = event[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta", {}).get("content")
+                if isinstance(delta, str) and delta:
+                    yield delta
+
+        LAST_GROQ_ERROR = None
+        LOGGER.info("Groq lyric stream finished with model %s.", model)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+        return
+
+    LAST_GROQ_ERROR = last_error
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+    STAGE_ERRORS.inc(stage="llm")
+
+
+def _clean_stream_line(raw_line: str) -> str | None:
+    line = raw_line.strip()
+    if not line or line.startswith("```"):
+        return None
+    line = re.sub(r"^\s*(?:[-*]|\d+[.)])\s*", "", line)
+    line = re.sub(r"\[[^\]]+\]", "", line)
+    line = re.sub(r"\s+", " ", line).strip()
+    if not line:
+        return None
+    if any(term in line.lower() for term in TACKY_TERMS):
+        return None
+    if len(re.findall(r"[A-Za-z']+", line)) < 2:
+        return None
+    return line
+
+
 def _best_effort_lines(raw_text: str, target_lines: int) -> List[str]:
     text = _strip_fences(raw_text)
     text = re.sub(r"\[[^\]]+\]", "", text)
@@ -310,6 +449,7 @@ def _best_effort_lines(raw_text: str, target_lines: int) -> List[str]:
     return cleaned[: max(2, target_lines)]
 
 
+@traced("generate_ad_lyrics")
 def generate_ad_lyrics(
     title: str,
     artist: str | None,
@@ -344,7 +484,8 @@ def generate_ad_lyrics(
     candidates: List[List[str]] = []
     raw_responses: List[str] = []
     for temperature in (1.25, 1.05, 0.85, 0.65):
-        raw = _call_groq(prompt, temperature=temperature)
+        with span("temperature", temperature=temperature):
+            raw = _call_groq(prompt, temperature=temperature)
         if not raw:
             continue
         raw_responses.append(raw)
@@ -371,3 +512,45 @@ def generate_ad_lyrics(
     if LAST_GROQ_ERROR:
         return f"Unable to generate lyrics right now. {LAST_GROQ_ERROR}"
     return "Unable to generate lyrics right now. Please try again."
+
+
+def stream_ad_lyric_lines(
+    title: str,
+    artist: str | None,
+    mood: str,
+    bpm: int,
+    ad_prompt: str,
+    max_duration_seconds: float,
+    lyrics_before: str,
+    lyrics_after: str,
+    temperature: float = 1.05,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of generate_ad_lyrics:
+    - Single live LLM call (no candidate scoring)
+    - Yields each cleaned lyric line as soon as its newline arrives
+    """
+    safe_prompt = _sanitize_prompt(ad_prompt) or "support your community"
+    line_count = _target_line_count(max_duration_seconds)
+    prompt = _build_prompt(
+        title=title,
+        artist=artist,
+        mood=mood,
+        bpm=bpm,
+        ad_prompt=safe_prompt,
+        before_lyrics=lyrics_before,
+        after_lyrics=lyrics_after,
+        line_count=line_count,
+    )
+
+    pending = ""
+    for delta in _stream_groq(prompt, temperature=temperature):
+        pending += delta
+        while "\n" in pending:
+            raw_line, pending = pending.split("\n", 1)
+            line = _clean_stream_line(raw_line)
+            if line:
+                yield line
+    line = _clean_stream_line(pending)
+    if line:
+        yield line
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, TypeVar
+
+from backend.services.trace_service import span
+
+T = TypeVar("T")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._lock = threading.Lock()
+        # Per label set: per-bucket (non-cumulative) counts, sum, count.
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, totals = self._series.setdefault(key, ([0] * len(self.buckets), [0.0, 0.0]))
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, totals) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(totals[0])}")
+                lines.append(f"{self.name}_count{labels} {int(totals[1])}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "interlude_stage_seconds",
+    "Time spent per pipeline stage (llm, tts, decode, dsp, encode).",
+    ("stage",),
+)
+STAGE_ERRORS = Counter(
+    "interlude_stage_errors_total",
+    "Pipeline stage failures.",
+    ("stage",),
+)
+STAGE_WAIT_SECONDS = Histogram(
+    "interlude_stage_wait_seconds",
+    "Time spent queued for a stage's concurrency slot.",
+    ("stage",),
+)
+STAGE_REJECTIONS = Counter(
+    "interlude_stage_rejections_total",
+    "Requests turned away by stage admission control (queue_full or timeout).",
+    ("stage", "reason"),
+)
+LLM_FALLBACKS = Counter(
+    "interlude_llm_model_fallbacks_total",
+    "Groq calls that moved on to the next candidate model.",
+    ("model", "reason"),
+)
+TTS_PAYLOADS = Counter(
+    "interlude_tts_payloads_total",
+    "Gradium TTS payloads by format (wav passes through, other formats are converted).",
+    ("type",),
+)
+CACHE_REQUESTS = Counter(
+    "interlude_cache_requests_total",
+    "Cache lookups by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+
+_METRICS = (
+    STAGE_SECONDS,
+    STAGE_ERRORS,
+    STAGE_WAIT_SECONDS,
+    STAGE_REJECTIONS,
+    LLM_FALLBACKS,
+    TTS_PAYLOADS,
+    CACHE_REQUESTS,
+)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Observes the block's duration for stage, counts it as an error if it
+    raises, and records it as a span when the request is traced.
+    """
+    started = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def timed_stage(stage: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> T:
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def render_metrics() -> str:
+    """
+    Prometheus text exposition of this process's metrics. Each uvicorn
+    worker keeps its own values, so scrape workers individually.
+    """
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
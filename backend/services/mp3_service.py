@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Tuple
+
+from backend.services.admission_service import admit, background
+from backend.services.artifact_store import ArtifactStore, get_artifact_store
+from backend.services.audio_buffer import NATIVE_ENCODINGS, AudioBuffer, AudioWriter
+from backend.services.audio_service import STREAM_BLOCK_FRAMES, mixed_frames, render_span
+from backend.services.metrics_service import stage_timer
+from backend.services.trace_service import traced
+from backend.utils.singleflight import SingleFlight
+
+logger = logging.getLogger("interlude.mp3")
+
+BASE_VERSION = 1
+# A splice re-encodes from MP3_SPLICE_PREROLL_FRAMES frames ahead of the
+# insert window, so the encoder has settled by the time its frames are used.
+PREROLL_FRAMES = int(os.getenv("MP3_SPLICE_PREROLL_FRAMES", "48"))
+_SETTLE_FRAMES = 16
+# Frames searched for a join after the window, and frames at the end of the
+# re-encoded span (encoder padding) that are never used. The reservoirs
+# usually line up within a few frames; when they do not, the span is
+# re-encoded once with _RETRY_REACH times the pre-roll and search.
+_EXIT_CANDIDATES = 32
+_TAIL_FRAMES = 4
+_RETRY_REACH = 8
+# Unchanged samples needed on each side of a join: the MDCT overlap plus the
+# encoder and decoder delay.
+_GUARD_SAMPLES = 2048
+
+_BITRATES_KBPS = {
+    True: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    False: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_INFO_TAGS = (b"Xing", b"Info")
+
+_BASE_FLIGHT = SingleFlight()
+_BASE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mp3-base")
+
+
+class Mp3Frame(NamedTuple):
+    offset: int
+    size: int
+    # Where the frame's own main data slot starts, after header and side info.
+    main_data: int
+    # Bytes of this frame's main data borrowed from earlier frames' slots.
+    main_data_begin: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+class Mp3Stream(NamedTuple):
+    data: bytes
+    info: Mp3Frame | None
+    frames: List[Mp3Frame]
+    sample_rate: int
+    samples_per_frame: int
+
+
+class Splice(NamedTuple):
+    stream: Mp3Stream
+    # Frames [start, stop) differ from the base encode's bytes; a stop of
+    # None means the rest of the stream does.
+    start: int
+    stop: int | None
+
+
+def parse_mp3(data: bytes) -> Mp3Stream:
+    """
+    Indexes the Layer III frames of an MP3 stream, up to the first byte that
+    is not a frame of the same layout (such as a trailing tag). A leading
+    Xing/Info frame is returned separately as info.
+    """
+    offset = 0
+    if data[:3] == b"ID3":
+        offset = 10 + sum((byte & 0x7F) << shift for byte, shift in zip(data[6:10], (21, 14, 7, 0)))
+    frames: List[Mp3Frame] = []
+    layout: Tuple[int, int, bool] | None = None
+    while offset + 4 <= len(data):
+        header = int.from_bytes(data[offset : offset + 4], "big")
+        version = (header >> 19) & 3
+        bitrate_index = (header >> 12) & 15
+        rate_index = (header >> 10) & 3
+        if (
+            header >> 21 != 0x7FF
+            or version == 1
+            or (header >> 17) & 3 != 1
+            or bitrate_index in (0, 15)
+            or rate_index == 3
+        ):
+            break
+        mono = (header >> 6) & 3 == 3
+        if layout is None:
+            layout = (version, rate_index, mono)
+        elif layout != (version, rate_index, mono):
+            break
+        mpeg1 = version == 3
+        samples = 1152 if mpeg1 else 576
+        size = (
+            samples // 8 * _BITRATES_KBPS[mpeg1][bitrate_index] * 1000 // _SAMPLE_RATES[version][rate_index]
+            + ((header >> 9) & 1)
+        )
+        side_info = offset + 4 + (0 if (header >> 16) & 1 else 2)
+        if offset + size > len(data):
+            break
+        if mpeg1:
+            main_data_begin = data[side_info] << 1 | data[side_info + 1] >> 7
+            side_length = 17 if mono else 32
+        else:
+            main_data_begin = data[side_info]
+            side_length = 9 if mono else 17
+        frames.append(Mp3Frame(offset, size, side_info + side_length, main_data_begin))
+        offset += size
+    if layout is None:
+        raise ValueError("No MPEG Layer III frames found")
+    info = None
+    if data[frames[0].main_data : frames[0].main_data + 4] in _INFO_TAGS:
+        info = frames.pop(0)
+    return Mp3Stream(data, info, frames, _SAMPLE_RATES[layout[0]][layout[1]], 1152 if layout[0] == 3 else 576)
+
+
+def _reservoir(stream: Mp3Stream, index: int, count: int, first: int = 0) -> List[Tuple[int, int]]:
+    """Byte ranges of the last count main data bytes before frames[index], oldest first."""
+    ranges: List[Tuple[int, int]] = []
+    while count > 0:
+        index -= 1
+        if index < first:
+            raise ValueError("Bit reservoir reaches outside the spliced frames")
+        frame = stream.frames[index]
+        start = max(frame.main_data, frame.end - count)
+        ranges.append((start, frame.end))
+        count -= frame.end - start
+    return ranges[::-1]
+
+
+def _move_reservoir(
+    dest: bytearray, dest_ranges: List[Tuple[int, int]], shift: int, source: bytes, source_ranges: List[Tuple[int, int]]
+) -> None:
+    payload = b"".join(source[start:end] for start, end in source_ranges)
+    position = 0
+    for start, end in dest_ranges:
+        dest[start - shift : end - shift] = payload[position : position + end - start]
+        position += end - start
+
+
+def _crc16(data: bytes) -> int:
+    """CRC-16/ARC, as the LAME tag uses."""
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def _rewrite_info(data: bytearray, size_delta: int, padding_from: Mp3Stream | None) -> bytes:
+    """
+    Updates the Xing frame count, byte count and seek table, and the LAME
+    tag's length, padding and CRC, for a stream whose frames were edited.
+    """
+    stream = parse_mp3(bytes(data))
+    info = stream.info
+    if info is None:
+        return stream.data
+    position = info.main_data + 4
+    flags = int.from_bytes(data[position : position + 4], "big")
+    position += 4
+    if flags & 1:
+        data[position : position + 4] = len(stream.frames).to_bytes(4, "big")
+        position += 4
+    total = len(data) - info.offset
+    if flags & 2:
+        total = int.from_bytes(data[position : position + 4], "big") + size_delta
+        data[position : position + 4] = total.to_bytes(4, "big")
+        position += 4
+    if flags & 4:
+        count = len(stream.frames)
+        data[position : position + 100] = bytes(
+            min(255, (stream.frames[count * percent // 100].offset - info.offset) * 256 // total)
+            for percent in range(100)
+        )
+        position += 100
+    if flags & 8:
+        position += 4
+    if data[position : position + 4] != b"LAME":
+        return bytes(data)
+    if padding_from is not None and padding_from.info is not None:
+        # Encoder delay and padding: the tail now comes from the new encode.
+        source = padding_from.info.main_data + (position - info.main_data)
+        data[position + 0x15 : position + 0x18] = padding_from.data[source + 0x15 : source + 0x18]
+    length = int.from_bytes(data[position + 0x1C : position + 0x20], "big") + size_delta
+    data[position + 0x1C : position + 0x20] = length.to_bytes(4, "big")
+    crc_at = position + 0x22
+    data[crc_at : crc_at + 2] = _crc16(bytes(data[info.offset : crc_at])).to_bytes(2, "big")
+    return bytes(data)
+
+
+def splice(base: Mp3Stream, new: Mp3Stream, first: int, entries: range, exits: range | None) -> Splice:
+    """
+    Replaces base frames with new's, where new was encoded from sample
+    first * samples_per_frame of the same input with the same settings, so
+    new.frames[i] lines up with base.frames[first + i]. Joins at the first
+    entry (and, unless exits is None, the first exit) frame where the bit
+    reservoirs are compatible, and moves the reservoir bytes the frames
+    after each join read from before it. Raises ValueError if none is.
+    """
+    if (new.sample_rate, new.samples_per_frame) != (base.sample_rate, base.samples_per_frame):
+        raise ValueError("Encodes differ in sample rate or frame size")
+    usable = len(new.frames) - (_TAIL_FRAMES if exits is not None else 0)
+    entry = next(
+        (
+            k
+            for k in entries
+            if 0 <= k - first < usable
+            and new.frames[k - first].main_data_begin <= base.frames[k].main_data_begin
+        ),
+        None,
+    )
+    if entry is None:
+        raise ValueError("No frame to enter the re-encoded span at")
+    new_entry = entry - first
+    out = bytearray(base.data[: base.frames[entry].offset])
+    needed = new.frames[new_entry].main_data_begin
+    entry_ranges = _reservoir(base, entry, needed)
+    _move_reservoir(out, entry_ranges, 0, new.data, _reservoir(new, new_entry, needed))
+    changed = entry
+    if entry_ranges:
+        changed = next(i for i in range(entry - 1, -1, -1) if base.frames[i].offset <= entry_ranges[0][0])
+    if exits is None:
+        out += new.data[new.frames[new_entry].offset :]
+        return Splice(parse_mp3(_rewrite_info(out, len(out) - len(base.data), new)), changed, None)
+
+    leave = next(
+        (
+            m
+            for m in exits
+            if entry < m < len(base.frames)
+            and m - first < usable
+            and new.frames[m - first].main_data_begin >= base.frames[m].main_data_begin
+        ),
+        None,
+    )
+    if leave is None:
+        raise ValueError("No frame to leave the re-encoded span at")
+    shift = new.frames[new_entry].offset - len(out)
+    out += new.data[new.frames[new_entry].offset : new.frames[leave - first].offset]
+    needed = base.frames[leave].main_data_begin
+    _move_reservoir(
+        out,
+        _reservoir(new, leave - first, needed, first=new_entry),
+        shift,
+        base.data,
+        _reservoir(base, leave, needed),
+    )
+    out += base.data[base.frames[leave].offset :]
+    return Splice(parse_mp3(_rewrite_info(out, len(out) - len(base.data), None)), changed, leave)
+
+
+def _base_key(song_path: Path) -> str:
+    stat_result = song_path.stat()
+    return ArtifactStore.key(
+        "mp3base",
+        BASE_VERSION,
+        str(song_path.resolve()),
+        stat_result.st_mtime_ns,
+        stat_result.st_size,
+        NATIVE_ENCODINGS[".mp3"],
+    )
+
+
+@traced("mp3.encode_base")
+def encode_base(song_path: Path) -> Path:
+    """Encodes the untouched original to MP3 once per file version, block by block."""
+    import soundfile as sf
+
+    def produce(tmp: Path) -> None:
+        with sf.SoundFile(str(song_path)) as source, admit("encode"), stage_timer("encode"):
+            with AudioWriter(tmp, source.samplerate, source.channels) as writer:
+                for block in source.blocks(STREAM_BLOCK_FRAMES, dtype="float32", always_2d=True):
+                    writer.write(block)
+
+    artifact = get_artifact_store().get_or_create("mp3base", _base_key(song_path), produce, suffix=".mp3")
+    return artifact.path
+
+
+def base_encode(song_path: Path) -> Path | None:
+    """The original's MP3 encode if it exists, without waiting for one."""
+    artifact = get_artifact_store().lookup("mp3base", _base_key(song_path))
+    return artifact.path if artifact is not None else None
+
+
+def prepare_base(song_path: Path) -> Future:
+    """
+    Starts encode_base in the background, one song at a time; a song
+    already queued shares its future.
+    """
+
+    def run() -> Path:
+        with background():
+            return encode_base(song_path)
+
+    def report(future: Future) -> None:
+        if future.exception() is not None:
+            logger.error("MP3 base encode failed for %s: %r", song_path.name, future.exception())
+
+    future = _BASE_FLIGHT.spawn(song_path.resolve(), run, _BASE_POOL)
+    future.add_done_callback(report)
+    return future
+
+
+@traced("mp3.splice")
+def splice_span(
+    song_path: Path,
+    insert: AudioBuffer,
+    start_ms: int,
+    end_ms: int,
+    scratch: Path,
+) -> Splice | None:
+    """
+    The same MP3 stream mix_audio would encode, made by encoding only the
+    frames around the insert window (into scratch) and splicing them into
+    the original's base encode, so the cost follows the window rather than
+    the song. Returns None, after queueing the base encode if it is
+    missing, when there is no base encode to splice into or no join was
+    found.
+    """
+    import soundfile as sf
+
+    base_path = base_encode(song_path)
+    try:
+        base = parse_mp3(base_path.read_bytes()) if base_path is not None else None
+    except OSError:
+        base = None
+    if base is None:
+        prepare_base(song_path)
+        return None
+
+    info = sf.info(str(song_path))
+    spf = base.samples_per_frame
+    mixed_start, mixed_end = mixed_frames(info.frames, info.samplerate, start_ms, end_ms)
+    last_entry = (mixed_start - _GUARD_SAMPLES) // spf
+    first_exit = -(-(mixed_end + _GUARD_SAMPLES) // spf) + 1
+    for reach in (1, _RETRY_REACH):
+        first = max(0, last_entry - reach * max(PREROLL_FRAMES, _SETTLE_FRAMES))
+        entries = range(first + _SETTLE_FRAMES, last_entry + 1) if first else range(1)
+        span_end = (first_exit + reach * _EXIT_CANDIDATES + _TAIL_FRAMES) * spf
+        exits: range | None = range(first_exit, first_exit + reach * _EXIT_CANDIDATES)
+        if span_end >= info.frames:
+            span_end, exits = info.frames, None
+
+        span = render_span(song_path, insert, start_ms, end_ms, first * spf, span_end)
+        with admit("encode"), stage_timer("encode"), AudioWriter(scratch, span.sample_rate, span.channels) as writer:
+            writer.write(span.samples)
+        try:
+            return splice(base, parse_mp3(scratch.read_bytes()), first, entries, exits)
+        except ValueError as exc:
+            error = exc
+    logger.warning("MP3 splice failed for %s (%s); falling back to a full encode", song_path.name, error)
+    return None
+
+
+def start_base_encodes(song_paths: Iterable[Path]) -> None:
+    """
+    Queues base encodes for the catalog at startup, so a song's first MP3
+    request can already splice. MP3_BASE_PREWARM=false leaves each to its
+    first request.
+    """
+    if os.getenv("MP3_BASE_PREWARM", "true").strip().lower() != "true":
+        return
+    for song_path in song_paths:
+        if song_path.is_file() and base_encode(song_path) is None:
+            prepare_base(song_path)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Sequence
+
+from backend.services.artifact_store import REFS_META, ArtifactStore, get_artifact_store
+from backend.services.audio_service import MIX_VERSION, ORIGINALS_DIR
+from backend.services.catalog_service import Song
+from backend.services.delivery_service import resolve_audio_path
+from backend.services.metrics_service import record_cache
+
+logger = logging.getLogger("interlude.prerender")
+
+PRERENDER_VERSION = 1
+
+
+class Prerender(NamedTuple):
+    song_id: str
+    ad_prompt: str
+    lyrics: str
+    renditions: Dict[str, str]
+    created_at: float
+
+
+def prerender_key(song: Song, ad_prompt: str) -> str:
+    """
+    Matches prompts regardless of case and whitespace. Replacing the song
+    file, moving its insert window or changing the mix (MIX_VERSION) gives
+    a new key, so stale renders are never served.
+    """
+    match_text = " ".join(ad_prompt.split()).casefold()
+    song_path = ORIGINALS_DIR / song.file
+    try:
+        stat_result = song_path.stat()
+        fingerprint = (stat_result.st_mtime_ns, stat_result.st_size)
+    except FileNotFoundError:
+        fingerprint = None
+    return ArtifactStore.key(
+        "prerender",
+        PRERENDER_VERSION,
+        MIX_VERSION,
+        song.song_id,
+        str(song_path.resolve()),
+        fingerprint,
+        song.insert_window.start_ms,
+        song.insert_window.end_ms,
+        match_text,
+    )
+
+
+def _available(url: str) -> bool:
+    return resolve_audio_path(url.removeprefix("/audio/")) is not None
+
+
+def _rendition_paths(renditions: Dict[str, str]) -> List[Path]:
+    """Files behind the rendition URLs that are still on disk."""
+    paths = (resolve_audio_path(url.removeprefix("/audio/")) for url in renditions.values())
+    return [path for path in paths if path is not None]
+
+
+def find_prerender(song: Song, ad_prompt: str, formats: Sequence[str]) -> Prerender | None:
+    """
+    The pre-rendered ad for this song and prompt, if every requested format
+    was rendered and its file is still on disk. A hit counts as a use of
+    the mixes it points to.
+    """
+    store = get_artifact_store()
+    artifact = store.lookup("prerender", prerender_key(song, ad_prompt))
+    prerender = None
+    if artifact is not None:
+        prerender = Prerender(**{field: artifact.meta[field] for field in Prerender._fields})
+    hit = prerender is not None and all(
+        fmt in prerender.renditions and _available(prerender.renditions[fmt]) for fmt in formats
+    )
+    record_cache("prerender", hit)
+    if not hit:
+        return None
+    store.touch(*_rendition_paths(prerender.renditions))
+    return prerender
+
+
+def save_prerender(
+    song: Song, ad_prompt: str, lyrics: str, renditions: Dict[str, str]
+) -> Prerender:
+    """
+    Indexes rendered ad URLs so find_prerender serves them from disk. The
+    record references the mixes, so GC keeps them as long as it survives.
+    """
+    prerender = Prerender(song.song_id, ad_prompt, lyrics, dict(renditions), time.time())
+
+    def write(tmp: Path) -> Dict[str, object]:
+        record = prerender._asdict()
+        tmp.write_text(json.dumps(record, indent=2), encoding="utf-8")
+        return record | {REFS_META: [str(path) for path in _rendition_paths(renditions)]}
+
+    get_artifact_store().publish(
+        "prerender", prerender_key(song, ad_prompt), write, suffix=".json"
+    )
+    logger.info("Pre-rendered %s for %r: %s", song.song_id, ad_prompt, ", ".join(renditions))
+    return prerender
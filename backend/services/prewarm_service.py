@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger("interlude.prewarm")
+
+# Heavy audio stack, in dependency order. Nothing on the request path for
+# catalog/health endpoints imports these; they load here or on first use.
+HEAVY_MODULES = (
+    "numpy",
+    "soundfile",
+    "scipy.ndimage",
+    "librosa",
+    "backend.services.songify_service",
+)
+
+_LOCK = threading.Lock()
+_STATE: Dict[str, Any] = {
+    "status": "idle",
+    "imports_ms": {},
+    "warmup_ms": None,
+    "error": None,
+}
+
+
+def prewarm() -> Dict[str, Any]:
+    """Imports the audio stack and warms the DSP path, recording timings."""
+    with _LOCK:
+        if _STATE["status"] in {"running", "done"}:
+            return prewarm_report()
+        _STATE["status"] = "running"
+
+    imports_ms: Dict[str, float] = {}
+    try:
+        for name in HEAVY_MODULES:
+            started = time.perf_counter()
+            importlib.import_module(name)
+            imports_ms[name] = round((time.perf_counter() - started) * 1000.0, 1)
+            _STATE["imports_ms"] = dict(imports_ms)
+
+        from backend.services.songify_service import warm_up
+
+        started = time.perf_counter()
+        warm_up()
+        _STATE["warmup_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+        _STATE["status"] = "done"
+        logger.info("Prewarm done: imports=%s warmup_ms=%s", imports_ms, _STATE["warmup_ms"])
+    except Exception as exc:
+        logger.exception("Prewarm failed")
+        _STATE["status"] = "failed"
+        _STATE["error"] = repr(exc)
+    return prewarm_report()
+
+
+def start_prewarm() -> None:
+    """Prewarms in a daemon thread so startup does not wait on it."""
+    if os.getenv("AUDIO_PREWARM", "true").strip().lower() != "true":
+        return
+    threading.Thread(target=prewarm, name="audio-prewarm", daemon=True).start()
+
+
+def prewarm_report() -> Dict[str, Any]:
+    return {
+        "status": _STATE["status"],
+        "imports_ms": dict(_STATE["imports_ms"]),
+        "warmup_ms": _STATE["warmup_ms"],
+        "error": _STATE["error"],
+    }
@@ -1,11 +1,85 @@
 from __future__ import annotations
 
+import hashlib
+import logging
+import os
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, NamedTuple, Sequence, Tuple
 
 import librosa
 import numpy as np
 import soundfile as sf
+from scipy.ndimage import maximum_filter1d, uniform_filter1d
+
+from backend.services.admission_service import admitted
+from backend.services.artifact_store import ArtifactStore, get_artifact_store
+from backend.services.audio_buffer import (
+    INTERNAL_SAMPLE_RATE,
+    AudioBuffer,
+    AudioWriter,
+    fade_window,
+    from_mono,
+    load_buffer,
+    native_encoding,
+    save_buffer,
+    write_audio,
+)
+from backend.services.metrics_service import record_cache, timed_stage
+from backend.services.trace_service import span, traced
+from backend.utils.cache import LruCache
+
+N_FFT = 2048
+HOP_LENGTH = N_FFT // 4
+SILENCE_RMS_RATIO = 0.05
+RATIO_SMOOTH_FRAMES = 5
+GRID_DIVISION = 2
+MIN_STRETCH = 0.5
+MAX_STRETCH = 2.0
+ONSET_STRENGTH_WEIGHT = 1.0
+PSEUDO_ONSET_PENALTY = 0.5
+RISE_FRAMES = 4
+DOUBLE_DELAY_SECONDS = 0.02
+DOUBLE_DETUNE_DEPTH_SECONDS = 0.0018
+DOUBLE_DETUNE_RATE_HZ = 0.5
+STREAM_BLOCK_SECONDS = 10.0
+STREAM_MARGIN_FRAMES = 16
+STREAM_CROSSFADE_SAMPLES = 512
+LIMITER_LOOKAHEAD_SECONDS = 0.005
+OUTPUT_CEILING = 0.9
+# Bump when the render changes so shared on-disk renders are not reused.
+SONGIFY_VERSION = 1
+
+logger = logging.getLogger("interlude.songify")
+
+# Analysis depends only on the input audio, segmentation adds the lyrics,
+# and renders add the musical parameters, so a key or style change reuses
+# the first two levels. Analyses hold the full complex STFT (about 40 MB
+# per minute of input), so the array caches are also bounded by
+# SONGIFY_CACHE_MB per worker.
+_CACHE_ENTRIES = int(os.getenv("SONGIFY_CACHE_ENTRIES", "16"))
+_CACHE_BYTES = int(float(os.getenv("SONGIFY_CACHE_MB", "128")) * 1024 * 1024)
+
+
+def _nbytes(value: np.ndarray | Tuple[np.ndarray, ...]) -> int:
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    return sum(int(array.nbytes) for array in value)
+
+
+_ANALYSIS_CACHE = LruCache(_CACHE_ENTRIES, max_bytes=_CACHE_BYTES, sizeof=_nbytes)
+_SEGMENT_CACHE = LruCache(_CACHE_ENTRIES * 4)
+_RENDER_CACHE = LruCache(_CACHE_ENTRIES, max_bytes=_CACHE_BYTES // 4, sizeof=_nbytes)
+# Inputs longer than this are songified block by block with bounded memory.
+_STREAM_THRESHOLD_SECONDS = float(os.getenv("SONGIFY_STREAM_THRESHOLD_SECONDS", "60"))
+
+
+class _Analysis(NamedTuple):
+    audio: np.ndarray
+    stft: np.ndarray
+    envelope: np.ndarray
+    rms: np.ndarray
+    f0: np.ndarray
 
 
 def _parse_key(key: str) -> Tuple[str, str]:
@@ -89,88 +163,772 @@ def _segment_boundaries(lyrics: str, total_samples: int) -> List[Tuple[int, int]
     return segments
 
 
-def _estimate_f0(segment: np.ndarray, sr: int) -> float | None:
-    try:
-        f0 = librosa.yin(segment, fmin=80, fmax=400, sr=sr)
-        f0 = f0[np.isfinite(f0)]
-        f0 = f0[f0 > 0]
-        if f0.size == 0:
-            return None
-        return float(np.median(f0))
-    except Exception:
+def _frame_rms(magnitude: np.ndarray) -> np.ndarray:
+    return librosa.feature.rms(S=magnitude, frame_length=N_FFT)[0]
+
+
+def _onset_envelope(
+    magnitude: np.ndarray, previous_db: np.ndarray | None = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spectral-flux onset envelope on an absolute dB scale, so blocks of the
+    same signal produce the same values. Returns the envelope and the last
+    dB column to pass to the next block.
+    """
+    db = librosa.amplitude_to_db(magnitude, ref=1.0, amin=1e-4, top_db=None)
+    if db.shape[1] == 0:
+        return np.zeros(0, dtype=np.float32), previous_db
+    prev = db[:, :1] if previous_db is None else previous_db
+    flux = np.maximum(0.0, np.diff(np.concatenate([prev, db], axis=1), axis=1))
+    return flux.mean(axis=0).astype(np.float32), db[:, -1:]
+
+
+def _yin(audio: np.ndarray, sr: int, center: bool = True) -> np.ndarray:
+    return librosa.yin(
+        audio,
+        fmin=80,
+        fmax=400,
+        sr=sr,
+        frame_length=N_FFT,
+        hop_length=HOP_LENGTH,
+        center=center,
+    ).astype(np.float32)
+
+
+def _mask_unvoiced(f0: np.ndarray, rms: np.ndarray) -> np.ndarray:
+    """Marks silent or failed f0 frames as NaN."""
+    n_frames = min(f0.shape[0], rms.shape[0])
+    f0 = f0[:n_frames].copy()
+    rms = rms[:n_frames]
+    floor = np.max(rms) * SILENCE_RMS_RATIO if rms.size else 0.0
+    f0[(rms <= floor) | ~np.isfinite(f0) | (f0 <= 0)] = np.nan
+    return f0
+
+
+def _lyric_words(lyrics: str) -> List[str]:
+    words: List[str] = []
+    for line in lyrics.splitlines():
+        words.extend([w for w in line.split() if w.strip()])
+    return words
+
+
+def _expected_word_starts(words: List[str], first: int, last: int) -> np.ndarray:
+    """Character-proportional start frames for words 2..N inside [first, last)."""
+    lengths = np.array([max(1, len(w)) for w in words], dtype=np.float64)
+    fractions = np.cumsum(lengths)[:-1] / lengths.sum()
+    return first + fractions * max(1, last - first)
+
+
+def _align_word_starts(
+    expected: np.ndarray,
+    candidates: np.ndarray,
+    strengths: np.ndarray,
+    word_frames: float,
+) -> np.ndarray | None:
+    """
+    Dynamic programming: pick one strictly increasing candidate frame per
+    expected word start, trading distance from the expected position
+    against onset strength.
+    """
+    n_words, n_cands = expected.shape[0], candidates.shape[0]
+    if n_words == 0:
+        return np.zeros(0, dtype=np.int64)
+    if n_cands < n_words:
         return None
 
-
-def _pitch_shift_segment(segment: np.ndarray, sr: int, target_midi: int) -> np.ndarray:
-    f0 = _estimate_f0(segment, sr)
-    if not f0:
-        return segment
-    target_freq = librosa.midi_to_hz(target_midi)
-    n_steps = 12 * np.log2(target_freq / f0)
-    return librosa.effects.pitch_shift(segment, sr=sr, n_steps=n_steps)
-
-
-def _crossfade(a: np.ndarray, b: np.ndarray, fade_samples: int) -> np.ndarray:
-    if fade_samples <= 0:
-        return np.concatenate([a, b])
-    fade = np.linspace(0, 1, fade_samples)
-    head = a[:-fade_samples]
-    cross = a[-fade_samples:] * (1 - fade) + b[:fade_samples] * fade
-    tail = b[fade_samples:]
-    return np.concatenate([head, cross, tail])
+    cost = ((candidates[None, :] - expected[:, None]) / word_frames) ** 2
+    cost -= ONSET_STRENGTH_WEIGHT * strengths[None, :]
+
+    total = np.full((n_words, n_cands), np.inf)
+    back = np.zeros((n_words, n_cands), dtype=np.int64)
+    total[0] = cost[0]
+    for w in range(1, n_words):
+        prev = total[w - 1]
+        # Running argmin of the previous row: best predecessor strictly
+        # before each candidate.
+        run_min = np.minimum.accumulate(prev)
+        run_arg = np.maximum.accumulate(
+            np.where(prev <= run_min, np.arange(n_cands), 0)
+        )
+        total[w, 1:] = cost[w, 1:] + run_min[:-1]
+        back[w, 1:] = run_arg[:-1]
+
+    if not np.isfinite(total[-1]).any():
+        return None
+    picks = np.zeros(n_words, dtype=np.int64)
+    picks[-1] = int(np.argmin(total[-1]))
+    for w in range(n_words - 1, 0, -1):
+        picks[w - 1] = back[w, picks[w]]
+    return candidates[picks]
 
 
+@traced("songify.segment_words")
+def _segment_words(
+    lyrics: str,
+    envelope: np.ndarray,
+    rms: np.ndarray,
+    sr: int,
+    total_samples: int,
+    word_timestamps: Sequence[Tuple[float, float]] | None = None,
+) -> List[Tuple[int, int]]:
+    """
+    Word segments from the onset envelope of the analysis spectrogram, with
+    character-proportional cuts as the fallback. Word timestamps from the
+    TTS provider take precedence when they cover every word.
+    """
+    words = _lyric_words(lyrics)
+    if len(words) <= 1:
+        return _segment_boundaries(lyrics, total_samples)
+
+    if word_timestamps is not None and len(word_timestamps) == len(words):
+        starts = [int(start * sr) for start, _ in word_timestamps[1:]]
+    else:
+        floor = np.max(rms) * SILENCE_RMS_RATIO if rms.size else 0.0
+        active = np.flatnonzero(rms > floor)
+        if active.size == 0:
+            return _segment_boundaries(lyrics, total_samples)
+        first, last = int(active[0]), int(active[-1]) + 1
+
+        peak = float(envelope.max()) if envelope.size else 0.0
+        envelope = envelope / peak if peak > 0 else envelope
+        onsets = librosa.util.peak_pick(
+            envelope, pre_max=3, post_max=3, pre_avg=5, post_avg=5, delta=0.05, wait=4
+        )
+        # Word starts are onsets where energy rises; decays and word ends
+        # also trip the spectral-flux envelope, so weight by the rise.
+        log_rms = np.pad(np.log(rms + 1e-6), RISE_FRAMES, mode="edge")
+        windows = np.lib.stride_tricks.sliding_window_view(log_rms, RISE_FRAMES + 1)
+        rise = np.clip(
+            windows.max(axis=1)[onsets + RISE_FRAMES] - windows.min(axis=1)[onsets],
+            0.0,
+            None,
+        )
+        rise = rise / rise.max() if rise.size and rise.max() > 0 else rise
+        onsets, rise = onsets[rise > 0], rise[rise > 0]
+        strength = envelope[onsets] * rise
+
+        expected = _expected_word_starts(words, first, last)
+        # Expected positions double as weak candidates so alignment always
+        # has a feasible path when onsets are missing.
+        candidates = np.concatenate([onsets.astype(np.float64), np.round(expected)])
+        strengths = np.concatenate(
+            [strength, np.full(expected.shape[0], -PSEUDO_ONSET_PENALTY)]
+        )
+        order = np.argsort(candidates, kind="stable")
+        candidates, strengths = candidates[order], strengths[order]
+        keep = np.concatenate([[True], np.diff(candidates) > 0])
+        candidates, strengths = candidates[keep], strengths[keep]
+
+        aligned = _align_word_starts(
+            expected, candidates, strengths, word_frames=(last - first) / len(words)
+        )
+        if aligned is None:
+            return _segment_boundaries(lyrics, total_samples)
+        starts = [int(frame) * HOP_LENGTH for frame in aligned]
+
+    bounds = [0] + [min(max(0, start), total_samples) for start in starts] + [total_samples]
+    bounds = np.maximum.accumulate(np.array(bounds, dtype=np.int64)).tolist()
+    return [(bounds[i], max(bounds[i] + 1, bounds[i + 1])) for i in range(len(words))]
+
+
+def _frame_segment_index(n_frames: int, segments: List[Tuple[int, int]]) -> np.ndarray:
+    starts = np.array([start for start, _ in segments], dtype=np.int64)
+    frame_centers = np.arange(n_frames, dtype=np.int64) * HOP_LENGTH
+    return np.clip(np.searchsorted(starts, frame_centers, side="right") - 1, 0, None)
+
+
+def _ratio_curve(
+    f0: np.ndarray,
+    segments: List[Tuple[int, int]],
+    melody: List[int],
+) -> np.ndarray:
+    """
+    Per-frame pitch ratio that moves each word's median f0 onto its melody
+    note. Words without a usable f0 keep ratio 1.
+    """
+    n_frames = f0.shape[0]
+    seg_idx = _frame_segment_index(n_frames, segments)
+
+    targets = librosa.midi_to_hz(np.array(melody, dtype=np.float32))
+    seg_ratio = np.ones(len(segments), dtype=np.float32)
+    bounds = np.searchsorted(seg_idx, np.arange(len(segments) + 1))
+    for idx in range(len(segments)):
+        voiced = f0[bounds[idx] : bounds[idx + 1]]
+        voiced = voiced[np.isfinite(voiced)]
+        if voiced.size:
+            seg_ratio[idx] = targets[idx % len(targets)] / float(np.median(voiced))
+
+    log_ratio = np.log2(seg_ratio[seg_idx])
+    # Glide between words over a few frames instead of jumping.
+    kernel = np.ones(RATIO_SMOOTH_FRAMES, dtype=np.float32) / RATIO_SMOOTH_FRAMES
+    padded = np.pad(log_ratio, RATIO_SMOOTH_FRAMES // 2, mode="edge")
+    smoothed = np.convolve(padded, kernel, mode="valid")[:n_frames]
+    return np.exp2(smoothed).astype(np.float32)
+
+
+def _beat_stretch_curve(
+    n_frames: int,
+    segments: List[Tuple[int, int]],
+    bpm: int,
+    sr: int,
+) -> np.ndarray:
+    """
+    Per-frame time-stretch factor that lands each word's end on the nearest
+    grid line (GRID_DIVISION per beat). Rendered lag is carried forward so
+    the grid stays locked even when a word's stretch is clamped.
+    """
+    grid = 60.0 / max(1, bpm) * sr / GRID_DIVISION
+    seg_stretch = np.ones(len(segments), dtype=np.float32)
+    placed = 0.0
+    for idx, (start, end) in enumerate(segments):
+        natural = max(1, end - start)
+        target_end = max(round(end / grid), 1) * grid
+        if target_end <= placed:
+            target_end = (np.floor(placed / grid) + 1) * grid
+        stretch = float(np.clip((target_end - placed) / natural, MIN_STRETCH, MAX_STRETCH))
+        seg_stretch[idx] = stretch
+        placed += natural * stretch
+    return seg_stretch[_frame_segment_index(n_frames, segments)]
+
+
+def _phase_vocoder(stft: np.ndarray, time_steps: np.ndarray) -> np.ndarray:
+    """librosa.phase_vocoder with arbitrary (monotonic) fractional time steps."""
+    n_bins = stft.shape[0]
+    phi_advance = np.linspace(0, np.pi * HOP_LENGTH, n_bins)[:, None]
+    padded = np.pad(stft, [(0, 0), (0, 2)], mode="constant")
+
+    base = time_steps.astype(np.int64)
+    alpha = (time_steps - base).astype(np.float32)[None, :]
+    left = padded[:, base]
+    right = padded[:, base + 1]
+    mag = (1.0 - alpha) * np.abs(left) + alpha * np.abs(right)
+
+    dphase = np.angle(right) - np.angle(left) - phi_advance
+    dphase -= 2.0 * np.pi * np.round(dphase / (2.0 * np.pi))
+    step_phase = phi_advance + dphase
+    phase = np.empty_like(step_phase)
+    phase[:, 0] = np.angle(stft[:, 0])
+    np.cumsum(step_phase[:, :-1], axis=1, out=phase[:, 1:])
+    phase[:, 1:] += phase[:, :1]
+    return (mag * np.exp(1j * phase)).astype(np.complex64)
+
+
+def _fit_frames(curve: np.ndarray, n_frames: int) -> np.ndarray:
+    if curve.shape[0] < n_frames:
+        curve = np.pad(curve, (0, n_frames - curve.shape[0]), mode="edge")
+    return curve[:n_frames]
+
+
+@traced("songify.render")
+def _render(stft: np.ndarray, ratio: np.ndarray, stretch: np.ndarray) -> np.ndarray:
+    """
+    Applies a per-frame pitch ratio and time stretch with one phase-vocoder
+    pass, one ISTFT and one resample. The vocoder stretches each frame by
+    ratio * stretch, then a variable-rate read removes the ratio part, which
+    leaves the pitch raised by ratio and the timing scaled by stretch.
+    """
+    n_frames = stft.shape[1]
+    ratio = _fit_frames(ratio, n_frames).astype(np.float64)
+    stretch = _fit_frames(stretch, n_frames).astype(np.float64)
+
+    # Where every input frame lands on the vocoder (intermediate) timeline
+    # and on the final output timeline.
+    intermediate_pos = np.concatenate([[0.0], np.cumsum(ratio[:-1] * stretch[:-1])])
+    output_pos = np.concatenate([[0.0], np.cumsum(stretch[:-1])])
+    n_steps = int(intermediate_pos[-1]) + 1
+    time_steps = np.interp(np.arange(n_steps), intermediate_pos, np.arange(n_frames))
+
+    intermediate = librosa.istft(
+        _phase_vocoder(stft, time_steps),
+        hop_length=HOP_LENGTH,
+        n_fft=N_FFT,
+    ).astype(np.float32)
+
+    n_out = int(round((output_pos[-1] + stretch[-1]) * HOP_LENGTH))
+    read_pos = np.interp(
+        np.arange(n_out, dtype=np.float64) / HOP_LENGTH,
+        output_pos,
+        intermediate_pos,
+        right=intermediate_pos[-1] + ratio[-1] * stretch[-1],
+    ) * HOP_LENGTH
+    return np.interp(
+        read_pos, np.arange(intermediate.shape[0]), intermediate, right=0.0
+    ).astype(np.float32)
+
+
+@traced("songify.doubling")
+def _apply_doubling(
+    audio: np.ndarray,
+    sr: int,
+    detune: bool,
+    start: int = 0,
+    index_offset: int = 0,
+) -> None:
+    """
+    Mixes a delayed double into audio[start:] in place. Blocks are processed
+    back to front so every read still sees the undoubled samples; samples
+    before start are read-only history. With detune the delay is slowly
+    modulated (ADT-style) instead of running a separate pitch-shift pass on
+    the double. index_offset keeps the modulation continuous across blocks.
+    """
+    delay = int(DOUBLE_DELAY_SECONDS * sr)
+    depth = int(DOUBLE_DETUNE_DEPTH_SECONDS * sr) if detune else 0
+    block = max(1, delay - depth - 1)
+    n = audio.shape[0]
+    for end in range(n, start, -block):
+        block_start = max(start, end - block)
+        idx = np.arange(block_start, end)
+        if depth:
+            phase = 2 * np.pi * DOUBLE_DETUNE_RATE_HZ * (idx + index_offset) / sr
+            read = idx - delay - depth * np.sin(phase)
+            base = np.floor(read).astype(np.int64)
+            frac = (read - base).astype(np.float32)
+            valid = base >= 0
+            delayed = np.zeros(idx.shape[0], dtype=np.float32)
+            delayed[valid] = (
+                audio[base[valid]] * (1.0 - frac[valid]) + audio[base[valid] + 1] * frac[valid]
+            )
+        else:
+            src = idx - delay
+            delayed = np.where(src >= 0, audio[np.maximum(src, 0)], 0.0)
+        audio[block_start:end] *= 0.9
+        audio[block_start:end] += delayed * 0.2
+
+
+class _StreamingDoubler:
+    """Block-wise _apply_doubling that carries the undoubled history."""
+
+    def __init__(self, sr: int, detune: bool) -> None:
+        self.sr = sr
+        self.detune = detune
+        self.keep = int(DOUBLE_DELAY_SECONDS * sr) + int(DOUBLE_DETUNE_DEPTH_SECONDS * sr) + 2
+        self.history = np.zeros(0, dtype=np.float32)
+        self.position = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        extended = np.concatenate([self.history, block])
+        start = self.history.shape[0]
+        self.history = extended[-self.keep :].copy()
+        _apply_doubling(
+            extended,
+            self.sr,
+            self.detune,
+            start=start,
+            index_offset=self.position - start,
+        )
+        self.position += block.shape[0]
+        return extended[start:]
+
+
+class _LookaheadLimiter:
+    """
+    Streaming peak limiter. The gain at each sample is the average of
+    per-sample gains whose look-ahead window covers it, so output never
+    exceeds the ceiling and gain changes ramp over the look-ahead time.
+    """
+
+    def __init__(self, sr: int, ceiling: float) -> None:
+        self.window = max(1, int(LIMITER_LOOKAHEAD_SECONDS * sr))
+        self.context = 2 * self.window
+        self.ceiling = ceiling
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.emitted = 0
+
+    def _gain(self, buffer: np.ndarray) -> np.ndarray:
+        peak = maximum_filter1d(np.abs(buffer), size=2 * self.window + 1, mode="nearest")
+        gain = np.minimum(1.0, self.ceiling / np.maximum(peak, 1e-9))
+        return uniform_filter1d(gain, size=self.window, mode="nearest")
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate([self.buffer, block])
+        end = buffer.shape[0] - self.context
+        if end <= self.emitted:
+            self.buffer = buffer
+            return np.zeros(0, dtype=np.float32)
+        out = buffer[self.emitted : end] * self._gain(buffer)[self.emitted : end]
+        keep_from = max(0, end - self.context)
+        self.buffer = buffer[keep_from:]
+        self.emitted = end - keep_from
+        return out.astype(np.float32)
+
+    def flush(self) -> np.ndarray:
+        buffer, emitted = self.buffer, self.emitted
+        self.buffer, self.emitted = np.zeros(0, dtype=np.float32), 0
+        if buffer.shape[0] <= emitted:
+            return np.zeros(0, dtype=np.float32)
+        return (buffer[emitted:] * self._gain(buffer)[emitted:]).astype(np.float32)
+
+
+def warm_up(sr: int = INTERNAL_SAMPLE_RATE) -> None:
+    """
+    Runs the STFT, yin (numba-compiled on first call) and render path on a
+    quarter second of noise so the first real request does not pay for it.
+    """
+    audio = np.random.default_rng(0).standard_normal(sr // 4).astype(np.float32) * 0.1
+    stft = librosa.stft(audio, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    _yin(audio, sr)
+    ones = np.ones(stft.shape[1], dtype=np.float32)
+    _render(stft, ones, ones)
+
+
+@traced("songify_tts_to_singing")
 def songify_tts_to_singing(
-    input_wav: Path,
+    input_wav: Path | AudioBuffer,
     lyrics: str,
     bpm: int,
     key: str,
     style: str,
     output_wav: Path,
+    word_timestamps: Sequence[Tuple[float, float]] | None = None,
+    streaming: bool | None = None,
+    extra_outputs: Sequence[Path] = (),
 ) -> Path:
-    _ = bpm
-    audio, sr = librosa.load(str(input_wav), sr=44100, mono=True)
-    if audio.size == 0:
-        output_wav.parent.mkdir(parents=True, exist_ok=True)
-        sf.write(str(output_wav), audio, 44100)
-        return output_wav
-
-    segments = _segment_boundaries(lyrics, len(audio))
+    """
+    Renders TTS speech as sung lyrics. Results are cached by input audio
+    hash plus lyrics, bpm, key and style; analysis and segmentation are
+    cached separately so changing only key or style skips them.
+
+    input_wav may be a file or an in-memory AudioBuffer; buffers skip the
+    decode entirely. streaming=None picks the bounded-memory block path for
+    inputs longer than SONGIFY_STREAM_THRESHOLD_SECONDS. The one render is
+    also encoded to each of extra_outputs (by suffix), so several formats
+    cost a single render.
+    """
+    outputs = [output_wav, *extra_outputs]
+    if isinstance(input_wav, AudioBuffer):
+        if streaming is None:
+            streaming = input_wav.duration_seconds > _STREAM_THRESHOLD_SECONDS
+    elif streaming is None:
+        try:
+            streaming = sf.info(str(input_wav)).duration > _STREAM_THRESHOLD_SECONDS
+        except RuntimeError:
+            streaming = False
+    if streaming:
+        return songify_streaming(
+            input_wav, lyrics, bpm, key, style, output_wav, word_timestamps, extra_outputs
+        )
+
+    if isinstance(input_wav, AudioBuffer):
+        audio_hash = input_wav.content_hash()
+    else:
+        audio_hash = hashlib.sha256(input_wav.read_bytes()).hexdigest()
+    timestamps_key = tuple(map(tuple, word_timestamps)) if word_timestamps is not None else None
+    segment_key = (audio_hash, lyrics, timestamps_key)
+    render_key = segment_key + (bpm, key, style)
+
+    sr = INTERNAL_SAMPLE_RATE
+    combined = _RENDER_CACHE.get(render_key)
+    record_cache("songify_render_memory", combined is not None)
+    if combined is not None:
+        logger.info("songify cache hit: render %s", audio_hash[:12])
+        return _write_output(outputs, combined, sr)
+
+    # Second level: renders shared with the other workers on this host.
+    def produce(tmp: Path) -> dict:
+        rendered = _render_song(
+            input_wav, audio_hash, segment_key, lyrics, bpm, key, style, word_timestamps
+        )
+        return save_buffer(from_mono(rendered, sr), tmp)
+
+    store_key = ArtifactStore.key("songify", SONGIFY_VERSION, *render_key)
+    artifact = get_artifact_store().get_or_create("songify", store_key, produce, suffix=".npy")
+    combined = load_buffer(artifact.path, artifact.meta).mono()
+    combined.setflags(write=False)
+    _RENDER_CACHE.put(render_key, combined)
+    return _write_output(outputs, combined, sr)
+
+
+@admitted("dsp")
+@timed_stage("dsp")
+def _render_song(
+    input_wav: Path | AudioBuffer,
+    audio_hash: str,
+    segment_key: Tuple,
+    lyrics: str,
+    bpm: int,
+    key: str,
+    style: str,
+    word_timestamps: Sequence[Tuple[float, float]] | None,
+) -> np.ndarray:
+    sr = INTERNAL_SAMPLE_RATE
+    analysis = _analyze(input_wav, audio_hash, sr)
+    if analysis.audio.size == 0:
+        return analysis.audio
+
+    segments = _SEGMENT_CACHE.get(segment_key)
+    if segments is None:
+        segments = _segment_words(
+            lyrics,
+            analysis.envelope,
+            analysis.rms,
+            sr,
+            analysis.audio.shape[0],
+            word_timestamps,
+        )
+        _SEGMENT_CACHE.put(segment_key, segments)
     melody = _build_melody(lyrics, key)
     if len(melody) < len(segments):
         melody.extend([melody[-1]] * (len(segments) - len(melody)))
 
-    processed: List[np.ndarray] = []
-    for idx, (start, end) in enumerate(segments):
-        seg = audio[start:end]
-        if seg.size == 0:
-            continue
-        target_note = melody[idx % len(melody)] if melody else 60
-        shifted = _pitch_shift_segment(seg, sr, target_note)
-        processed.append(shifted)
-
-    if not processed:
-        output_wav.parent.mkdir(parents=True, exist_ok=True)
-        sf.write(str(output_wav), audio, 44100)
-        return output_wav
-
-    fade_samples = int(0.01 * sr)
-    combined = processed[0]
-    for seg in processed[1:]:
-        combined = _crossfade(combined, seg, fade_samples)
+    # One vocoder pass renders every word segment at once; the span records
+    # how many went into it.
+    with span("songify.segments", segments=len(segments), frames=int(analysis.f0.shape[0])):
+        ratio = _ratio_curve(analysis.f0, segments, melody or [60])
+        stretch = _beat_stretch_curve(analysis.f0.shape[0], segments, bpm, sr)
+        if np.allclose(ratio, 1.0) and np.allclose(stretch, 1.0):
+            combined = analysis.audio.copy()
+        else:
+            combined = _render(analysis.stft, ratio, stretch)
 
     peak = np.max(np.abs(combined)) if combined.size else 1.0
     if peak > 0:
-        combined = combined / peak * 0.9
+        combined *= 0.9 / peak
 
     if style in {"chant", "rap"}:
-        delay = int(0.02 * sr)
-        doubled = np.pad(combined, (delay, 0), mode="constant")[: combined.shape[0]]
-        if style == "rap":
-            doubled = librosa.effects.pitch_shift(doubled, sr=sr, n_steps=0.1)
-        combined = combined * 0.9 + doubled * 0.2
-
-    output_wav.parent.mkdir(parents=True, exist_ok=True)
-    sf.write(str(output_wav), combined, sr)
-    return output_wav
+        _apply_doubling(combined, sr, detune=style == "rap")
+    return combined
+
+
+@traced("songify.analyze")
+def _analyze(input_wav: Path | AudioBuffer, audio_hash: str, sr: int) -> _Analysis:
+    analysis = _ANALYSIS_CACHE.get(audio_hash)
+    if analysis is not None:
+        logger.info("songify cache hit: analysis %s", audio_hash[:12])
+        return analysis
+
+    if isinstance(input_wav, AudioBuffer):
+        audio = input_wav.with_layout(sr, 1).mono()
+    else:
+        audio, _ = librosa.load(str(input_wav), sr=sr, mono=True)
+    if audio.size == 0:
+        empty = np.zeros(0, dtype=np.float32)
+        return _Analysis(audio, np.zeros((0, 0), np.complex64), empty, empty, empty)
+    stft = librosa.stft(audio, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    magnitude = np.abs(stft)
+    rms = _frame_rms(magnitude)
+    envelope, _ = _onset_envelope(magnitude)
+    f0 = _mask_unvoiced(_yin(audio, sr), rms)
+    analysis = _Analysis(audio, stft, envelope, rms, f0)
+    for array in analysis:
+        array.setflags(write=False)
+    _ANALYSIS_CACHE.put(audio_hash, analysis)
+    return analysis
+
+
+def _write_output(outputs: Sequence[Path], audio: np.ndarray, sr: int) -> Path:
+    """
+    Encodes to each output by suffix through write_audio, so .mp3/.opus
+    outputs work too; returns the first.
+    """
+    buffer = from_mono(audio, sr)
+    for output in outputs:
+        write_audio(buffer, output)
+    return outputs[0]
+
+
+class _BufferSource:
+    """
+    The slice of the SoundFile interface the streaming path reads through,
+    over an in-memory mono buffer, so long TTS buffers get block-wise
+    analysis and rendering without being written out first.
+    """
+
+    def __init__(self, samples: np.ndarray, samplerate: int) -> None:
+        self._samples = samples.reshape(-1, 1)
+        self.samplerate = samplerate
+        self.frames = int(self._samples.shape[0])
+        self._position = 0
+
+    def seek(self, frame: int) -> int:
+        self._position = max(0, min(self.frames, frame))
+        return self._position
+
+    def read(self, frames: int, dtype: str = "float32", always_2d: bool = True) -> np.ndarray:
+        block = self._samples[self._position : self._position + frames]
+        self._position += block.shape[0]
+        return block.astype(dtype, copy=False)
+
+    def __enter__(self) -> "_BufferSource":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
 
+
+def _read_span(source: sf.SoundFile | _BufferSource, start: int, stop: int) -> np.ndarray:
+    """Mono float32 samples [start, stop) of the file, zero outside it."""
+    out = np.zeros(max(0, stop - start), dtype=np.float32)
+    lo, hi = max(0, start), min(source.frames, stop)
+    if hi > lo:
+        source.seek(lo)
+        block = source.read(hi - lo, dtype="float32", always_2d=True)
+        out[lo - start : lo - start + block.shape[0]] = block.mean(axis=1)
+    return out
+
+
+@traced("songify.stream_features")
+def _stream_features(
+    source: sf.SoundFile | _BufferSource, sr: int, block_frames: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """
+    Block-wise equivalent of _analyze: reads each block with half a window
+    of context so frames match a centered whole-buffer STFT exactly.
+    Returns the onset envelope, rms, masked f0 and the input peak.
+    """
+    n_frames = 1 + source.frames // HOP_LENGTH
+    envelopes: List[np.ndarray] = []
+    rms_blocks: List[np.ndarray] = []
+    f0_blocks: List[np.ndarray] = []
+    previous_db: np.ndarray | None = None
+    peak = 0.0
+    for f_lo in range(0, n_frames, block_frames):
+        f_hi = min(n_frames, f_lo + block_frames)
+        chunk = _read_span(
+            source, f_lo * HOP_LENGTH - N_FFT // 2, (f_hi - 1) * HOP_LENGTH + N_FFT // 2
+        )
+        peak = max(peak, float(np.max(np.abs(chunk))) if chunk.size else 0.0)
+        magnitude = np.abs(
+            librosa.stft(chunk, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)
+        )
+        rms_blocks.append(_frame_rms(magnitude))
+        envelope, previous_db = _onset_envelope(magnitude, previous_db)
+        envelopes.append(envelope)
+        f0_blocks.append(_yin(chunk, sr, center=False))
+
+    rms = np.concatenate(rms_blocks)
+    f0 = _mask_unvoiced(np.concatenate(f0_blocks), rms)
+    return np.concatenate(envelopes), rms, f0, peak
+
+
+@admitted("dsp")
+@timed_stage("dsp")
+def songify_streaming(
+    input_wav: Path | AudioBuffer,
+    lyrics: str,
+    bpm: int,
+    key: str,
+    style: str,
+    output_wav: Path,
+    word_timestamps: Sequence[Tuple[float, float]] | None = None,
+    extra_outputs: Sequence[Path] = (),
+) -> Path:
+    """
+    Bounded-memory songify for long inputs. Audio is read, rendered and
+    written in fixed-size blocks with overlapping margins; only per-frame
+    curves (about 1/500 of the sample count) are held for the whole input.
+    A makeup gain from the input peak plus a look-ahead limiter replaces
+    global peak normalization, and output is encoded incrementally by
+    suffix through AudioWriter, to output_wav and every extra output at
+    once.
+    AudioBuffer inputs are brought to mono at the internal rate and read in
+    place.
+    """
+    sr = INTERNAL_SAMPLE_RATE
+    outputs = [output_wav, *extra_outputs]
+    unsupported = [output for output in outputs if native_encoding(output) is None]
+    if unsupported:
+        logger.info(
+            "songify streaming has no in-process encoder for %s; using in-memory path",
+            unsupported[0].suffix,
+        )
+        return songify_tts_to_singing(
+            input_wav, lyrics, bpm, key, style, output_wav, word_timestamps,
+            streaming=False, extra_outputs=extra_outputs,
+        )
+    block_frames = max(4 * STREAM_MARGIN_FRAMES, int(STREAM_BLOCK_SECONDS * sr / HOP_LENGTH))
+    if isinstance(input_wav, AudioBuffer):
+        opened = _BufferSource(input_wav.with_layout(sr, 1).mono(), sr)
+    else:
+        opened = sf.SoundFile(str(input_wav))
+    with opened as source:
+        if source.samplerate != sr:
+            logger.info(
+                "songify streaming needs %s Hz input, got %s; using in-memory path",
+                sr,
+                source.samplerate,
+            )
+            return songify_tts_to_singing(
+                input_wav, lyrics, bpm, key, style, output_wav, word_timestamps,
+                streaming=False, extra_outputs=extra_outputs,
+            )
+        if source.frames == 0:
+            return _write_output(outputs, np.zeros(0, dtype=np.float32), sr)
+
+        envelope, rms, f0, input_peak = _stream_features(source, sr, block_frames)
+        segments = _segment_words(lyrics, envelope, rms, sr, source.frames, word_timestamps)
+        melody = _build_melody(lyrics, key)
+        if len(melody) < len(segments):
+            melody.extend([melody[-1]] * (len(segments) - len(melody)))
+        ratio = _ratio_curve(f0, segments, melody or [60]).astype(np.float64)
+        stretch = _beat_stretch_curve(f0.shape[0], segments, bpm, sr).astype(np.float64)
+
+        n_frames = ratio.shape[0]
+        output_pos = np.concatenate([[0.0], np.cumsum(stretch[:-1])]) * HOP_LENGTH
+        n_out = int(round(output_pos[-1] + stretch[-1] * HOP_LENGTH))
+        makeup = OUTPUT_CEILING / input_peak if input_peak > 0 else 1.0
+
+        doubler = (
+            _StreamingDoubler(sr, detune=style == "rap") if style in {"chant", "rap"} else None
+        )
+        limiter = _LookaheadLimiter(sr, OUTPUT_CEILING)
+        fade = 2 * STREAM_CROSSFADE_SAMPLES
+        pending_tail: np.ndarray | None = None
+
+        with ExitStack() as stack:
+            writers = [stack.enter_context(AudioWriter(output, sr, 1)) for output in outputs]
+
+            def write(samples: np.ndarray) -> None:
+                for writer in writers:
+                    writer.write(samples)
+
+            def emit(samples: np.ndarray) -> None:
+                if samples.size == 0:
+                    return
+                samples = samples * makeup
+                if doubler is not None:
+                    samples = doubler.process(samples)
+                write(limiter.process(samples))
+
+            for f_start in range(0, n_frames, block_frames):
+                f_end = min(n_frames, f_start + block_frames)
+                is_first, is_last = f_start == 0, f_end == n_frames
+                lo = max(0, f_start - STREAM_MARGIN_FRAMES)
+                hi = min(n_frames - 1, f_end + STREAM_MARGIN_FRAMES)
+
+                # Uncentered STFT with half a window of real context: local
+                # frame 0 sits on global frame lo, and the centered ISTFT in
+                # _render puts local output sample 0 at output_pos[lo].
+                with span("songify.block", index=f_start // block_frames, frames=f_end - f_start):
+                    chunk = _read_span(
+                        source, lo * HOP_LENGTH - N_FFT // 2, hi * HOP_LENGTH + N_FFT // 2
+                    )
+                    stft = librosa.stft(chunk, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)
+                    rendered = _render(stft, ratio[lo : hi + 1], stretch[lo : hi + 1])
+
+                base = output_pos[lo]
+                keep_start = int(round(output_pos[f_start]))
+                if not is_first:
+                    keep_start -= STREAM_CROSSFADE_SAMPLES
+                keep_end = (
+                    n_out
+                    if is_last
+                    else int(round(output_pos[f_end])) + STREAM_CROSSFADE_SAMPLES
+                )
+                local_start = max(0, keep_start - int(round(base)))
+                local_end = keep_end - int(round(base))
+                piece = rendered[local_start:local_end]
+                if local_end > rendered.shape[0]:
+                    piece = np.pad(piece, (0, local_end - rendered.shape[0]))
+
+                if pending_tail is not None:
+                    window = fade_window(fade)
+                    head = piece[:fade]
+                    emit(pending_tail * window[::-1] + head * window)
+                    piece = piece[fade:]
+                if not is_last:
+                    pending_tail = piece[-fade:].copy()
+                    piece = piece[:-fade]
+                emit(piece)
+
+            write(limiter.flush())
+    return output_wav
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+from backend.utils.cache import LruCache
+from backend.utils.paths import repo_root
+
+T = TypeVar("T")
+
+logger = logging.getLogger("interlude.trace")
+
+TRACE_HEADER = b"x-interlude-trace"
+TRACE_ID_HEADER = b"x-interlude-trace-id"
+PROFILE_INTERVAL_SECONDS = 0.005
+
+_TRACING_ENABLED = os.getenv("REQUEST_TRACING", "true").strip().lower() == "true"
+_PROFILING_ENABLED = os.getenv("REQUEST_PROFILING", "false").strip().lower() == "true"
+_TRACES = LruCache(int(os.getenv("TRACE_HISTORY", "100")))
+
+_CURRENT: ContextVar[Optional["Trace"]] = ContextVar("interlude_trace", default=None)
+_PARENT: ContextVar[Optional[int]] = ContextVar("interlude_span_parent", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+def _profile_dir() -> Path:
+    return Path(os.getenv("INTERLUDE_PROFILE_DIR", str(repo_root() / ".interlude" / "profiles")))
+
+
+class Trace:
+    """Spans recorded for one request, from any thread that inherited its context."""
+
+    def __init__(self, name: str, profile: bool = False) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.profile = profile
+        self.profile_path: str | None = None
+        self.started_at = time.time()
+        self.duration_ms: float | None = None
+        self._origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self._threads: Set[int] = set()
+
+    def offset_ms(self, at: float) -> float:
+        return round((at - self._origin) * 1000.0, 3)
+
+    def record(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.add(ident)
+
+    def threads(self) -> List[int]:
+        """Snapshot of the threads that have opened a span for this trace."""
+        with self._lock:
+            return list(self._threads)
+
+    def server_timing(self) -> str:
+        with self._lock:
+            roots = [span for span in self.spans if span["parent_id"] is None]
+        return ", ".join(f'{span["name"]};dur={span["duration_ms"]}' for span in roots)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "profile_path": self.profile_path,
+            "spans": spans,
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "span_id", "parent_id", "token", "started")
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> "_Span":
+        self.span_id = next(self.trace._ids)
+        self.parent_id = _PARENT.get()
+        self.token = _PARENT.set(self.span_id)
+        self.trace.add_thread(threading.get_ident())
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        ended = time.perf_counter()
+        _PARENT.reset(self.token)
+        span: Dict[str, Any] = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "thread": threading.current_thread().name,
+            "start_ms": self.trace.offset_ms(self.started),
+            "duration_ms": round((ended - self.started) * 1000.0, 3),
+        }
+        if self.attrs:
+            span["attrs"] = self.attrs
+        if exc is not None:
+            span["error"] = repr(exc)
+        self.trace.record(span)
+
+
+def span(name: str, **attrs: Any):
+    """
+    Context manager recording a nested span on the active trace. Without an
+    active trace it returns a shared no-op context, so untraced requests pay
+    only for one ContextVar lookup.
+    """
+    trace = _CURRENT.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, attrs)
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> T:
+            trace = _CURRENT.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with _Span(trace, name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_trace(trace_id: str) -> Trace | None:
+    return _TRACES.get(trace_id)
+
+
+class _WallClockSampler:
+    """
+    Samples the stacks of every thread that has opened a span for the trace
+    and writes them in folded-stack format (flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, trace: Trace) -> None:
+        self.trace = trace
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+
+    def start(self) -> "_WallClockSampler":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(PROFILE_INTERVAL_SECONDS):
+            frames = sys._current_frames()
+            for ident in self.trace.threads():
+                frame = frames.get(ident)
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Path:
+        self._stop.set()
+        self._thread.join()
+        directory = _profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.trace.trace_id}.folded"
+        with path.open("w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+
+def _header(scope: Dict[str, Any], name: bytes) -> bytes | None:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value
+    return None
+
+
+class TraceMiddleware:
+    """
+    Opt-in per request: 'X-Interlude-Trace: 1' records spans, 'profile'
+    also samples stacks to INTERLUDE_PROFILE_DIR when REQUEST_PROFILING is
+    on. The response carries X-Interlude-Trace-Id and a Server-Timing
+    summary; the full trace is served by /api/traces/{id}. Requests without
+    the header pass straight through.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        flag = _header(scope, TRACE_HEADER) if scope["type"] == "http" else None
+        if flag is None or not _TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        profile = _PROFILING_ENABLED and flag.strip().lower() == b"profile"
+        trace = Trace(f'{scope["method"]} {scope["path"]}', profile=profile)
+        token = _CURRENT.set(trace)
+        sampler = _WallClockSampler(trace).start() if profile else None
+
+        async def send_with_trace(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((TRACE_ID_HEADER, trace.trace_id.encode("ascii")))
+                timing = trace.server_timing()
+                if timing:
+                    headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        # Requests run their handler in a threadpool thread; register the
+        # loop thread too so the profile covers async work.
+        trace.add_thread(threading.get_ident())
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _CURRENT.reset(token)
+            trace.duration_ms = round((time.perf_counter() - started) * 1000.0, 3)
+            if sampler is not None:
+                trace.profile_path = str(sampler.stop())
+                logger.info("Wrote profile for trace %s to %s", trace.trace_id, trace.profile_path)
+            _TRACES.put(trace.trace_id, trace)
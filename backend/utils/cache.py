@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class LruCache:
+    """
+    Small thread-safe LRU keyed by any hashable value. With max_bytes and
+    sizeof it also evicts by the total size of the values; a value larger
+    than the whole budget is not cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any], int] | None = None,
+    ) -> None:
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max_bytes if sizeof is not None else None
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries == 0:
+            return
+        size = self._sizeof(value) if self._sizeof is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import importlib.util
 import os
 import platform
 import shutil
@@ -11,15 +12,16 @@ from typing import Dict, List
 from backend.utils.paths import repo_root
 
 
-REQUIRED_DEPS = ["requests", "dotenv", "pydub", "numpy", "librosa", "soundfile"]
+REQUIRED_DEPS = ["requests", "dotenv", "numpy", "scipy", "soxr", "librosa", "soundfile"]
 
 
 def check_python_deps() -> Dict[str, bool]:
     results: Dict[str, bool] = {}
     for dep in REQUIRED_DEPS:
         try:
-            __import__(dep)
-            results[dep] = True
+            # find_spec only locates the package; importing librosa & co.
+            # here would cost seconds and is left to the prewarm step.
+            results[dep] = importlib.util.find_spec(dep) is not None
         except Exception:
             results[dep] = False
     return results
@@ -29,6 +31,17 @@ def check_ffmpeg() -> bool:
     return shutil.which("ffmpeg") is not None
 
 
+def check_native_codecs() -> Dict[str, bool]:
+    """Compressed formats libsndfile handles in-process; ffmpeg is only a fallback for the rest."""
+    try:
+        import soundfile as sf
+
+        formats = sf.available_formats()
+    except Exception:
+        formats = {}
+    return {"mp3": "MP3" in formats, "ogg": "OGG" in formats}
+
+
 def auto_install_python_deps() -> Dict[str, bool]:
     requirements_path = repo_root() / "backend" / "requirements.txt"
     subprocess.check_call(
@@ -69,6 +82,7 @@ def run_doctor(auto_fix: bool = True) -> dict:
     report: Dict[str, object] = {
         "python_deps": check_python_deps(),
         "ffmpeg": check_ffmpeg(),
+        "native_codecs": check_native_codecs(),
         "auto_install_allowed": _auto_install_allowed(),
         "attempted_fixes": [],
     }
@@ -81,7 +95,7 @@ def run_doctor(auto_fix: bool = True) -> dict:
                 attempted.append("python_deps")
             except Exception as exc:
                 report["python_deps_error"] = str(exc)
-        if not report["ffmpeg"]:
+        if not report["ffmpeg"] and not report["native_codecs"]["mp3"]:
             try:
                 report["ffmpeg"] = auto_install_ffmpeg()
                 attempted.append("ffmpeg")
@@ -89,5 +103,9 @@ def run_doctor(auto_fix: bool = True) -> dict:
                 report["ffmpeg_error"] = str(exc)
         report["attempted_fixes"] = attempted
 
-    report["ok"] = bool(all(report["python_deps"].values()) and report["ffmpeg"])
+    # ffmpeg is only needed when libsndfile cannot decode the MP3 originals.
+    report["ok"] = bool(
+        all(report["python_deps"].values())
+        and (report["native_codecs"]["mp3"] or report["ffmpeg"])
+    )
     return report
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
 import shutil
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_path() -> str | None:
+    """PATH lookup for ffmpeg, done once per process until reset_ffmpeg_cache()."""
+    return shutil.which("ffmpeg")
+
+
+def reset_ffmpeg_cache() -> None:
+    ffmpeg_path.cache_clear()
 
 
 def assert_ffmpeg_available() -> None:
-    if shutil.which("ffmpeg"):
+    if ffmpeg_path():
         return
     raise RuntimeError(
         "ffmpeg is required but was not found on PATH.\n"
@@ -13,4 +24,3 @@ def assert_ffmpeg_available() -> None:
         "  Ubuntu/Debian: sudo apt-get update && sudo apt-get install -y ffmpeg\n"
         "  Windows: install ffmpeg and add it to PATH."
     )
-
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check using weak comparison, as RFC 9110 requires."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def parse_accept(header: str | None) -> List[str]:
+    """
+    Media ranges from an Accept-style header, most preferred first. Ties keep
+    their listed order and q=0 entries are dropped.
+    """
+    ranked: List[Tuple[float, int, str]] = []
+    for index, item in enumerate((header or "").split(",")):
+        value, *params = [part.strip() for part in item.split(";")]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, raw = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(raw)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranked.append((-quality, index, value.lower()))
+    return [value for _, _, value in sorted(ranked)]
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, callers arriving while it is in flight wait on the same future
+    and receive the same result (or exception). Nothing is cached once the
+    call completes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def spawn(self, key: Hashable, fn: Callable[[], T], executor: Executor) -> "Future[T]":
+        """
+        Like do, but runs fn on executor and returns the shared future
+        without waiting; a call already in flight for key (from do or
+        spawn) is joined instead.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = Future()
+            self._calls[key] = future
+
+        def run() -> None:
+            try:
+                result = fn()
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+
+        executor.submit(run)
+        return future